@@ -0,0 +1,259 @@
+"""
+账号文件流式导入工具
+支持 CSV / JSONL / redis_bulk_insert.txt 中的 RPUSH 格式，逐行读取并按固定大小分块写入 Redis。
+去重由服务端的注册集合完成，客户端只持有当前一块账号，内存占用与文件大小无关。
+
+用法:
+    python account_importer.py accounts.csv --pool account_pool_v3
+    python account_importer.py redis_bulk_insert.txt --replace
+    python account_importer.py accounts.jsonl --resp accounts.resp   # 生成 redis-cli --pipe 的输入
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import shlex
+import sys
+import time
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import account_pool_schema as schema
+from account_manager import AccountManager
+
+# 单次 add_accounts 调用导入的账号数，默认恰好一次 pipeline 往返
+DEFAULT_CHUNK_SIZE = schema.ACCOUNT_BATCH_SIZE * schema.PIPELINE_SCRIPT_CALLS
+# 导入进度日志的最短间隔（秒）
+PROGRESS_INTERVAL = 1.0
+FILE_FORMATS = ("csv", "jsonl", "rpush")
+
+
+# ---- 文件读取 ----------------------------------------------------------
+def iter_csv_accounts(path: str) -> Iterator[Dict]:
+    """逐行读取 CSV，首行为表头，至少包含 username 与 password 两列"""
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        for row in csv.DictReader(handle):
+            yield {field: value for field, value in row.items() if field}
+
+
+def iter_jsonl_accounts(path: str) -> Iterator[Dict]:
+    """逐行读取 JSONL，每行一个账号对象"""
+    with open(path, encoding="utf-8-sig") as handle:
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_rpush_accounts(path: str) -> Iterator[Dict]:
+    """读取 redis-cli 命令格式的文件，只取 RPUSH 命令中的账号 JSON
+
+    命令以行首的大写命令名开始，行尾的反斜杠表示下一行（以空白开头）是同一命令的续行。
+    """
+    in_rpush = False
+    with open(path, encoding="utf-8-sig") as handle:
+        for line in handle:
+            content = line.rstrip()
+            if not content:
+                continue
+            if content.endswith("\\"):
+                content = content[:-1]
+            tokens = shlex.split(content, posix=True)
+            if not line[0].isspace():
+                in_rpush = bool(tokens) and tokens[0].upper() == "RPUSH"
+                # 跳过命令名与键名
+                tokens = tokens[2:]
+            if in_rpush:
+                for token in tokens:
+                    yield json.loads(token)
+
+
+def iter_accounts_file(path: str, file_format: str = "auto") -> Iterator[Dict]:
+    """按格式读取账号文件，auto 时根据扩展名判断：.csv / .jsonl / .json，其余按 RPUSH 格式"""
+    if file_format == "auto":
+        extension = os.path.splitext(path)[1].lower()
+        file_format = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl"}.get(extension, "rpush")
+
+    readers = {
+        "csv": iter_csv_accounts,
+        "jsonl": iter_jsonl_accounts,
+        "rpush": iter_rpush_accounts,
+    }
+    if file_format not in readers:
+        raise ValueError(f"不支持的文件格式: {file_format}")
+    return readers[file_format](path)
+
+
+# ---- 导入 --------------------------------------------------------------
+class AccountImporter:
+    """把账号流分块写入账号池，已存在的用户名跳过"""
+
+    def __init__(
+        self,
+        account_manager: AccountManager,
+        pool_key: str = "account_pool_v3",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress_interval: float = PROGRESS_INTERVAL,
+    ):
+        self.logger = logging.getLogger("AccountImporter")
+        self.account_manager = account_manager
+        self.pool_key = pool_key
+        self.chunk_size = max(1, int(chunk_size))
+        self.progress_interval = progress_interval
+
+    def import_file(self, path: str, file_format: str = "auto", replace: bool = False) -> Dict:
+        """导入账号文件，replace 为 True 时先清空账号池"""
+        return self.import_accounts(iter_accounts_file(path, file_format), replace=replace)
+
+    def import_accounts(self, accounts: Iterable[Dict], replace: bool = False) -> Dict:
+        """导入账号流，返回统计 {read, imported, duplicates, invalid, failed, seconds, rate}
+
+        写入出错的块计入 failed 后继续导入后续的块，已存在的用户名在重新导入时跳过，可直接重跑整个文件。
+        """
+        if replace:
+            self.account_manager.delete_pool(self.pool_key)
+
+        report = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0, "failed": 0, "seconds": 0.0, "rate": 0.0}
+        started = last_progress = time.monotonic()
+
+        for chunk in self._chunks(accounts):
+            report["read"] += len(chunk)
+            result = self.account_manager.add_accounts(chunk, self.pool_key)
+            for field in ("imported", "duplicates", "invalid", "failed"):
+                report[field] += result[field]
+
+            now = time.monotonic()
+            if now - last_progress >= self.progress_interval:
+                last_progress = now
+                self._log_progress(report, now - started)
+
+        report["seconds"] = time.monotonic() - started
+        report["rate"] = report["read"] / report["seconds"] if report["seconds"] > 0 else 0.0
+        self.logger.log(
+            logging.ERROR if report["failed"] else logging.INFO,
+            "导入%s: 读取 %d 条, 导入 %d 个, 重复 %d 个, 无效 %d 条, 失败 %d 个, 耗时 %.2f 秒, %.0f 条/秒",
+            "未完成" if report["failed"] else "完成",
+            report["read"],
+            report["imported"],
+            report["duplicates"],
+            report["invalid"],
+            report["failed"],
+            report["seconds"],
+            report["rate"],
+        )
+        return report
+
+    def _chunks(self, accounts: Iterable[Dict]) -> Iterator[List[Dict]]:
+        chunk: List[Dict] = []
+        for account in accounts:
+            chunk.append(account)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _log_progress(self, report: Dict, elapsed: float) -> None:
+        self.logger.info(
+            "已读取 %d 条, 导入 %d 个, 重复 %d 个, %.0f 条/秒",
+            report["read"],
+            report["imported"],
+            report["duplicates"],
+            report["read"] / elapsed if elapsed > 0 else 0.0,
+        )
+
+
+# ---- RESP 批量写入文件 ---------------------------------------------------
+def _resp_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def write_resp(accounts: Iterable[Dict], pool_key: str, output: BinaryIO) -> Dict:
+    """把账号流写成 RESP 协议命令，供 `redis-cli --pipe` 批量写入
+
+    只适用于空账号池：命令不做条件判断，重复的用户名以最后一条为准。
+    """
+    report = {"read": 0, "written": 0, "invalid": 0}
+    registry_key = schema.registry_key(pool_key)
+    available_key = schema.available_key(pool_key)
+    created_at = time.time()
+
+    output.write(_resp_command("HSET", schema.meta_key(pool_key), "version", schema.SCHEMA_VERSION))
+    for account in accounts:
+        report["read"] += 1
+        encoded = schema.encode_new_account(account, created_at)
+        if encoded is None:
+            report["invalid"] += 1
+            continue
+        username, fields = encoded
+        field_args = [item for pair in fields.items() for item in pair]
+        output.write(_resp_command("HSET", schema.account_key(pool_key, username), *field_args))
+        output.write(_resp_command("SADD", registry_key, username))
+        output.write(_resp_command("ZADD", available_key, report["written"], username))
+        report["written"] += 1
+    output.write(_resp_command("HSET", schema.meta_key(pool_key), "sequence", report["written"]))
+    return report
+
+
+# ---- 命令行入口 --------------------------------------------------------
+def load_redis_defaults(config_path: str) -> Dict:
+    """从主程序的 config.json 读取 Redis 连接参数作为默认值"""
+    defaults = {"host": "localhost", "port": 6379, "password": "", "db": 0, "pool": "account_pool_v3"}
+    if config_path and os.path.exists(config_path):
+        with open(config_path, encoding="utf-8") as handle:
+            config = json.load(handle)
+        defaults.update({
+            "host": config.get("redis_host", defaults["host"]),
+            "port": config.get("redis_port", defaults["port"]),
+            "password": config.get("redis_password", defaults["password"]),
+            "db": config.get("redis_db", defaults["db"]),
+            "pool": config.get("account_pool_key", defaults["pool"]),
+        })
+    return defaults
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default="config.json")
+    known, _ = pre_parser.parse_known_args(argv)
+    defaults = load_redis_defaults(known.config)
+
+    parser = argparse.ArgumentParser(description="流式导入账号文件到 Redis 账号池", parents=[pre_parser])
+    parser.add_argument("path", help="账号文件路径")
+    parser.add_argument("--format", default="auto", choices=("auto",) + FILE_FORMATS, help="文件格式")
+    parser.add_argument("--pool", default=defaults["pool"], help="账号池键名")
+    parser.add_argument("--host", default=defaults["host"])
+    parser.add_argument("--port", type=int, default=defaults["port"])
+    parser.add_argument("--password", default=defaults["password"])
+    parser.add_argument("--db", type=int, default=defaults["db"])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="单次写入的账号数")
+    parser.add_argument("--replace", action="store_true", help="导入前清空账号池")
+    parser.add_argument("--resp", metavar="OUTPUT", help="不连接 Redis，生成 RESP 文件供 redis-cli --pipe 使用")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    accounts = iter_accounts_file(args.path, args.format)
+
+    if args.resp:
+        with open(args.resp, "wb") as output:
+            report = write_resp(accounts, args.pool, output)
+        logging.getLogger("AccountImporter").info(
+            "已生成 %s: 写入 %d 个账号, 无效 %d 条", args.resp, report["written"], report["invalid"]
+        )
+        return 0
+
+    manager = AccountManager()
+    manager.update_config(host=args.host, port=args.port, password=args.password, db=args.db)
+    importer = AccountImporter(manager, args.pool, chunk_size=args.chunk_size)
+    report = importer.import_accounts(accounts, replace=args.replace)
+    if report["failed"]:
+        return 1
+    return 0 if report["imported"] or report["duplicates"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""
+账号池事件日志的消费工具
+账号池脚本在每次状态切换时向 {pool}:v4:journal 追加一条事件，本模块读取这些事件，
+按账号累计使用指标，并可按事件重放的结果重建各状态集合。
+
+事件类型:
+    add / update / remove     账号写入、字段更新、删除
+    acquire / renew           获取、续约，until 为租约到期时间
+    release / expire          持有者释放、租约过期被回收，outcome 为 available / cooldown / quarantined / deleted，
+                              释放时报告了使用结果的，result 为 success / failure
+    promote                   冷却到期回到可用
+    unquarantine              解除隔离回到可用
+    repair                    增量修复，outcome 为修复后的状态或 orphaned
+    migrate                   从 v3 迁移，outcome 为迁移到的状态
+    reset                     save_accounts 整体替换账号池
+
+用法:
+    python account_journal.py report --pool account_pool_v3
+    python account_journal.py follow
+    python account_journal.py rebuild            # 只比较，不写入
+    python account_journal.py rebuild --apply    # 停止全部任务后执行
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import account_pool_schema as schema
+from account_importer import load_redis_defaults
+from account_manager import AccountManager
+
+# 单次 XRANGE 读取的事件数
+JOURNAL_PAGE_SIZE = 1000
+# 跟随模式单次 XREAD 的阻塞时间（秒），需小于客户端 socket_timeout(5 秒)
+FOLLOW_BLOCK_SECONDS = 4.0
+
+
+def decode_event(entry_id: str, fields: Dict) -> Dict:
+    """把流中的一条记录还原为完整字段名的事件字典"""
+    event = {"id": entry_id}
+    for short, name in schema.JOURNAL_FIELDS.items():
+        if short in fields:
+            event[name] = fields[short]
+    for name in ("ts", "until"):
+        if name in event:
+            event[name] = float(event[name])
+    return event
+
+
+class JournalMetrics:
+    """重放事件，按账号累计获取/释放/冷却次数、使用成功/失败次数、持有时长、空闲时长，并跟踪当前状态"""
+
+    def __init__(self):
+        self.accounts: Dict[str, Dict] = {}
+        self.event_counts: Dict[str, int] = {}
+        self.lane_acquires: Dict[str, int] = {}
+        # 事件日志是否从 reset 开始，即是否覆盖账号池的完整历史
+        self.complete = False
+        self.first_id: Optional[str] = None
+        self.last_id: Optional[str] = None
+        self.last_ts: Optional[float] = None
+
+    def _account(self, username: str) -> Dict:
+        account = self.accounts.get(username)
+        if account is None:
+            account = {
+                "acquires": 0,
+                "releases": 0,
+                "successes": 0,
+                "failures": 0,
+                "cooldowns": 0,
+                "expired": 0,
+                "held_seconds": 0.0,
+                "idle_seconds": 0.0,
+                "status": None,
+                "since": None,
+                "until": None,
+            }
+            self.accounts[username] = account
+        return account
+
+    @staticmethod
+    def _set_status(account: Dict, status: Optional[str], ts: float, until: Optional[float] = None) -> None:
+        account["status"] = status
+        account["since"] = ts
+        account["until"] = until
+
+    def apply(self, event: Dict) -> None:
+        name = event.get("event", "")
+        username = event.get("username", "")
+        ts = event.get("ts", 0.0)
+        outcome = event.get("outcome")
+
+        self.event_counts[name] = self.event_counts.get(name, 0) + 1
+        if self.first_id is None:
+            self.first_id = event.get("id")
+            self.complete = name == "reset"
+        self.last_id = event.get("id")
+        self.last_ts = ts
+
+        if name == "reset":
+            self.accounts.clear()
+            self.complete = True
+            return
+
+        account = self._account(username)
+        if name == "acquire":
+            if account["status"] == "available" and account["since"] is not None:
+                account["idle_seconds"] += max(0.0, ts - account["since"])
+            account["acquires"] += 1
+            lane = f"{event.get('host', '')}/{event.get('lane', '')}"
+            self.lane_acquires[lane] = self.lane_acquires.get(lane, 0) + 1
+            self._set_status(account, "in_use", ts, event.get("until"))
+        elif name == "renew":
+            account["until"] = event.get("until")
+        elif name in ("release", "expire"):
+            if account["status"] == "in_use" and account["since"] is not None:
+                account["held_seconds"] += max(0.0, ts - account["since"])
+            account["releases" if name == "release" else "expired"] += 1
+            result = event.get("result")
+            if result == "success":
+                account["successes"] += 1
+            elif result == "failure":
+                account["failures"] += 1
+            if outcome == "cooldown":
+                account["cooldowns"] += 1
+                self._set_status(account, "cooldown", ts, event.get("until"))
+            elif outcome == "deleted":
+                self._set_status(account, None, ts)
+            elif outcome == "quarantined":
+                self._set_status(account, "quarantined", ts)
+            else:
+                self._set_status(account, "available", ts)
+        elif name in ("add", "promote", "unquarantine"):
+            self._set_status(account, "available", ts)
+        elif name in ("repair", "migrate"):
+            if outcome == "orphaned":
+                self._set_status(account, None, ts)
+            elif outcome == "available":
+                self._set_status(account, "available", ts)
+            elif outcome in schema.ACCOUNT_STATUSES:
+                self._set_status(account, outcome, ts, event.get("until"))
+        elif name == "remove":
+            self._set_status(account, None, ts)
+
+    def state(self) -> Dict[str, Tuple[str, float]]:
+        """重放得到的账号状态 {用户名: (状态, 有序集合分数)}，已删除的账号不包含在内"""
+        result = {}
+        for username, account in self.accounts.items():
+            status = account["status"]
+            if status is None:
+                continue
+            if status == "available":
+                score = account["since"]
+            else:
+                score = account["until"] if account["until"] is not None else account["since"]
+            result[username] = (status, score)
+        return result
+
+    def top(self, field: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """按某项指标从高到低排列的账号"""
+        ranked = sorted(self.accounts.items(), key=lambda item: item[1][field], reverse=True)
+        return [(username, account[field]) for username, account in ranked[:limit] if account[field]]
+
+    def summary(self) -> Dict:
+        acquires = sum(account["acquires"] for account in self.accounts.values())
+        returned = sum(account["releases"] + account["expired"] for account in self.accounts.values())
+        failures = sum(account["failures"] for account in self.accounts.values())
+        reported = failures + sum(account["successes"] for account in self.accounts.values())
+        statuses = {status: 0 for status in schema.ACCOUNT_STATUSES}
+        for status, _ in self.state().values():
+            statuses[status] += 1
+        return {
+            "events": sum(self.event_counts.values()),
+            "accounts": len(self.accounts),
+            "acquires": acquires,
+            "cooldown_rate": (
+                sum(account["cooldowns"] for account in self.accounts.values()) / returned if returned else 0.0
+            ),
+            "failure_rate": failures / reported if reported else 0.0,
+            "avg_held_seconds": (
+                sum(account["held_seconds"] for account in self.accounts.values()) / returned if returned else 0.0
+            ),
+            "avg_idle_seconds": (
+                sum(account["idle_seconds"] for account in self.accounts.values()) / acquires if acquires else 0.0
+            ),
+            **statuses,
+        }
+
+
+class JournalConsumer:
+    """读取账号池的事件日志"""
+
+    def __init__(self, account_manager: AccountManager, pool_key: str = "account_pool_v3"):
+        self.logger = logging.getLogger("JournalConsumer")
+        self.account_manager = account_manager
+        self.pool_key = pool_key
+        self.journal_key = schema.journal_key(pool_key)
+
+    def iter_events(self, start: str = "-", page_size: int = JOURNAL_PAGE_SIZE) -> Iterator[Dict]:
+        """按顺序分页读取 start 之后（含）的全部事件"""
+        client = self.account_manager.get_redis_client()
+        while True:
+            entries = client.xrange(self.journal_key, min=start, count=page_size)
+            for entry_id, fields in entries:
+                yield decode_event(entry_id, fields)
+            if len(entries) < page_size:
+                return
+            start = f"({entries[-1][0]}"
+
+    def follow(self, last_id: str = "$", stop_event: Optional[threading.Event] = None) -> Iterator[Dict]:
+        """阻塞等待并逐条返回新事件，stop_event 被设置时在当前等待结束后停止"""
+        client = self.account_manager.get_redis_client()
+        while stop_event is None or not stop_event.is_set():
+            response = client.xread(
+                {self.journal_key: last_id}, count=JOURNAL_PAGE_SIZE, block=int(FOLLOW_BLOCK_SECONDS * 1000)
+            )
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    yield decode_event(entry_id, fields)
+
+    def build_metrics(self, start: str = "-") -> JournalMetrics:
+        metrics = JournalMetrics()
+        for event in self.iter_events(start):
+            metrics.apply(event)
+        return metrics
+
+    def rebuild_pool(self, metrics: Optional[JournalMetrics] = None, apply: bool = False) -> Dict[str, int]:
+        """按事件重放的结果校正三个状态集合，返回 {checked, unchanged, corrected, unknown}
+
+        只处理仍在注册集合中、且在事件日志中出现过的账号；日志已被截断时，
+        未出现的账号记为 unknown，保持原状，可再交给 repair_pool 处理。
+        重建与正在运行的获取/释放不互斥，apply 为 True 时应先停止全部任务。
+        """
+        if metrics is None:
+            metrics = self.build_metrics()
+        if not metrics.complete:
+            self.logger.warning("事件日志不是从 reset 开始（已被截断或来自迁移），只能重建日志中出现过的账号")
+
+        client = self.account_manager.get_redis_client()
+        expected = metrics.state()
+        report = {"checked": 0, "unchanged": 0, "corrected": 0, "unknown": 0}
+        status_keys = {status: schema.status_key(self.pool_key, status) for status in schema.ACCOUNT_STATUSES}
+
+        usernames = list(client.sscan_iter(schema.registry_key(self.pool_key), count=schema.ACCOUNT_BATCH_SIZE))
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+            with client.pipeline(transaction=False) as pipe:
+                for username in chunk:
+                    for key in status_keys.values():
+                        pipe.zscore(key, username)
+                scores = pipe.execute()
+
+            corrections = []
+            for index, username in enumerate(chunk):
+                report["checked"] += 1
+                if username not in expected:
+                    report["unknown"] += 1
+                    continue
+                status, score = expected[username]
+                width = len(status_keys)
+                current = dict(zip(status_keys, scores[index * width:(index + 1) * width]))
+                others = [name for name, value in current.items() if name != status and value is not None]
+                if current[status] is not None and not others:
+                    report["unchanged"] += 1
+                else:
+                    corrections.append((username, status, score))
+
+            report["corrected"] += len(corrections)
+            if apply and corrections:
+                with client.pipeline(transaction=True) as pipe:
+                    for username, status, score in corrections:
+                        for name, key in status_keys.items():
+                            if name != status:
+                                pipe.zrem(key, username)
+                        pipe.zadd(status_keys[status], {username: score})
+                    pipe.execute()
+                client.publish(schema.changes_channel(self.pool_key), "rebuild")
+
+        self.logger.info(
+            "按事件日志%s账号池 '%s': 检查 %d 个, 一致 %d 个, %s %d 个, 日志中未出现 %d 个",
+            "重建" if apply else "比较",
+            self.pool_key,
+            report["checked"],
+            report["unchanged"],
+            "已校正" if apply else "需校正",
+            report["corrected"],
+            report["unknown"],
+        )
+        return report
+
+
+# ---- 命令行入口 --------------------------------------------------------
+def _print_report(metrics: JournalMetrics) -> None:
+    summary = metrics.summary()
+    print(f"事件 {summary['events']} 条, 账号 {summary['accounts']} 个, 获取 {summary['acquires']} 次")
+    print(
+        f"当前: 可用 {summary['available']}, 使用中 {summary['in_use']}, 冷却 {summary['cooldown']}, "
+        f"隔离 {summary['quarantined']}; "
+        f"冷却率 {summary['cooldown_rate']:.1%}, 失败率 {summary['failure_rate']:.1%}, "
+        f"平均持有 {summary['avg_held_seconds']:.1f} 秒, "
+        f"平均空闲 {summary['avg_idle_seconds']:.1f} 秒"
+    )
+    print("事件类型: " + ", ".join(f"{name} {count}" for name, count in sorted(metrics.event_counts.items())))
+    for title, field in (
+        ("失败次数最多", "failures"),
+        ("冷却次数最多", "cooldowns"),
+        ("租约过期最多", "expired"),
+        ("空闲时间最长", "idle_seconds"),
+    ):
+        ranked = metrics.top(field)
+        if ranked:
+            print(f"{title}: " + ", ".join(f"{username}({value:g})" for username, value in ranked))
+    if metrics.lane_acquires:
+        print("各通道获取: " + ", ".join(f"{lane} {count}" for lane, count in sorted(metrics.lane_acquires.items())))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default="config.json")
+    known, _ = pre_parser.parse_known_args(argv)
+    defaults = load_redis_defaults(known.config)
+
+    parser = argparse.ArgumentParser(description="账号池事件日志的统计与重建", parents=[pre_parser])
+    parser.add_argument("command", choices=("report", "follow", "rebuild"))
+    parser.add_argument("--pool", default=defaults["pool"], help="账号池键名")
+    parser.add_argument("--host", default=defaults["host"])
+    parser.add_argument("--port", type=int, default=defaults["port"])
+    parser.add_argument("--password", default=defaults["password"])
+    parser.add_argument("--db", type=int, default=defaults["db"])
+    parser.add_argument("--apply", action="store_true", help="rebuild 时写入校正结果")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    manager = AccountManager()
+    manager.update_config(host=args.host, port=args.port, password=args.password, db=args.db)
+    consumer = JournalConsumer(manager, args.pool)
+
+    if args.command == "report":
+        _print_report(consumer.build_metrics())
+    elif args.command == "follow":
+        try:
+            for event in consumer.follow():
+                stamp = time.strftime("%H:%M:%S", time.localtime(event.get("ts", 0)))
+                print(
+                    f"{stamp} {event.get('event', ''):8} {event.get('username', '')} "
+                    f"{event.get('outcome', '')} [{event.get('host', '')}/{event.get('lane', '')}]"
+                )
+        except KeyboardInterrupt:
+            pass
+    else:
+        consumer.rebuild_pool(apply=args.apply)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,157 +1,194 @@
 import json
 import logging
+import os
+import socket
+import threading
 import time
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 import redis
+from redis.backoff import EqualJitterBackoff
+from redis.cluster import RedisCluster
+from redis.commands.core import Script
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import NoScriptError
+from redis.retry import Retry
+
+import account_pool_schema as schema
+import account_pool_snapshot as snapshot
+from account_pool_metrics import CountingConnection, instrumented, metrics
+from account_pool_cache import PoolStateCache
+from local_account_manager import LocalAccountManager
+
+# 账号池存储后端: redis 为共享的远端 Redis，sqlite 为单机嵌入式数据库（local_account_manager）
+ACCOUNT_BACKENDS = ("redis", "sqlite")
+
+# 按连接配置共享的连接池，GUI、TaskThread 及各工作线程复用同一个池
+_connection_pools: Dict[Tuple, redis.BlockingConnectionPool] = {}
+# 集群模式下按连接配置共享的集群客户端，每个客户端内部为各节点维护连接池
+_cluster_clients: Dict[Tuple, RedisCluster] = {}
+_connection_pools_lock = threading.Lock()
+
+
+def _pool_registry_key(config: Dict) -> Tuple:
+    return tuple(sorted((key, value) for key, value in config.items()))
+
+
+def get_connection_pool(config: Dict) -> redis.BlockingConnectionPool:
+    """返回与连接配置对应的共享阻塞连接池，不存在时创建"""
+    registry_key = _pool_registry_key(config)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(registry_key)
+        if pool is None:
+            # 只对建连失败做带抖动的指数退避重试，避免断线时所有线程同时重连
+            retry = Retry(EqualJitterBackoff(cap=5, base=0.2), config["retry_attempts"])
+            pool = redis.BlockingConnectionPool(
+                max_connections=config["max_connections"],
+                timeout=config["pool_timeout"],
+                host=config["host"],
+                port=config["port"],
+                password=config["password"] or None,
+                db=config["db"],
+                decode_responses=True,
+                socket_timeout=5,
+                socket_connect_timeout=5,
+                socket_keepalive=config["socket_keepalive"],
+                health_check_interval=config["health_check_interval"],
+                retry=retry,
+                retry_on_error=[RedisConnectionError],
+                connection_class=CountingConnection,
+            )
+            _connection_pools[registry_key] = pool
+        return pool
+
+
+def get_cluster_client(config: Dict) -> RedisCluster:
+    """返回与连接配置对应的共享集群客户端，不存在时创建；host/port 为任一集群节点"""
+    registry_key = _pool_registry_key(config)
+    with _connection_pools_lock:
+        client = _cluster_clients.get(registry_key)
+        if client is None:
+            retry = Retry(EqualJitterBackoff(cap=5, base=0.2), config["retry_attempts"])
+            client = RedisCluster(
+                host=config["host"],
+                port=config["port"],
+                password=config["password"] or None,
+                decode_responses=True,
+                max_connections=config["max_connections"],
+                socket_timeout=5,
+                socket_connect_timeout=5,
+                socket_keepalive=config["socket_keepalive"],
+                health_check_interval=config["health_check_interval"],
+                retry=retry,
+                connection_class=CountingConnection,
+            )
+            _cluster_clients[registry_key] = client
+        return client
+
+
+def close_connection_pools() -> None:
+    """断开并清空所有共享连接池与集群客户端，程序退出时调用"""
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.disconnect()
+        _connection_pools.clear()
+        for client in _cluster_clients.values():
+            client.close()
+        _cluster_clients.clear()
 
-LUA_ACQUIRE_ACCOUNT = """
-local pool_key = KEYS[1]
-local used_key = KEYS[2]
-local available_index_key = KEYS[3]
-local used_index_key = KEYS[4]
-local now = tonumber(ARGV[1])
-local max_attempts = tonumber(ARGV[2]) or 50
-local attempt = 0
-
-while attempt < max_attempts do
-    attempt = attempt + 1
-    local payload = redis.call('LPOP', pool_key)
-    if not payload then
-        return nil
-    end
-
-    local ok, account = pcall(cjson.decode, payload)
-    if ok and type(account) == 'table' then
-        local username = account['username']
-        account['in_use'] = true
-        account['acquired_at'] = now
-        account['released_at'] = nil
-        account['cooldown_until'] = nil
-        local updated = cjson.encode(account)
-        redis.call('LPUSH', used_key, updated)
-        if username and username ~= '' then
-            redis.call('SREM', available_index_key, username)
-            redis.call('SADD', used_index_key, username)
-        end
-        return updated
-    end
-end
-
-return nil
-"""
-
-LUA_RELEASE_ACCOUNT = """
-local used_key = KEYS[1]
-local pool_key = KEYS[2]
-local used_index_key = KEYS[3]
-local available_index_key = KEYS[4]
-local cooldown_key = KEYS[5]
-local username = ARGV[1]
-local cooldown_seconds = tonumber(ARGV[2]) or 0
-local now = tonumber(ARGV[3])
-local sentinel = '__lua_removed__'
-
-if not username or username == '' then
-    return 0
-end
-
-local length = redis.call('LLEN', used_key)
-local target_payload = nil
-
-for i = 0, length - 1 do
-    local payload = redis.call('LINDEX', used_key, i)
-    if payload then
-        local ok, account = pcall(cjson.decode, payload)
-        if ok and type(account) == 'table' and account['username'] == username then
-            target_payload = payload
-            redis.call('LSET', used_key, i, sentinel)
-            break
-        end
-    end
-end
-
-if not target_payload then
-    return 0
-end
-
-redis.call('LREM', used_key, 1, sentinel)
-
-local ok, account = pcall(cjson.decode, target_payload)
-if not ok or type(account) ~= 'table' then
-    return 0
-end
-
-account['in_use'] = false
-account['released_at'] = now
-account['acquired_at'] = nil
-account['cooldown_until'] = nil
-
-redis.call('SREM', used_index_key, username)
-redis.call('SREM', available_index_key, username)
-
-if cooldown_seconds > 0 then
-    local ready_at = now + cooldown_seconds
-    account['cooldown_until'] = ready_at
-    local updated = cjson.encode(account)
-    redis.call('ZADD', cooldown_key, ready_at, updated)
-    return 1
-else
-    local updated = cjson.encode(account)
-    redis.call('RPUSH', pool_key, updated)
-    redis.call('SADD', available_index_key, username)
-    return 1
-end
-"""
-
-from redis.exceptions import WatchError
+
+def create_account_manager(backend: str = "redis"):
+    """按后端名创建账号管理器，两种后端的公开方法同名同参"""
+    if backend == "sqlite":
+        return LocalAccountManager()
+    if backend != "redis":
+        raise ValueError(f"未知的账号池后端: {backend}")
+    return AccountManager()
 
 
 class AccountManager:
+    backend = "redis"
+
     def __init__(self):
         self.logger = logging.getLogger("AccountManager")
         self.redis_client: Optional[redis.Redis] = None
+        self._client_lock = threading.Lock()
+        # 已确认完成 v3 -> v4 迁移的账号池，避免每次调用都检查旧结构
+        self._migrated_pools: Set[str] = set()
+        # 已注册的 Lua 脚本，调用时走 EVALSHA
+        self._scripts: Dict[str, Script] = {}
+        # 事件日志中记录的主机名与各线程的工作通道
+        self.host = socket.gethostname()
+        self.journal_max_length = schema.JOURNAL_MAX_LENGTH
+        self._lane = threading.local()
+        # 状态统计与账号列表的本地缓存，由账号池改动通知失效
+        self.cache_enabled = True
+        self.cache = PoolStateCache(self.get_redis_client)
+        # 各操作的延迟、往返与重试统计，进程内所有管理器共享
+        self.metrics = metrics
         self.config = {
             "host": "localhost",
             "port": 6379,
             "password": "",
             "db": 0,
+            "cluster": False,
+            **schema.DEFAULT_POOL_OPTIONS,
         }
 
-    def update_config(self, host="localhost", port=6379, password="", db=0):
-        """更新 Redis 连接配置"""
+    def update_config(
+        self,
+        host="localhost",
+        port=6379,
+        password="",
+        db=0,
+        max_connections=schema.DEFAULT_POOL_OPTIONS["max_connections"],
+        pool_timeout=schema.DEFAULT_POOL_OPTIONS["pool_timeout"],
+        health_check_interval=schema.DEFAULT_POOL_OPTIONS["health_check_interval"],
+        socket_keepalive=schema.DEFAULT_POOL_OPTIONS["socket_keepalive"],
+        retry_attempts=schema.DEFAULT_POOL_OPTIONS["retry_attempts"],
+        cluster=False,
+    ):
+        """更新 Redis 连接配置，cluster 为 True 时按 Redis Cluster 连接（忽略 db）"""
         self.config.update({
             "host": host,
             "port": port,
             "password": password,
             "db": db,
+            "cluster": cluster,
+            "max_connections": max_connections,
+            "pool_timeout": pool_timeout,
+            "health_check_interval": health_check_interval,
+            "socket_keepalive": socket_keepalive,
+            "retry_attempts": retry_attempts,
         })
 
-        # 重新建立连接
-        self.redis_client = None
-        self.logger.info(f"更新 Redis 配置: {host}:{port}, DB: {db}")
+        # 切换到新配置对应的共享连接池
+        with self._client_lock:
+            self.redis_client = None
+        self.cache.stop()
+        self._migrated_pools.clear()
+        self._scripts.clear()
+        self.logger.info(
+            f"更新 Redis 配置: {host}:{port}, {'集群模式' if cluster else f'DB: {db}'}, 最大连接数: {max_connections}"
+        )
 
     def get_redis_client(self) -> redis.Redis:
-        """延迟初始化 Redis 客户端"""
-        if self.redis_client is None:
-            try:
-                self.redis_client = redis.Redis(
-                    host=self.config["host"],
-                    port=self.config["port"],
-                    password=self.config["password"] or None,
-                    db=self.config["db"],
-                    decode_responses=True,
-                    socket_timeout=5,
-                    socket_connect_timeout=5,
-                )
-                self.redis_client.ping()
-                self.logger.info("Redis 连接成功")
-            except Exception as exc:
-                self.logger.error(f"Redis 连接失败: {exc}")
-                self.redis_client = None
-                raise
-
-        return self.redis_client
+        """延迟初始化绑定到共享连接池的 Redis 客户端，集群模式下为共享的集群客户端"""
+        with self._client_lock:
+            if self.redis_client is None:
+                try:
+                    if self.config["cluster"]:
+                        client = get_cluster_client(self.config)
+                    else:
+                        client = redis.Redis(connection_pool=get_connection_pool(self.config))
+                    client.ping()
+                    self.redis_client = client
+                    self.logger.info("Redis 连接成功")
+                except Exception as exc:
+                    self.logger.error(f"Redis 连接失败: {exc}")
+                    raise
+
+            return self.redis_client
 
     def test_connection(self) -> bool:
         """测试 Redis 连接是否可用"""
@@ -163,20 +200,96 @@ class AccountManager:
             self.logger.error(f"Redis 连接测试失败: {exc}")
             return False
 
-    # ---- Redis key helpers -------------------------------------------------
-    def _used_list_key(self, pool_key: str) -> str:
-        return f"{pool_key}:used"
+    @staticmethod
+    def check_connection(host, port, password="", db=0) -> bool:
+        """测试一组连接参数是否可用，使用一次性连接，不创建共享连接池"""
+        client = redis.Redis(
+            host=host,
+            port=port,
+            password=password or None,
+            db=db,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+        )
+        try:
+            return bool(client.ping())
+        except Exception as exc:
+            logging.getLogger("AccountManager").error(f"Redis 连接测试失败: {exc}")
+            return False
+        finally:
+            client.close()
 
-    def _available_index_key(self, pool_key: str) -> str:
-        return f"{pool_key}:available_index"
+    def set_lane(self, lane: str) -> None:
+        """设置当前线程写入事件日志的工作通道，未设置时使用线程名"""
+        self._lane.name = lane
 
-    def _used_index_key(self, pool_key: str) -> str:
-        return f"{pool_key}:used_index"
+    def close(self) -> None:
+        """停止本地缓存的订阅线程；共享连接池由 close_connection_pools 关闭"""
+        self.cache.stop()
 
-    def _cooldown_zset_key(self, pool_key: str) -> str:
-        return f"{pool_key}:cooldown"
+    def get_stats(self) -> Dict:
+        """各操作按账号池统计的延迟分布、Redis 往返、建连与重试次数，以及脚本调用耗时"""
+        return self.metrics.stats()
 
     # ---- 内部工具方法 ------------------------------------------------------
+    def _journal_context(self) -> List:
+        lane = getattr(self._lane, "name", None) or threading.current_thread().name
+        return schema.journal_context(lane, self.host, self.journal_max_length)
+
+    def _script(self, client: redis.Redis, lua: str) -> Script:
+        script = self._scripts.get(lua)
+        if script is None:
+            script = client.register_script(lua)
+            self._scripts[lua] = script
+        return script
+
+    def _run_script(self, client: redis.Redis, lua: str, pool_key: str, keys: List[str], args: List):
+        """通过 EVALSHA 执行脚本，服务端缺少脚本缓存时自动回退到 EVAL
+
+        脚本参数前自动加上事件日志上下文。脚本可能改动 pool_key 账号池，执行后失效该账号池的本地缓存，
+        保证本进程随后的读取不必等待改动通知即可看到结果；其他账号池的缓存不受影响。
+        """
+        script = self._script(client, lua)
+        started = time.perf_counter()
+        try:
+            return script(keys=keys, args=[*self._journal_context(), *args], client=client)
+        finally:
+            self.metrics.record_script(schema.SCRIPT_NAMES.get(lua, "other"), time.perf_counter() - started)
+            self.cache.invalidate(pool_key)
+
+    def _run_scripts(self, client: redis.Redis, lua: str, pool_key: str, calls: List[Tuple[List[str], List]]) -> List:
+        """在一次 pipeline 中执行同一脚本的多次调用，返回各次的结果，失败的调用对应位置为异常对象
+
+        服务端缺少脚本缓存时加载脚本，只重新执行返回 NOSCRIPT 的调用；整次 pipeline 记为一次脚本耗时。
+        """
+        script = self._script(client, lua)
+        context = self._journal_context()
+        results: List = [None] * len(calls)
+        pending = list(range(len(calls)))
+        started = time.perf_counter()
+        try:
+            for attempt in range(2):
+                with client.pipeline(transaction=False) as pipe:
+                    for index in pending:
+                        keys, args = calls[index]
+                        pipe.evalsha(script.sha, len(keys), *keys, *context, *args)
+                    replies = pipe.execute(raise_on_error=False)
+                for index, reply in zip(pending, replies):
+                    results[index] = reply
+                pending = [index for index, reply in zip(pending, replies) if isinstance(reply, NoScriptError)]
+                if not pending or attempt:
+                    break
+                script.sha = client.script_load(lua)
+            return results
+        finally:
+            self.metrics.record_script(schema.SCRIPT_NAMES.get(lua, "other"), time.perf_counter() - started)
+            self.cache.invalidate(pool_key)
+
+    def _use_cache(self) -> bool:
+        if self.cache_enabled:
+            self.cache.start()
+        return self.cache_enabled
+
     def _safe_load(self, payload: str, source: str) -> Optional[Dict]:
         try:
             return json.loads(payload)
@@ -184,173 +297,164 @@ class AccountManager:
             self.logger.warning(f"无法解析账号数据({source}): {payload}")
             return None
 
-    def _normalize_pool(self, client: redis.Redis, pool_key: str) -> None:
-        """去重并重建账号池结构，包含冷却集合"""
-        used_key = self._used_list_key(pool_key)
-        available_index_key = self._available_index_key(pool_key)
-        used_index_key = self._used_index_key(pool_key)
-        cooldown_key = self._cooldown_zset_key(pool_key)
-
-        available_raw = client.lrange(pool_key, 0, -1)
-        used_raw = client.lrange(used_key, 0, -1)
-        cooldown_raw = client.zrange(cooldown_key, 0, -1, withscores=True)
-
-        seen_usernames = set()
-        normalized_available = []
-        normalized_used = []
-        normalized_cooldown = []
-        available_usernames = []
-        used_usernames = []
-
-        # 优先保留占用中的账号
-        for entry in used_raw:
-            account = self._safe_load(entry, used_key)
-            if not account:
-                continue
-            username = account.get("username")
-            if not username or username in seen_usernames:
-                continue
-            account["in_use"] = True
-            account.pop("cooldown_until", None)
-            normalized_used.append(json.dumps(account, ensure_ascii=False))
-            used_usernames.append(username)
-            seen_usernames.add(username)
-
-        # 处理冷却中的账号
-        for entry, score in cooldown_raw:
-            account = self._safe_load(entry, cooldown_key)
-            if not account:
-                continue
-            username = account.get("username")
-            if not username or username in seen_usernames:
-                continue
-            account["in_use"] = False
-            try:
-                cooldown_until = float(score)
-            except (TypeError, ValueError):
-                cooldown_until = time.time() + 5
-            account["cooldown_until"] = cooldown_until
-            normalized_cooldown.append((json.dumps(account, ensure_ascii=False), cooldown_until))
-            seen_usernames.add(username)
-
-        # 最后填充可用账号
-        for entry in available_raw:
-            account = self._safe_load(entry, pool_key)
-            if not account:
-                continue
-            username = account.get("username")
-            if not username or username in seen_usernames:
-                continue
-            account["in_use"] = False
-            account.pop("cooldown_until", None)
-            normalized_available.append(json.dumps(account, ensure_ascii=False))
-            available_usernames.append(username)
-            seen_usernames.add(username)
-
-        with client.pipeline() as pipe:
-            pipe.delete(pool_key, used_key, available_index_key, used_index_key, cooldown_key)
-            if normalized_available:
-                pipe.rpush(pool_key, *normalized_available)
-            if normalized_used:
-                pipe.rpush(used_key, *normalized_used)
-            if normalized_cooldown:
-                pipe.zadd(cooldown_key, dict(normalized_cooldown))
-            if available_usernames:
-                pipe.sadd(available_index_key, *available_usernames)
-            if used_usernames:
-                pipe.sadd(used_index_key, *used_usernames)
-            pipe.execute()
+    @instrumented("requeue_cooldown")
+    def _requeue_expired_cooldown(self, client: redis.Redis, pool_key: str) -> int:
+        """将冷却到期的账号重新加入可用集合；有冷却回收进程时由其负责，这里直接返回 0"""
+        requeued = 0
+        try:
+            while True:
+                promoted = int(self._run_script(
+                    client,
+                    schema.LUA_REQUEUE_COOLDOWN,
+                    pool_key,
+                    schema.pool_script_keys(pool_key),
+                    schema.requeue_args(time.time()),
+                ))
+                requeued += promoted
+                if promoted < schema.COOLDOWN_PROMOTE_BATCH:
+                    break
+                self.metrics.record_retry()
+        except Exception as exc:
+            self.logger.error(f"处理冷却账号失败: {exc}")
 
-        self.logger.info(
-            "账号池重建: 可用 %d 个, 使用中 %d 个, 冷却 %d 个",
-            len(available_usernames),
-            len(used_usernames),
-            len(normalized_cooldown),
-        )
+        if requeued:
+            self.logger.info("从冷却池恢复 %d 个账号", requeued)
+        return requeued
 
-    def _requeue_expired_cooldown(self, client: redis.Redis, pool_key: str) -> int:
-        """将冷却到期的账号重新加入可用列表"""
-        cooldown_key = self._cooldown_zset_key(pool_key)
-        available_index_key = self._available_index_key(pool_key)
+    @instrumented("migrate_untagged")
+    def _migrate_untagged(self, client: redis.Redis, pool_key: str) -> int:
+        """把无哈希标签的旧 v4 键分批移到带标签的键名，返回迁移的用户名数
 
-        while True:
-            try:
-                with client.pipeline() as pipe:
-                    pipe.watch(cooldown_key, pool_key, available_index_key)
-                    now = time.time()
-                    expired_entries = pipe.zrangebyscore(cooldown_key, 0, now)
-                    if not expired_entries:
-                        pipe.unwatch()
-                        return 0
-
-                    seen_usernames = set()
-                    payloads = []
-                    usernames = []
-                    for entry in expired_entries:
-                        account = self._safe_load(entry, cooldown_key)
-                        if not account:
-                            continue
-                        username = account.get("username")
-                        if not username or username in seen_usernames:
-                            continue
-                        account["in_use"] = False
-                        account.pop("cooldown_until", None)
-                        payloads.append(json.dumps(account, ensure_ascii=False))
-                        usernames.append(username)
-                        seen_usernames.add(username)
-
-                    pipe.multi()
-                    pipe.zremrangebyscore(cooldown_key, 0, now)
-                    if payloads:
-                        pipe.rpush(pool_key, *payloads)
-                    if usernames:
-                        pipe.sadd(available_index_key, *usernames)
-                    pipe.execute()
+        旧键与新键不在同一槽位，需在迁移到 Redis Cluster 之前于单实例上完成；
+        没有旧键时只做一次 EXISTS 检查，不执行跨槽位的脚本。
+        """
+        if not client.exists(*schema.untagged_keys(pool_key)):
+            return 0
 
-                    if payloads:
-                        self.logger.info("从冷却池恢复 %d 个账号", len(payloads))
-                        return len(payloads)
-                    return 0
+        migrated = 0
+        while True:
+            moved, remaining = self._run_script(
+                client,
+                schema.LUA_MIGRATE_UNTAGGED,
+                pool_key,
+                schema.migrate_untagged_keys(pool_key),
+                schema.migrate_untagged_args(time.time()),
+            )
+            migrated += int(moved)
+            if not int(remaining):
+                break
+
+        self.logger.info("账号池 '%s' 迁移到带哈希标签的键名: %d 个账号", pool_key, migrated)
+        return migrated
+
+    @instrumented("migrate_v3")
+    def _migrate_v3(
+        self, client: redis.Redis, pool_key: str, lease_seconds: float = schema.DEFAULT_LEASE_SECONDS
+    ) -> Tuple[int, int]:
+        """把 v3 结构分批迁移到 v4，返回 (迁移的账号数, 丢弃的重复条目数)
+
+        每批在一次脚本调用内原子完成，迁移期间账号池可以照常获取和释放。
+        没有租约的旧使用中账号按 acquired_at + lease_seconds 登记租约。
+        v3 键不带哈希标签，与 v4 键不在同一槽位；没有 v3 键时不执行迁移脚本。
+        """
+        migrated = duplicates = 0
+        if not client.exists(*schema.v3_keys(pool_key)):
+            self._migrated_pools.add(pool_key)
+            return migrated, duplicates
 
-            except WatchError:
+        while True:
+            moved, dropped, remaining = self._run_script(
+                client,
+                schema.LUA_MIGRATE_V3,
+                pool_key,
+                schema.migrate_keys(pool_key),
+                schema.migrate_args(time.time(), lease_seconds),
+            )
+            migrated += int(moved)
+            duplicates += int(dropped)
+            if not int(remaining):
+                break
+
+        self._migrated_pools.add(pool_key)
+        if migrated or duplicates:
+            self.logger.info("账号池 '%s' 迁移到 v4: 迁移 %d 个账号, 丢弃重复 %d 条", pool_key, migrated, duplicates)
+        return migrated, duplicates
+
+    def _ensure_pool(self, client: redis.Redis, pool_key: str) -> None:
+        """每个账号池在本进程内首次写操作前，检查并迁移无标签的旧键名与旧版 v3 结构"""
+        if pool_key not in self._migrated_pools:
+            with self.metrics.operation("ensure_pool", pool_key):
+                self._migrate_untagged(client, pool_key)
+                self._migrate_v3(client, pool_key)
+
+    def _load_accounts(self, client: redis.Redis, pool_key: str, entries: List, status: str) -> List[Dict]:
+        """按 (用户名, 分数) 列表批量读取账号哈希"""
+        with client.pipeline(transaction=False) as pipe:
+            for username, _ in entries:
+                pipe.hgetall(schema.account_key(pool_key, username))
+            rows = pipe.execute()
+
+        accounts = []
+        for (username, score), fields in zip(entries, rows):
+            if not fields:
                 continue
-            except Exception as exc:
-                self.logger.error(f"处理冷却账号失败: {exc}")
-                return 0
-
-    def _ensure_indexes(self, client: redis.Redis, pool_key: str) -> None:
-        """检测索引是否缺失或失真，必要时触发修复"""
-        used_key = self._used_list_key(pool_key)
-        available_index_key = self._available_index_key(pool_key)
-        used_index_key = self._used_index_key(pool_key)
-
-        available_len = client.llen(pool_key)
-        used_len = client.llen(used_key)
-        available_index_len = client.scard(available_index_key) if client.exists(available_index_key) else 0
-        used_index_len = client.scard(used_index_key) if client.exists(used_index_key) else 0
-
-        if (
-            (available_len and available_len != available_index_len)
-            or (used_len and used_len != used_index_len)
-            or (available_len and not client.exists(available_index_key))
-            or (used_len and not client.exists(used_index_key))
-        ):
-            self._normalize_pool(client, pool_key)
+            account = schema.decode_account(fields)
+            account.setdefault("username", username)
+            accounts.append(schema.annotate_account(account, status, score))
+        return accounts
+
+    def _delete_pool(self, client: redis.Redis, pool_key: str, pipe) -> int:
+        """向事务 pipeline 追加删除整个账号池的命令，返回原有账号数
+
+        pipeline 中只有同一哈希标签下的键；旧键名与 v3 遗留结构由 _delete_legacy 另行删除。
+        元信息中的 COUNTER_META_FIELDS 不删除，其余字段逐个删除，不会覆盖并发的令牌计数。
+        """
+        usernames = list(client.sscan_iter(schema.registry_key(pool_key), count=schema.ACCOUNT_BATCH_SIZE))
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+            pipe.delete(*[schema.account_key(pool_key, username) for username in chunk])
+        meta_key = schema.meta_key(pool_key)
+        pipe.delete(*[key for key in schema.pool_fixed_keys(pool_key) if key != meta_key], schema.waiters_key(pool_key))
+        meta_fields = [field for field in client.hkeys(meta_key) if field not in schema.COUNTER_META_FIELDS]
+        if meta_fields:
+            pipe.hdel(meta_key, *meta_fields)
+        return len(usernames)
+
+    def _delete_legacy(self, client: redis.Redis, pool_key: str) -> None:
+        """删除无标签的旧 v4 键（含账号哈希）、v3 遗留结构与不再使用的 v4 键，不要求同一槽位"""
+        legacy_registry_key = schema.untagged_keys(pool_key)[3]
+        usernames = list(client.sscan_iter(legacy_registry_key, count=schema.ACCOUNT_BATCH_SIZE))
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+            client.delete(*[f"{legacy_registry_key}:{username}" for username in chunk])
+        client.delete(*schema.untagged_keys(pool_key), *schema.v3_keys(pool_key), *schema.retired_keys(pool_key))
 
     # ---- 对外方法 ----------------------------------------------------------
+    @instrumented("save_accounts")
     def save_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> bool:
-        """保存账号列表到 Redis"""
+        """保存账号列表到 Redis，替换账号池中原有的全部账号"""
         try:
             client = self.get_redis_client()
-            used_key = self._used_list_key(pool_key)
-            available_index_key = self._available_index_key(pool_key)
-            used_index_key = self._used_index_key(pool_key)
+            registry_key = schema.registry_key(pool_key)
+            available_key = schema.available_key(pool_key)
+            now = time.time()
+            context = self._journal_context()
+            journal_key = schema.journal_key(pool_key)
+            journal_max = context[0]
 
             seen_usernames = set()
-            cooldown_key = self._cooldown_zset_key(pool_key)
+            # 整体替换不改变账号池的选择策略，顺序号不回退
+            policy, success_weight, top_k, sequence = client.hmget(
+                schema.meta_key(pool_key), "policy", "success_weight", "top_k", "sequence"
+            )
+            selection = {"policy": policy, "success_weight": success_weight, "top_k": top_k}
 
-            with client.pipeline() as pipe:
-                pipe.delete(pool_key, used_key, available_index_key, used_index_key, cooldown_key)
+            self._delete_legacy(client, pool_key)
+            with client.pipeline(transaction=True) as pipe:
+                # 整体替换时事件日志随账号池一起重建，以 reset 事件开头
+                self._delete_pool(client, pool_key, pipe)
+                if journal_max > 0:
+                    pipe.xadd(journal_key, schema.journal_fields(context, "reset", "", now))
 
                 for account in accounts:
                     username = account.get("username")
@@ -362,19 +466,38 @@ class AccountManager:
                         self.logger.warning(f"跳过重复账号: {username}")
                         continue
 
-                    seen_usernames.add(username)
                     account_data = {
                         "username": username,
                         "password": password,
-                        "in_use": False,
-                        "created_at": time.time(),
+                        "created_at": now,
                     }
-                    payload = json.dumps(account_data, ensure_ascii=False)
-                    pipe.rpush(pool_key, payload)
-                    pipe.sadd(available_index_key, username)
+                    pipe.hset(schema.account_key(pool_key, username), mapping=schema.encode_account(account_data))
+                    pipe.sadd(registry_key, username)
+                    # 按保存顺序取出，且排在之后释放的账号之前
+                    pipe.zadd(available_key, {username: len(seen_usernames)})
+                    if journal_max > 0:
+                        pipe.xadd(
+                            journal_key,
+                            schema.journal_fields(context, "add", username, now),
+                            maxlen=journal_max,
+                            approximate=True,
+                        )
+                    seen_usernames.add(username)
 
+                pipe.hset(
+                    schema.meta_key(pool_key),
+                    mapping={
+                        "version": schema.SCHEMA_VERSION,
+                        "created_at": now,
+                        "sequence": max(int(sequence or 0), len(seen_usernames)),
+                        **{field: value for field, value in selection.items() if value is not None},
+                    },
+                )
                 pipe.execute()
 
+            client.publish(schema.changes_channel(pool_key), "reset")
+            self.cache.invalidate(pool_key)
+            self._migrated_pools.add(pool_key)
             self.logger.info("成功写入 %d 个账号到 '%s'", len(seen_usernames), pool_key)
             return True
 
@@ -382,96 +505,544 @@ class AccountManager:
             self.logger.error(f"保存账号失败: {exc}")
             return False
 
-    def get_all_accounts(self, pool_key: str = "account_pool_v3") -> List[Dict]:
-        """获取账号池的完整列表，包含使用中和冷却中的账号"""
+    def _upsert_chunks(
+        self, client: redis.Redis, pool_key: str, encoded: List[Tuple[str, Dict[str, str]]], update_existing: bool
+    ) -> Iterator[Tuple[int, object]]:
+        """按 ACCOUNT_BATCH_SIZE 分块写入账号，每 PIPELINE_SCRIPT_CALLS 块一次往返
+
+        依次返回 (块内账号数, (added, updated, unchanged) 或异常对象)，失败的块不影响同一 pipeline 中的其他块。
+        """
+        batch = schema.ACCOUNT_BATCH_SIZE
+        chunks = [encoded[start:start + batch] for start in range(0, len(encoded), batch)]
+        keys = schema.upsert_keys(pool_key)
+        for start in range(0, len(chunks), schema.PIPELINE_SCRIPT_CALLS):
+            group = chunks[start:start + schema.PIPELINE_SCRIPT_CALLS]
+            now = time.time()
+            calls = [(keys, schema.upsert_args(chunk, now, update_existing)) for chunk in group]
+            for chunk, result in zip(group, self._run_scripts(client, schema.LUA_UPSERT_ACCOUNTS, pool_key, calls)):
+                if not isinstance(result, Exception):
+                    result = tuple(int(value) for value in result)
+                yield len(chunk), result
+
+    def _remove_usernames(self, client: redis.Redis, pool_key: str, usernames: List[str]) -> int:
+        removed = 0
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            removed += int(self._run_script(
+                client,
+                schema.LUA_REMOVE_ACCOUNTS,
+                pool_key,
+                schema.pool_script_keys(pool_key),
+                schema.remove_args(usernames[start:start + schema.ACCOUNT_BATCH_SIZE], time.time()),
+            ))
+        return removed
+
+    @instrumented("sync_accounts")
+    def sync_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """按差异把账号池同步为给定的账号列表，返回 {added, updated, removed, unchanged, invalid}
+
+        只新增缺少的用户名、更新取值变化的字段、删除列表中已没有的用户名；
+        使用中和冷却中的账号保持原有状态，写入量与变化量成正比。
+        """
+        report = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "invalid": 0}
         try:
             client = self.get_redis_client()
-            self._ensure_indexes(client, pool_key)
-            self._requeue_expired_cooldown(client, pool_key)
-
-            used_key = self._used_list_key(pool_key)
-            cooldown_key = self._cooldown_zset_key(pool_key)
-            accounts_by_username: Dict[str, Dict] = {}
-
-            for entry in client.lrange(pool_key, 0, -1):
-                account = self._safe_load(entry, pool_key)
-                if not account:
+            self._ensure_pool(client, pool_key)
+            created_at = time.time()
+
+            wanted: Set[str] = set()
+            encoded = []
+            for account in accounts:
+                entry = schema.encode_new_account(account, created_at)
+                if entry is None:
+                    self.logger.warning(f"忽略无效账号: {account}")
+                    report["invalid"] += 1
                     continue
-                account["in_use"] = False
-                account.pop("cooldown_until", None)
-                account["status"] = "available"
-                username = account.get("username")
-                if username:
-                    accounts_by_username[username] = account
-
-            for entry in client.lrange(used_key, 0, -1):
-                account = self._safe_load(entry, used_key)
-                if not account:
+                if entry[0] in wanted:
+                    self.logger.warning(f"跳过重复账号: {entry[0]}")
+                    report["invalid"] += 1
                     continue
-                account["in_use"] = True
-                account.pop("cooldown_until", None)
-                account["status"] = "in_use"
-                username = account.get("username")
-                if username:
-                    accounts_by_username[username] = account
-
-            for payload, score in client.zrange(cooldown_key, 0, -1, withscores=True):
-                account = self._safe_load(payload, cooldown_key)
-                if not account:
+                wanted.add(entry[0])
+                encoded.append(entry)
+
+            for _, result in self._upsert_chunks(client, pool_key, encoded, True):
+                # 有块写入失败时不再删除多余的账号，避免按不完整的结果删除
+                if isinstance(result, Exception):
+                    raise result
+                added, updated, unchanged = result
+                report["added"] += added
+                report["updated"] += updated
+                report["unchanged"] += unchanged
+
+            stale = [
+                username
+                for username in client.sscan_iter(schema.registry_key(pool_key), count=schema.ACCOUNT_BATCH_SIZE)
+                if username not in wanted
+            ]
+            report["removed"] = self._remove_usernames(client, pool_key, stale)
+
+            self.logger.info(
+                "同步账号池 '%s': 新增 %d, 更新 %d, 删除 %d, 未变 %d",
+                pool_key,
+                report["added"],
+                report["updated"],
+                report["removed"],
+                report["unchanged"],
+            )
+        except Exception as exc:
+            self.logger.error(f"同步账号失败: {exc}")
+        return report
+
+    @instrumented("remove_accounts")
+    def remove_accounts(self, usernames: List[str], pool_key: str = "account_pool_v3") -> int:
+        """从账号池删除指定用户名，返回删除的账号数；使用中的账号在持有者释放时一并清理"""
+        try:
+            client = self.get_redis_client()
+            self._ensure_pool(client, pool_key)
+            removed = self._remove_usernames(client, pool_key, [username for username in usernames if username])
+            self.logger.info("已删除 %d 个账号", removed)
+            return removed
+        except Exception as exc:
+            self.logger.error(f"删除账号失败: {exc}")
+            return 0
+
+    @instrumented("add_accounts")
+    def add_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """向账号池追加账号，已存在的用户名跳过，返回 {imported, duplicates, invalid, failed}
+
+        去重在服务端按注册集合完成，每 ACCOUNT_BATCH_SIZE 个账号一次脚本调用，多次调用合并在一次 pipeline 中。
+        写入出错的账号计入 failed，不计入 imported 与 duplicates。
+        """
+        report = {"imported": 0, "duplicates": 0, "invalid": 0, "failed": 0}
+        created_at = time.time()
+        encoded = []
+        for account in accounts:
+            entry = schema.encode_new_account(account, created_at)
+            if entry is None:
+                report["invalid"] += 1
+            else:
+                encoded.append(entry)
+        if not encoded:
+            return report
+
+        try:
+            client = self.get_redis_client()
+            self._ensure_pool(client, pool_key)
+            for size, result in self._upsert_chunks(client, pool_key, encoded, False):
+                if isinstance(result, Exception):
+                    report["failed"] += size
+                    self.logger.error(f"追加账号失败（{size} 个）: {result}")
                     continue
-                account["in_use"] = False
-                try:
-                    cooldown_until = float(score)
-                except (TypeError, ValueError):
-                    cooldown_until = time.time() + 5
-                account["cooldown_until"] = cooldown_until
-                account["status"] = "cooldown"
-                username = account.get("username")
-                if username:
-                    accounts_by_username[username] = account
+                imported, _, duplicates = result
+                report["imported"] += imported
+                report["duplicates"] += duplicates
+        except Exception as exc:
+            report["failed"] = len(encoded) - report["imported"] - report["duplicates"]
+            self.logger.error(f"追加账号失败: {exc}")
+        return report
 
-            return list(accounts_by_username.values())
+    @instrumented("delete_pool")
+    def delete_pool(self, pool_key: str = "account_pool_v3") -> int:
+        """删除整个账号池，返回删除的账号数"""
+        try:
+            client = self.get_redis_client()
+            self._delete_legacy(client, pool_key)
+            with client.pipeline(transaction=True) as pipe:
+                deleted = self._delete_pool(client, pool_key, pipe)
+                pipe.execute()
+            client.publish(schema.changes_channel(pool_key), "reset")
+            self.cache.invalidate(pool_key)
+            self._migrated_pools.discard(pool_key)
+            self.logger.info("已删除账号池 '%s' 的 %d 个账号", pool_key, deleted)
+            return deleted
+        except Exception as exc:
+            self.logger.error(f"删除账号池失败: {exc}")
+            return 0
 
+    def _snapshot_records(self, client: redis.Redis, pool_key: str, usernames: List[str]) -> List:
+        """一次 pipeline 读取一批账号的原始字段与各状态集合中的分数"""
+        status_keys = [schema.status_key(pool_key, status) for status in snapshot.SNAPSHOT_STATUS_PRIORITY]
+        with client.pipeline(transaction=False) as pipe:
+            for username in usernames:
+                pipe.hgetall(schema.account_key(pool_key, username))
+                for key in status_keys:
+                    pipe.zscore(key, username)
+            results = pipe.execute()
+
+        now = time.time()
+        records = []
+        width = 1 + len(status_keys)
+        for index, username in enumerate(usernames):
+            fields = results[index * width]
+            # 快照期间被删除的账号
+            if not fields:
+                continue
+            scores = dict(zip(snapshot.SNAPSHOT_STATUS_PRIORITY, results[index * width + 1:(index + 1) * width]))
+            status, score = snapshot.pick_status(scores, now)
+            records.append((username, status, score, fields))
+        return records
+
+    @instrumented("snapshot")
+    def snapshot(self, pool_key: str = "account_pool_v3", path: str = "account_pool.snap") -> Optional[Dict[str, int]]:
+        """把账号池流式写入快照文件，返回 {accounts, bytes}，失败时返回 None
+
+        快照期间账号池可以照常使用；同一批账号的字段与状态在一次 pipeline 中读取，不同批次之间不是同一时刻。
+        先写入临时文件，完成后再替换 path，失败时不会留下不完整的快照。
+        """
+        temp_path = f"{path}.tmp"
+        try:
+            client = self.get_redis_client()
+            self._ensure_pool(client, pool_key)
+            seen: Set[str] = set()
+            batch: List[str] = []
+            with open(temp_path, "wb") as handle:
+                writer = snapshot.SnapshotWriter(handle, pool_key, client.hgetall(schema.meta_key(pool_key)))
+                for username in client.sscan_iter(schema.registry_key(pool_key), count=schema.ACCOUNT_BATCH_SIZE):
+                    # SSCAN 可能重复返回同一成员
+                    if username in seen:
+                        continue
+                    seen.add(username)
+                    batch.append(username)
+                    if len(batch) >= snapshot.SNAPSHOT_CHUNK_SIZE:
+                        writer.write_accounts(self._snapshot_records(client, pool_key, batch))
+                        batch = []
+                writer.write_accounts(self._snapshot_records(client, pool_key, batch))
+                writer.close()
+            os.replace(temp_path, path)
+            self.logger.info("账号池 '%s' 已保存快照 %s: %d 个账号, %d 字节", pool_key, path, writer.count, writer.bytes_written)
+            return {"accounts": writer.count, "bytes": writer.bytes_written}
         except Exception as exc:
-            self.logger.error(f"获取账号列表失败: {exc}")
-            return []
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.logger.error(f"保存账号池快照失败: {exc}")
+            return None
 
-    def acquire_account(self, pool_key: str = "account_pool_v3") -> Optional[Dict]:
-        """从账号池原子地取出一个账号并标记为使用中"""
-        client = self.get_redis_client()
-        used_key = self._used_list_key(pool_key)
-        available_index_key = self._available_index_key(pool_key)
-        used_index_key = self._used_index_key(pool_key)
+    @instrumented("restore")
+    def restore(
+        self, path: str, pool_key: Optional[str] = None, replace: bool = False
+    ) -> Optional[Dict[str, int]]:
+        """从快照恢复账号池，pool_key 默认为快照中的账号池；返回 {restored, 各状态账号数}，失败时返回 None
+
+        目标账号池非空时需指定 replace 先清空。账号按快照的帧分批用 pipeline 写入，冷却结束时间、
+        隔离时间与成功/失败统计原样恢复；使用中的账号保留原租约与租约令牌，过期后照常回收。
+        快照不完整时已写入的账号保留，返回 None。
+        """
+        report = {"restored": 0, **{status: 0 for status in schema.ACCOUNT_STATUSES}}
+        try:
+            client = self.get_redis_client()
+            with open(path, "rb") as handle:
+                reader = snapshot.SnapshotReader(handle)
+                pool_key = pool_key or reader.pool_key
+                self._ensure_pool(client, pool_key)
+                meta_key = schema.meta_key(pool_key)
+                # 清空前读取当前元信息，恢复后的计数不低于当前值
+                current_meta = client.hgetall(meta_key)
+                if replace:
+                    self.delete_pool(pool_key)
+                    self._migrated_pools.add(pool_key)
+                elif client.scard(schema.registry_key(pool_key)):
+                    self.logger.error("账号池 '%s' 非空，恢复快照需先清空（replace）", pool_key)
+                    return None
 
-        while True:
-            try:
+                meta = snapshot.merge_meta(current_meta, reader.meta)
+                if meta:
+                    client.hset(meta_key, mapping=meta)
+                registry_key = schema.registry_key(pool_key)
+                for records in reader.iter_chunks():
+                    with client.pipeline(transaction=False) as pipe:
+                        for username, status, score, fields in records:
+                            if status not in schema.ACCOUNT_STATUSES:
+                                status, score = "available", time.time()
+                            key = schema.account_key(pool_key, username)
+                            pipe.delete(key)
+                            pipe.hset(key, mapping=fields)
+                            pipe.sadd(registry_key, username)
+                            pipe.zadd(schema.status_key(pool_key, status), {username: score})
+                            report[status] += 1
+                        pipe.execute()
+                    report["restored"] += len(records)
+                    self.cache.invalidate(pool_key)
+
+            client.publish(schema.changes_channel(pool_key), "reset")
+            self.logger.info(
+                "账号池 '%s' 已从快照 %s 恢复 %d 个账号 (可用 %d, 使用中 %d, 冷却 %d, 隔离 %d)",
+                pool_key, path, report["restored"], report["available"], report["in_use"],
+                report["cooldown"], report["quarantined"],
+            )
+            return report
+        except Exception as exc:
+            self.cache.invalidate(pool_key)
+            self.logger.error(f"恢复账号池快照失败: {exc}")
+            return None
+
+    def get_all_accounts(self, pool_key: str = "account_pool_v3") -> List[Dict]:
+        """获取账号池的完整列表，包含使用中和冷却中的账号；大账号池请改用 iter_accounts 分页读取"""
+        accounts_by_username: Dict[str, Dict] = {}
+        for page in self.iter_accounts(pool_key):
+            for account in page:
+                accounts_by_username.setdefault(account["username"], account)
+        return list(accounts_by_username.values())
+
+    def iter_accounts(
+        self,
+        pool_key: str = "account_pool_v3",
+        status: Optional[str] = None,
+        page_size: int = schema.DEFAULT_PAGE_SIZE,
+        promote_cooldown: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """按页遍历账号池，每页最多 page_size 个账号
+
+        status 为 available / in_use / cooldown / quarantined 时只读取对应的状态集合，为 None 时依次读取全部状态。
+        只读，不会触发 v3 迁移：尚未迁移的 v3 结构在 v4 之后按排名区间分页读取。
+        冷却到期的账号按冷却状态列出，promote_cooldown 为 True 时先执行一次提升（写操作）。
+        v4 状态集合按 (分数, 用户名) 游标分页，遍历期间一直处于同一状态的账号不会遗漏或重复；
+        遍历期间切换状态或重新释放的账号可能出现两次或不出现。
+        完整遍历且期间没有改动的结果写入本地缓存，账号池改动前重复读取不访问 Redis。
+        """
+        if status is not None and status not in schema.ACCOUNT_STATUSES:
+            self.logger.warning(f"未知的账号状态筛选: {status}")
+            return
+
+        page_size = max(1, int(page_size))
+        statuses = [status] if status else list(schema.ACCOUNT_STATUSES)
+
+        use_cache = self._use_cache()
+        cached = self.cache.get_listing(pool_key, status) if use_cache else None
+        if cached is not None:
+            for start in range(0, len(cached), page_size):
+                yield cached[start:start + page_size]
+            return
+
+        try:
+            client = self.get_redis_client()
+            if promote_cooldown and status != "in_use":
                 self._requeue_expired_cooldown(client, pool_key)
-                result = client.eval(
-                    LUA_ACQUIRE_ACCOUNT,
-                    4,
-                    pool_key,
-                    used_key,
-                    available_index_key,
-                    used_index_key,
-                    time.time(),
-                    100,
+
+            generation = self.cache.generation(pool_key)
+            # 冷却到期会改变列表但不发布通知，缓存在最早的冷却到期时间失效
+            earliest = client.zrange(schema.cooldown_key(pool_key), 0, 0, withscores=True)
+            collected: Optional[List[Dict]] = [] if use_cache else None
+            for current in statuses:
+                for page in self._iter_status(client, pool_key, current, page_size):
+                    if page:
+                        if collected is not None:
+                            collected.extend(page)
+                        yield page
+
+            if client.exists(*schema.v3_keys(pool_key)[:4]):
+                # v3 结构的改动不发布通知，不缓存
+                collected = None
+                for current in statuses:
+                    for page in self._iter_v3_status(client, pool_key, current, page_size):
+                        if page:
+                            yield page
+
+            if collected is not None:
+                expires_at = float(earliest[0][1]) if earliest else float("inf")
+                self.cache.put_listing(pool_key, status, collected, generation, expires_at)
+        except Exception as exc:
+            self.logger.error(f"分页获取账号列表失败: {exc}")
+
+    def _iter_status(self, client: redis.Redis, pool_key: str, status: str, page_size: int) -> Iterator[List[Dict]]:
+        zset_key = schema.status_key(pool_key, status)
+        cursor, seen = None, 0
+        while True:
+            count = page_size + seen
+            low = cursor[0] if cursor else "-inf"
+            entries = client.zrangebyscore(zset_key, low, "+inf", start=0, num=count, withscores=True)
+            page, cursor, seen = schema.cursor_page(entries, cursor)
+            yield self._load_accounts(client, pool_key, page, status)
+            if len(entries) < count:
+                break
+
+    def _iter_v3_status(
+        self, client: redis.Redis, pool_key: str, status: str, page_size: int
+    ) -> Iterator[List[Dict]]:
+        """兼容读取尚未迁移的 v3 结构，v3 没有隔离状态"""
+        if status == "quarantined":
+            return
+        if status == "cooldown":
+            cooldown_key = schema.v3_cooldown_key(pool_key)
+            start = 0
+            while True:
+                entries = client.zrange(cooldown_key, start, start + page_size - 1, withscores=True)
+                page = []
+                for payload, score in entries:
+                    account = self._safe_load(payload, cooldown_key)
+                    if account and account.get("username"):
+                        page.append(schema.annotate_account(account, status, score))
+                yield page
+                if len(entries) < page_size:
+                    break
+                start += page_size
+            return
+
+        if status == "in_use":
+            used_map_key = schema.v3_used_map_key(pool_key)
+            cursor = 0
+            while True:
+                cursor, entries = client.hscan(used_map_key, cursor, count=page_size)
+                yield self._load_v3_page(entries.values(), used_map_key, status)
+                if int(cursor) == 0:
+                    break
+            list_key = schema.v3_used_list_key(pool_key)
+        else:
+            list_key = schema.v3_available_key(pool_key)
+
+        start = 0
+        while True:
+            entries = client.lrange(list_key, start, start + page_size - 1)
+            yield self._load_v3_page(entries, list_key, status)
+            if len(entries) < page_size:
+                break
+            start += page_size
+
+    def _load_v3_page(self, entries, source: str, status: str) -> List[Dict]:
+        page = []
+        for entry in entries:
+            account = self._safe_load(entry, source)
+            if account and account.get("username"):
+                page.append(schema.annotate_account(account, status))
+        return page
+
+    def _acquire_batch(
+        self,
+        client: redis.Redis,
+        pool_key: str,
+        count: int,
+        lease_seconds: float,
+        ticket: Optional[str] = None,
+        wait_until: Optional[float] = None,
+    ) -> Tuple[List[Dict], Optional[float], Optional[str]]:
+        """一次脚本调用内回收过期租约、提升冷却到期账号并取出最多 count 个账号
+
+        取到的账号不足 count 个时，同时返回最早的冷却到期时间；给出 wait_until 时登记或沿用排队票据，
+        返回仍在排队的票据，账号按票据顺序分配。
+        """
+        self._ensure_pool(client, pool_key)
+        now = time.time()
+        result = self._run_script(
+            client,
+            schema.LUA_ACQUIRE_ACCOUNT,
+            pool_key,
+            schema.pool_script_keys(pool_key),
+            schema.acquire_args(now, count, lease_seconds, ticket, wait_until),
+        )
+        accounts, next_ready_at, ticket = schema.parse_acquire_result(result)
+        for account in accounts:
+            schema.annotate_account(account, "in_use", now + lease_seconds)
+        return accounts, next_ready_at, ticket
+
+    def _wait_for_grant(
+        self, client: redis.Redis, pool_key: str, ticket: str, timeout: float, lease_seconds: float
+    ) -> Optional[Dict]:
+        """阻塞等待分给票据的账号；收到重新计算等待的令牌或超时返回 None"""
+        popped = client.blpop([schema.grant_key(pool_key, ticket)], timeout=timeout)
+        if not popped or not popped[1]:
+            return None
+        username = popped[1]
+        fields = client.hgetall(schema.account_key(pool_key, username))
+        if not fields:
+            return None
+        account = schema.decode_account(fields)
+        account.setdefault("username", username)
+        return schema.annotate_account(account, "in_use", time.time() + lease_seconds)
+
+    def _cancel_wait(self, client: redis.Redis, pool_key: str, ticket: str, lease_seconds: float) -> Optional[Dict]:
+        """撤销排队票据；撤销前已分到的账号照常返回给调用方"""
+        now = time.time()
+        fields = self._run_script(
+            client,
+            schema.LUA_CANCEL_WAIT,
+            pool_key,
+            schema.pool_script_keys(pool_key),
+            schema.cancel_wait_args(ticket, now),
+        )
+        if not fields:
+            return None
+        return schema.annotate_account(schema.decode_account(fields), "in_use", now + lease_seconds)
+
+    def _abandon_wait(self, client: redis.Redis, pool_key: str, ticket: str, lease_seconds: float) -> None:
+        """出错时撤销票据，已分到的账号放回账号池"""
+        try:
+            account = self._cancel_wait(client, pool_key, ticket, lease_seconds)
+            if account is not None:
+                self.release_account(account, pool_key)
+        except Exception:
+            # 撤销失败时票据过了截止时间会被丢弃，已分到的账号由租约到期回收
+            pass
+
+    @instrumented("acquire_account")
+    def acquire_account(
+        self,
+        pool_key: str = "account_pool_v3",
+        timeout: Optional[float] = None,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> Optional[Dict]:
+        """从账号池原子地取出一个账号并标记为使用中
+
+        timeout 为 None 或 0 时立即返回；大于 0 时在服务端排队等待，
+        直到分到账号或超时。等待者按到达顺序登记票据，释放、冷却到期的账号
+        先分给最早的票据，争用时不会有线程一直抢不到。取出的账号带有
+        lease_seconds 秒的租约，持有期间需通过 renew_lease 续约，否则会被自动回收。
+        """
+        ticket = None
+        try:
+            client = self.get_redis_client()
+            deadline = time.time() + timeout if timeout and timeout > 0 else None
+
+            while True:
+                accounts, next_ready_at, ticket = self._acquire_batch(
+                    client, pool_key, 1, lease_seconds, ticket, deadline
                 )
-                if result is None:
-                    self.logger.warning(f"账号池 '{pool_key}' 暂无可用账号")
-                    return None
+                account = accounts[0] if accounts else None
+                remaining = deadline - time.time() if deadline is not None else 0
+                if account is None and ticket:
+                    if remaining <= 0:
+                        account = self._cancel_wait(client, pool_key, ticket, lease_seconds)
+                    else:
+                        wait = min(remaining, schema.BLOCKING_WAIT_SLICE)
+                        if next_ready_at is not None:
+                            wait = min(wait, next_ready_at - time.time())
+                        # BLPOP 超时为 0 表示永久阻塞，这里保留一个最小等待
+                        account = self._wait_for_grant(
+                            client, pool_key, ticket, max(wait, schema.MIN_BLOCKING_WAIT), lease_seconds
+                        )
+                        if account is None:
+                            # 超时或收到令牌: 带着票据重试，没有冷却回收进程时顺带提升冷却到期的账号
+                            self.metrics.record_retry()
+                            continue
+                    ticket = None
 
-                account = self._safe_load(result, pool_key)
-                if account:
+                if account is not None:
                     self.logger.info("取回账号: %s", account.get("username"))
                     return account
+                if remaining <= 0:
+                    self.logger.warning(f"账号池 '{pool_key}' 暂无可用账号")
+                    return None
 
-            except WatchError:
-                continue
-            except Exception as exc:
-                self.logger.error(f"获取账号失败: {exc}")
-                return None
-    def release_account(self, account: Dict, pool_key: str = "account_pool_v3", cooldown_seconds: int = 0) -> bool:
-        """释放账号，并根据需要推入冷却队列"""
+        except Exception as exc:
+            if ticket:
+                self._abandon_wait(client, pool_key, ticket, lease_seconds)
+            self.logger.error(f"获取账号失败: {exc}")
+            return None
+
+    @instrumented("release_account")
+    def release_account(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> bool:
+        """释放账号，并根据需要推入冷却队列
+
+        outcome 为本次使用结果（success / failure），累计到账号的成功/失败次数；
+        failure 时忽略 cooldown_seconds，由释放脚本按连续失败次数指数退避，连续失败过多的账号被隔离。
+        success 为旧参数，True / False 等同于 outcome 的 success / failure。
+        account 须为获取时返回的账号字典，其中的 lease_token 与账号当前的租约令牌不符时
+        （租约过期被回收后已分给其他持有者）不释放，返回 False。
+        """
         if not account:
             self.logger.warning("release_account 收到空账号对象")
             return False
@@ -481,83 +1052,279 @@ class AccountManager:
             self.logger.warning(f"release_account 缺少用户名: {account}")
             return False
 
-        client = self.get_redis_client()
-        cooldown_seconds = max(0, int(cooldown_seconds or 0))
-        used_key = self._used_list_key(pool_key)
-        pool_key_main = pool_key
-        used_index_key = self._used_index_key(pool_key)
-        available_index_key = self._available_index_key(pool_key)
-        cooldown_key = self._cooldown_zset_key(pool_key)
-
         try:
-            released = client.eval(
-                LUA_RELEASE_ACCOUNT,
-                5,
-                used_key,
-                pool_key_main,
-                used_index_key,
-                available_index_key,
-                cooldown_key,
-                username,
-                cooldown_seconds,
-                time.time(),
+            client = self.get_redis_client()
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, quarantined, stale = self._release_usernames(
+                client, pool_key, [username], cooldown_seconds, outcome, [account.get("lease_token")]
             )
+            if stale:
+                self.logger.warning("账号 %s 的租约令牌已失效（租约过期后已重新分配），跳过释放", username)
+                return False
             if released:
-                if cooldown_seconds > 0:
+                if quarantined:
+                    self.logger.warning(
+                        "账号 %s 连续失败 %d 次，已隔离", username, schema.QUARANTINE_AFTER_FAILURES
+                    )
+                elif outcome == "failure":
+                    self.logger.info("账号 %s 使用失败，按连续失败次数进入冷却", username)
+                elif cooldown_seconds > 0:
                     self.logger.info("账号 %s 进入冷却 %s 秒", username, cooldown_seconds)
                 else:
                     self.logger.info("释放账号: %s", username)
                 return True
             else:
-                self.logger.warning(f"账号 '%s' 不在使用列表中，跳过释放", username)
+                self.logger.warning("账号 '%s' 不在使用列表中，跳过释放", username)
                 return False
         except Exception as exc:
             self.logger.error(f"释放账号失败: {exc}")
             return False
-    def get_account_status(self, pool_key: str = "account_pool_v3") -> Dict:
-        """返回账号池状态统计"""
+
+    def _release_usernames(
+        self,
+        client: redis.Redis,
+        pool_key: str,
+        usernames: List[str],
+        cooldown_seconds: int,
+        outcome: Optional[str] = None,
+        tokens: Optional[List] = None,
+    ) -> Tuple[int, int, int]:
+        """按批次调用释放脚本，返回 (实际释放的账号数, 其中被隔离的账号数, 租约令牌不符被拒绝的账号数)
+
+        tokens 为与 usernames 对应的租约令牌，为 None 时不校验（管理操作）。
+        """
+        self._ensure_pool(client, pool_key)
+        released = quarantined = stale = 0
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+            chunk_tokens = tokens[start:start + schema.ACCOUNT_BATCH_SIZE] if tokens is not None else None
+            result = self._run_script(
+                client,
+                schema.LUA_RELEASE_ACCOUNT,
+                pool_key,
+                schema.pool_script_keys(pool_key),
+                schema.release_args(chunk, cooldown_seconds, time.time(), outcome, chunk_tokens),
+            )
+            released += int(result[0])
+            quarantined += int(result[1])
+            stale += int(result[2])
+        return released, quarantined, stale
+
+    @instrumented("acquire_many")
+    def acquire_many(
+        self,
+        pool_key: str = "account_pool_v3",
+        count: int = 1,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> List[Dict]:
+        """一次性取出最多 count 个账号，账号不足时返回已取到的部分"""
         try:
             client = self.get_redis_client()
-            self._ensure_indexes(client, pool_key)
-            self._requeue_expired_cooldown(client, pool_key)
+            accounts: List[Dict] = []
+            while len(accounts) < count:
+                batch_size = min(count - len(accounts), schema.ACCOUNT_BATCH_SIZE)
+                batch, _, _ = self._acquire_batch(client, pool_key, batch_size, lease_seconds)
+                accounts.extend(batch)
+                if len(batch) < batch_size:
+                    break
+
+            if len(accounts) < count:
+                self.logger.warning(f"账号池 '{pool_key}' 仅取到 {len(accounts)}/{count} 个账号")
+            else:
+                self.logger.info("批量取回 %d 个账号", len(accounts))
+            return accounts
+
+        except Exception as exc:
+            self.logger.error(f"批量获取账号失败: {exc}")
+            return []
+
+    @instrumented("release_many")
+    def release_many(
+        self,
+        accounts: List[Dict],
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> int:
+        """批量释放账号，返回实际释放的个数；outcome / success 与租约令牌的含义同 release_account"""
+        accounts = [account for account in accounts or [] if account and account.get("username")]
+        if not accounts:
+            return 0
+        usernames = [account["username"] for account in accounts]
 
-            available_count = client.llen(pool_key)
-            used_count = client.llen(self._used_list_key(pool_key))
-            cooldown_count = client.zcard(self._cooldown_zset_key(pool_key))
+        try:
+            client = self.get_redis_client()
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, quarantined, stale = self._release_usernames(
+                client, pool_key, usernames, cooldown_seconds, outcome,
+                [account.get("lease_token") for account in accounts],
+            )
+            if stale:
+                self.logger.warning("批量释放: %d 个账号的租约令牌已失效，跳过", stale)
+            if outcome == "failure":
+                self.logger.info("批量释放 %d/%d 个失败账号, 其中隔离 %d 个", released, len(usernames), quarantined)
+            else:
+                self.logger.info("批量释放 %d/%d 个账号, 冷却 %s 秒", released, len(usernames), cooldown_seconds)
+            return released
+        except Exception as exc:
+            self.logger.error(f"批量释放账号失败: {exc}")
+            return 0
+
+    def set_selection_policy(
+        self,
+        pool_key: str = "account_pool_v3",
+        policy: str = schema.DEFAULT_SELECTION_POLICY,
+        success_weight: Optional[float] = None,
+        top_k: Optional[int] = None,
+    ) -> bool:
+        """设置账号池的选择策略（lru / success / random），对之后释放和获取的账号生效"""
+        try:
+            fields = schema.selection_fields(policy, success_weight, top_k)
+            client = self.get_redis_client()
+            client.hset(schema.meta_key(pool_key), mapping=fields)
+            self.logger.info(
+                "账号池 '%s' 选择策略: %s, 成功率权重 %s 秒, top_k %s",
+                pool_key,
+                fields["policy"],
+                fields["success_weight"],
+                fields["top_k"],
+            )
+            return True
+        except Exception as exc:
+            self.logger.error(f"设置选择策略失败: {exc}")
+            return False
+
+    def get_selection_policy(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池当前的选择策略 {policy, success_weight, top_k}"""
+        try:
+            client = self.get_redis_client()
+            policy, success_weight, top_k = client.hmget(
+                schema.meta_key(pool_key), "policy", "success_weight", "top_k"
+            )
             return {
-                "total": available_count + used_count + cooldown_count,
-                "in_use": used_count,
-                "available": available_count,
-                "cooldown": cooldown_count,
+                "policy": policy or schema.DEFAULT_SELECTION_POLICY,
+                "success_weight": float(success_weight) if success_weight is not None else 0.0,
+                "top_k": int(top_k) if top_k is not None else 1,
             }
+        except Exception as exc:
+            self.logger.error(f"获取选择策略失败: {exc}")
+            return {"policy": schema.DEFAULT_SELECTION_POLICY, "success_weight": 0.0, "top_k": 1}
+
+    @instrumented("release_quarantined")
+    def release_quarantined(self, usernames: Optional[List[str]] = None, pool_key: str = "account_pool_v3") -> int:
+        """解除隔离并清零连续失败次数，放回可用集合；usernames 为 None 时解除全部，返回解除的个数"""
+        try:
+            client = self.get_redis_client()
+            self._ensure_pool(client, pool_key)
+            if usernames is None:
+                usernames = list(client.zrange(schema.quarantine_key(pool_key), 0, -1))
+            restored = 0
+            for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+                chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+                restored += int(self._run_script(
+                    client,
+                    schema.LUA_RELEASE_QUARANTINED,
+                    pool_key,
+                    schema.pool_script_keys(pool_key),
+                    schema.release_quarantined_args(chunk, time.time()),
+                ))
+            self.logger.info("账号池 '%s' 解除隔离 %d 个账号", pool_key, restored)
+            return restored
+        except Exception as exc:
+            self.logger.error(f"解除隔离失败: {exc}")
+            return 0
+
+    @instrumented("renew_lease")
+    def renew_lease(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> bool:
+        """为仍在使用中的账号续约，账号已被回收或释放、或租约令牌已失效时返回 False"""
+        username = (account or {}).get("username")
+        if not username:
+            self.logger.warning(f"renew_lease 缺少用户名: {account}")
+            return False
+
+        try:
+            client = self.get_redis_client()
+            now = time.time()
+            renewed = self._run_script(
+                client,
+                schema.LUA_RENEW_LEASE,
+                pool_key,
+                schema.pool_script_keys(pool_key),
+                schema.renew_args(username, now, lease_seconds, account.get("lease_token")),
+            )
+            if renewed == 1:
+                account["lease_until"] = now + lease_seconds
+                return True
+            if renewed == -1:
+                self.logger.warning("账号 '%s' 的租约令牌已失效（租约过期后已重新分配），续约失败", username)
+                return False
+            self.logger.warning("账号 '%s' 已不在使用中，续约失败", username)
+            return False
+        except Exception as exc:
+            self.logger.error(f"账号续约失败: {exc}")
+            return False
+
+    @instrumented("get_account_status")
+    def get_account_status(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池状态统计，只做一次 pipeline 只读查询，不会触发迁移或重建
+
+        next_cooldown_in 为距离下一个冷却账号到期的秒数，没有冷却中的账号时为 None。
+        结果缓存到账号池下一次改动或最早的冷却到期为止。
+        """
+        try:
+            now = time.time()
+            use_cache = self._use_cache()
+            cached = self.cache.get_status(pool_key, now) if use_cache else None
+            if cached is not None:
+                return cached
+
+            client = self.get_redis_client()
+            generation = self.cache.generation(pool_key)
+            with client.pipeline(transaction=False) as pipe:
+                schema.queue_status_reads(pipe, pool_key, now)
+                results = pipe.execute()
+            status = schema.build_status(results, now)
+            # v3 结构的改动不发布通知，迁移完成前不缓存
+            if use_cache and not schema.has_v3_entries(results):
+                self.cache.put_status(pool_key, status, generation)
+            return status
 
         except Exception as exc:
             self.logger.error(f"获取账号状态失败: {exc}")
-            return {"total": 0, "in_use": 0, "available": 0, "cooldown": 0}
+            return schema.empty_status()
 
+    @instrumented("cleanup_expired_accounts")
     def cleanup_expired_accounts(self, pool_key: str = "account_pool_v3", timeout: int = 3600) -> int:
-        """释放超过 timeout 秒未归还的账号"""
+        """在服务端回收租约已过期的账号
+
+        尚未迁移的 v3 账号池会先完成迁移，没有租约的旧使用中账号按 acquired_at + timeout 登记租约。
+        """
         try:
             client = self.get_redis_client()
-            self._ensure_indexes(client, pool_key)
+            self._migrate_untagged(client, pool_key)
+            self._migrate_v3(client, pool_key, lease_seconds=timeout)
 
-            current_time = time.time()
-            used_key = self._used_list_key(pool_key)
             cleaned_count = 0
-
-            for entry in client.lrange(used_key, 0, -1):
-                account = self._safe_load(entry, used_key)
-                if not account:
-                    continue
-
-                acquired_at = account.get("acquired_at")
-                if (
-                    account.get("in_use")
-                    and isinstance(acquired_at, (int, float))
-                    and current_time - acquired_at > timeout
-                ):
-                    if self.release_account(account, pool_key, cooldown_seconds=30):
-                        cleaned_count += 1
+            while True:
+                reclaimed = int(self._run_script(
+                    client,
+                    schema.LUA_RECLAIM_EXPIRED_LEASES,
+                    pool_key,
+                    schema.pool_script_keys(pool_key),
+                    schema.reclaim_args(time.time()),
+                ))
+                cleaned_count += reclaimed
+                if reclaimed < schema.COOLDOWN_PROMOTE_BATCH:
+                    break
+                self.metrics.record_retry()
 
             if cleaned_count:
                 self.logger.info(f"已回收 {cleaned_count} 个超时账号")
@@ -568,60 +1335,191 @@ class AccountManager:
             self.logger.error(f"清理超时账号失败: {exc}")
             return 0
 
+    @instrumented("release_all_accounts")
     def release_all_accounts(self, pool_key: str = "account_pool_v3") -> int:
-        """逐个释放使用中的账号（无冷却）"""
+        """批量释放所有使用中的账号（无冷却）"""
         try:
             client = self.get_redis_client()
-            used_key = self._used_list_key(pool_key)
-            used_accounts = client.lrange(used_key, 0, -1)
+            self._ensure_pool(client, pool_key)
+            in_use_key = schema.in_use_key(pool_key)
             released = 0
-            for entry in used_accounts:
-                account = self._safe_load(entry, used_key)
-                if not account:
-                    continue
-                if self.release_account(account, pool_key, cooldown_seconds=0):
-                    released += 1
+            while True:
+                usernames = client.zrange(in_use_key, 0, schema.ACCOUNT_BATCH_SIZE - 1)
+                if not usernames:
+                    break
+                released += self._release_usernames(client, pool_key, usernames, 0)[0]
+                if len(usernames) < schema.ACCOUNT_BATCH_SIZE:
+                    break
             self.logger.info("已一键释放 %d 个账号", released)
             return released
         except Exception as exc:
             self.logger.error(f"一键释放账号失败: {exc}")
             return 0
-    def remove_duplicate_accounts(self, pool_key: str = "account_pool_v3") -> Dict[str, int]:
-        """删除重复账号并返回最新统计"""
+
+    @instrumented("repair_pool")
+    def repair_pool(
+        self,
+        pool_key: str = "account_pool_v3",
+        batch_size: int = schema.REPAIR_BATCH_SIZE,
+        pause_seconds: float = 0.0,
+        stop_event: Optional[threading.Event] = None,
+    ) -> Dict[str, int]:
+        """按游标分批增量修复账号池，只改动出现偏差的条目，返回各类修复的数量
+
+        依次用 SSCAN 遍历注册集合、用 ZSCAN 遍历三个状态集合，每批用户名交给一次
+        LUA_REPAIR_ACCOUNTS 调用原子检查，单步耗时由 batch_size 限定，可与获取/释放并发执行。
+        pause_seconds 为两步之间的间隔，stop_event 被设置时在当前步结束后停止。
+        """
+        report = {"scanned": 0, "migrated": 0, "orphaned": 0, "duplicates": 0, "restored": 0}
+        try:
+            client = self.get_redis_client()
+            report["migrated"] = self._migrate_untagged(client, pool_key)
+            moved, report["duplicates"] = self._migrate_v3(client, pool_key)
+            report["migrated"] += moved
+
+            sources = [(schema.registry_key(pool_key), client.sscan)] + [
+                (schema.status_key(pool_key, status), client.zscan) for status in schema.ACCOUNT_STATUSES
+            ]
+            for key, scan in sources:
+                cursor = 0
+                while True:
+                    if stop_event is not None and stop_event.is_set():
+                        return report
+
+                    cursor, entries = scan(key, cursor, count=batch_size)
+                    usernames = [entry[0] if isinstance(entry, (list, tuple)) else entry for entry in entries]
+                    if usernames:
+                        orphaned, duplicates, restored = self._run_script(
+                            client,
+                            schema.LUA_REPAIR_ACCOUNTS,
+                            pool_key,
+                            schema.pool_script_keys(pool_key),
+                            schema.repair_args(usernames, time.time()),
+                        )
+                        report["scanned"] += len(usernames)
+                        report["orphaned"] += int(orphaned)
+                        report["duplicates"] += int(duplicates)
+                        report["restored"] += int(restored)
+
+                    if int(cursor) == 0:
+                        break
+                    if pause_seconds > 0:
+                        time.sleep(pause_seconds)
+
+            if report["orphaned"] or report["duplicates"] or report["restored"]:
+                self.logger.info(
+                    "账号池 '%s' 修复完成: 检查 %d 条, 清理残留 %d, 移除重复 %d, 找回 %d",
+                    pool_key,
+                    report["scanned"],
+                    report["orphaned"],
+                    report["duplicates"],
+                    report["restored"],
+                )
+        except Exception as exc:
+            self.logger.error(f"修复账号池失败: {exc}")
+        return report
+
+    def start_background_repair(
+        self,
+        pool_key: str = "account_pool_v3",
+        interval: float = schema.DEFAULT_REPAIR_INTERVAL,
+        pause_seconds: float = schema.REPAIR_STEP_PAUSE,
+    ) -> threading.Event:
+        """在后台守护线程中每隔 interval 秒执行一轮 repair_pool，设置返回的 Event 即可停止"""
+        stop_event = threading.Event()
+
+        def run():
+            while not stop_event.is_set():
+                self.repair_pool(pool_key, pause_seconds=pause_seconds, stop_event=stop_event)
+                stop_event.wait(interval)
+
+        threading.Thread(target=run, name=f"PoolRepair-{pool_key}", daemon=True).start()
+        self.logger.info("已启动账号池 '%s' 后台修复, 间隔 %s 秒", pool_key, interval)
+        return stop_event
+
+    @instrumented("reap_cooldown")
+    def _reap_cooldown(self, pool_key: str, owner: str, lease_seconds: float) -> Tuple[int, Optional[float]]:
+        """冷却回收的一次调度，返回 (提升的账号数，未当选时为 -1, 最早冷却到期时间)"""
         try:
             client = self.get_redis_client()
-            used_key = self._used_list_key(pool_key)
-            cooldown_key = self._cooldown_zset_key(pool_key)
+            return schema.parse_reap_result(self._run_script(
+                client,
+                schema.LUA_REAP_COOLDOWN,
+                pool_key,
+                schema.pool_script_keys(pool_key),
+                schema.reap_args(time.time(), owner, lease_seconds),
+            ))
+        except Exception as exc:
+            self.logger.error(f"冷却回收失败: {exc}")
+            return -1, None
+
+    def start_cooldown_reaper(
+        self, pool_key: str = "account_pool_v3", interval: float = schema.DEFAULT_REAPER_INTERVAL
+    ) -> threading.Event:
+        """在后台守护线程中提升冷却到期的账号，设置返回的 Event 即可停止
+
+        多个进程都启动时按 {pool}:v4:reaper 租约选出一个执行，其余进程待命，持有者停止或租约过期后接替。
+        回收进程存在期间，获取账号与列表查询不再顺带提升冷却账号。每次调度至多提升
+        COOLDOWN_PROMOTE_BATCH 个，有积压时连续调度；否则等到最早的冷却到期时间，最长 interval 秒。
+        """
+        stop_event = threading.Event()
+        owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        # 租约需覆盖持有者两次调度的间隔
+        lease_seconds = max(schema.REAPER_LEASE_SECONDS, interval * 3)
+
+        def run():
+            leading = False
+            while not stop_event.is_set():
+                promoted, next_due = self._reap_cooldown(pool_key, owner, lease_seconds)
+                if (promoted >= 0) != leading:
+                    leading = promoted >= 0
+                    self.logger.info(
+                        "账号池 '%s' 的冷却回收%s", pool_key, "由本进程执行" if leading else "由其他进程执行，本进程待命"
+                    )
+                if promoted > 0:
+                    self.logger.info("从冷却池恢复 %d 个账号", promoted)
+                if promoted >= schema.COOLDOWN_PROMOTE_BATCH:
+                    continue
+                wait = interval
+                if leading and next_due is not None:
+                    wait = min(interval, max(next_due - time.time(), schema.MIN_BLOCKING_WAIT))
+                stop_event.wait(wait)
+            if leading:
+                self._reap_cooldown(pool_key, owner, 0)
 
-            available_before = client.llen(pool_key)
-            used_before = client.llen(used_key)
-            cooldown_before = client.zcard(cooldown_key)
+        threading.Thread(target=run, name=f"CooldownReaper-{pool_key}", daemon=True).start()
+        self.logger.info("已启动账号池 '%s' 冷却回收, 间隔 %s 秒", pool_key, interval)
+        return stop_event
 
-            self._normalize_pool(client, pool_key)
+    def remove_duplicate_accounts(self, pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """删除重复账号并返回最新统计
 
-            available_after = client.llen(pool_key)
-            used_after = client.llen(used_key)
-            cooldown_after = client.zcard(cooldown_key)
-            removed = (available_before + used_before + cooldown_before) - (
-                available_after + used_after + cooldown_after
-            )
-            if removed < 0:
-                removed = 0
+        v4 结构中每个用户名只有一个账号哈希，重复只会来自 v3 遗留数据（迁移时丢弃），
+        或同一用户名同时出现在多个状态集合中（按 使用中 > 冷却 > 可用 保留一份）。
+        """
+        report = self.repair_pool(pool_key)
+        status = self.get_account_status(pool_key)
+        self.logger.info(
+            "删除重复账号: 共移除 %d 个, 可用 %d 个, 使用中 %d 个, 冷却 %d 个",
+            report["duplicates"],
+            status["available"],
+            status["in_use"],
+            status["cooldown"],
+        )
+        return {
+            "removed": report["duplicates"],
+            "available": status["available"],
+            "in_use": status["in_use"],
+            "cooldown": status["cooldown"],
+        }
 
-            self.logger.info(
-                "删除重复账号: 共移除 %d 个, 可用 %d 个, 使用中 %d 个, 冷却 %d 个",
-                removed,
-                available_after,
-                used_after,
-                cooldown_after,
-            )
-            return {
-                "removed": removed,
-                "available": available_after,
-                "in_use": used_after,
-                "cooldown": cooldown_after,
-            }
+    def migrate_pool(self, pool_key: str = "account_pool_v3") -> int:
+        """将无标签的旧键名与旧版 v3 账号池迁移为当前结构，返回迁移的账号数"""
+        try:
+            client = self.get_redis_client()
+            migrated = self._migrate_untagged(client, pool_key)
+            moved, _ = self._migrate_v3(client, pool_key)
+            return migrated + moved
         except Exception as exc:
-            self.logger.error(f"删除重复账号失败: {exc}")
-            return {"removed": 0, "available": 0, "in_use": 0, "cooldown": 0}
-
+            self.logger.error(f"迁移账号池失败: {exc}")
+            return 0
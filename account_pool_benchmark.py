@@ -0,0 +1,320 @@
+"""
+账号池压测工具
+在本地 Redis（或 --start-server 临时启动的 redis-server）上，按 账号池大小 × 线程数 × 持有时间 × 冷却时间
+的组合逐项压测获取/释放，输出吞吐量、p50/p95/p99 延迟和每次操作消耗的 Redis CPU 时间，
+结果保存为 JSON，便于不同版本之间比较。
+
+压测使用独立的账号池键（默认 account_pool_bench），每项开始前重建、结束后删除；不要指向生产 Redis。
+获取使用阻塞等待（最长 ACQUIRE_TIMEOUT 秒），账号池耗尽时获取延迟包含等待时间，超时计入 empty。
+
+持有/冷却时间的分布写法（秒）:
+    const:0.01          固定值
+    uniform:0:0.05      均匀分布
+    exp:0.02            指数分布，参数为均值
+冷却时间按 release_account 的约定取整到秒。
+
+用法:
+    python account_pool_benchmark.py --start-server
+    python account_pool_benchmark.py --pool-sizes 10,1000,100000 --threads 1,8,32 --hold exp:0.005 --cooldown const:0,const:1
+    python account_pool_benchmark.py --backend sqlite --db-path bench.db --output sqlite.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import redis
+
+import account_pool_schema as schema
+from account_manager import create_account_manager
+
+BENCH_POOL_KEY = "account_pool_bench"
+# 单次阻塞获取的最长等待（秒）
+ACQUIRE_TIMEOUT = 1.0
+# 临时 redis-server 启动后等待其可用的最长时间（秒）
+SERVER_START_TIMEOUT = 10.0
+PERCENTILES = (50, 95, 99)
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """把 const:x / uniform:a:b / exp:mean 解析为以随机数生成器为参数的采样函数"""
+    kind, _, rest = spec.partition(":")
+    values = [float(value) for value in rest.split(":") if value]
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"无法解析的分布: {spec}")
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """延迟样本（秒）换算为毫秒的分位数"""
+    if not samples:
+        return {**{f"p{q}": None for q in PERCENTILES}, "max": None}
+    ordered = sorted(samples)
+    summary = {f"p{q}": ordered[min(len(ordered) - 1, len(ordered) * q // 100)] * 1000 for q in PERCENTILES}
+    summary["max"] = ordered[-1] * 1000
+    return summary
+
+
+def redis_version(client: redis.Redis) -> Optional[str]:
+    try:
+        return client.info("server").get("redis_version")
+    except Exception:
+        return None
+
+
+def redis_cpu_seconds(client: redis.Redis) -> Optional[float]:
+    """Redis 进程累计的用户态 + 内核态 CPU 时间，取不到时（集群、云托管等）返回 None"""
+    try:
+        info = client.info("cpu")
+        return float(info["used_cpu_user"]) + float(info["used_cpu_sys"])
+    except Exception:
+        return None
+
+
+class LocalRedisServer:
+    """在空闲端口上启动一个不落盘的临时 redis-server，退出时关闭"""
+
+    def __init__(self, executable: str = "redis-server"):
+        self.executable = shutil.which(executable) or executable
+        self.port = 0
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "LocalRedisServer":
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [self.executable, "--port", str(self.port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        client = redis.Redis(port=self.port)
+        deadline = time.time() + SERVER_START_TIMEOUT
+        try:
+            while True:
+                try:
+                    client.ping()
+                    return self
+                except redis.ConnectionError:
+                    if self.process.poll() is not None or time.time() > deadline:
+                        self.__exit__(None, None, None)
+                        raise RuntimeError(f"redis-server 启动失败: {self.executable}")
+                    time.sleep(0.05)
+        finally:
+            client.close()
+
+    def __exit__(self, *exc_info) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=5)
+
+
+def run_case(
+    manager,
+    pool_size: int,
+    threads: int,
+    hold: str,
+    cooldown: str,
+    duration: float,
+    seed: int = 0,
+) -> Dict:
+    """压测一组参数，返回吞吐量与延迟统计"""
+    pool_key = BENCH_POOL_KEY
+    manager.delete_pool(pool_key)
+    manager.save_accounts([{"username": f"bench_{i}", "password": "bench"} for i in range(pool_size)], pool_key)
+    hold_of = parse_distribution(hold)
+    cooldown_of = parse_distribution(cooldown)
+
+    client = manager.get_redis_client() if manager.backend == "redis" else None
+    barrier = threading.Barrier(threads + 1)
+    acquire_samples: List[List[float]] = [[] for _ in range(threads)]
+    release_samples: List[List[float]] = [[] for _ in range(threads)]
+    empty = [0] * threads
+    deadline = [0.0]
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed * 100003 + index)
+        manager.set_lane(f"bench-{index}")
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            account = manager.acquire_account(pool_key, timeout=ACQUIRE_TIMEOUT)
+            acquire_samples[index].append(time.perf_counter() - started)
+            if account is None:
+                empty[index] += 1
+                continue
+            held = hold_of(rng)
+            if held > 0:
+                time.sleep(held)
+            started = time.perf_counter()
+            manager.release_account(account, pool_key, cooldown_seconds=round(cooldown_of(rng)))
+            release_samples[index].append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    cpu_before = redis_cpu_seconds(client) if client is not None else None
+    started_at = time.perf_counter()
+    deadline[0] = started_at + duration
+    barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+    cpu_after = redis_cpu_seconds(client) if client is not None else None
+    manager.delete_pool(pool_key)
+
+    acquires = [sample for samples in acquire_samples for sample in samples]
+    releases = [sample for samples in release_samples for sample in samples]
+    operations = len(acquires) + len(releases)
+    cpu_per_op = None
+    if cpu_before is not None and cpu_after is not None and operations:
+        cpu_per_op = (cpu_after - cpu_before) / operations * 1e6
+    return {
+        "pool_size": pool_size,
+        "threads": threads,
+        "hold": hold,
+        "cooldown": cooldown,
+        "elapsed_seconds": elapsed,
+        "acquires": len(acquires) - sum(empty),
+        "releases": len(releases),
+        "empty": sum(empty),
+        "acquire_per_second": (len(acquires) - sum(empty)) / elapsed,
+        "release_per_second": len(releases) / elapsed,
+        "acquire_latency_ms": latency_summary(acquires),
+        "release_latency_ms": latency_summary(releases),
+        "redis_cpu_us_per_op": cpu_per_op,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(manager, args: argparse.Namespace, server_info: Dict) -> Dict:
+    cases = list(itertools.product(args.pool_sizes, args.threads, args.hold, args.cooldown))
+    logger = logging.getLogger("AccountPoolBenchmark")
+    started_at = time.time()
+    results = []
+    for number, (pool_size, threads, hold, cooldown) in enumerate(cases, start=1):
+        result = run_case(manager, pool_size, threads, hold, cooldown, args.duration, seed=args.seed)
+        results.append(result)
+        logger.info(
+            "[%d/%d] 账号 %d, 线程 %d, 持有 %s, 冷却 %s: 获取 %.0f/s (p99 %.2f ms), 释放 %.0f/s (p99 %.2f ms), CPU %s",
+            number,
+            len(cases),
+            pool_size,
+            threads,
+            hold,
+            cooldown,
+            result["acquire_per_second"],
+            result["acquire_latency_ms"]["p99"] or 0.0,
+            result["release_per_second"],
+            result["release_latency_ms"]["p99"] or 0.0,
+            "-" if result["redis_cpu_us_per_op"] is None else f"{result['redis_cpu_us_per_op']:.1f} us/op",
+        )
+    return {
+        "meta": {
+            "started_at": started_at,
+            "backend": manager.backend,
+            "revision": _git_revision(),
+            "schema_version": schema.SCHEMA_VERSION,
+            "python": platform.python_version(),
+            "host": socket.gethostname(),
+            "duration": args.duration,
+            "acquire_timeout": ACQUIRE_TIMEOUT,
+            **server_info,
+        },
+        "results": results,
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def _spec_list(value: str) -> List[str]:
+    specs = [item for item in value.split(",") if item]
+    for spec in specs:
+        parse_distribution(spec)
+    return specs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="账号池获取/释放压测")
+    parser.add_argument("--backend", default="redis", choices=("redis", "sqlite"))
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--db", type=int, default=0)
+    parser.add_argument("--start-server", action="store_true", help="启动临时 redis-server，忽略 --host/--port")
+    parser.add_argument("--redis-server", default="redis-server", help="redis-server 可执行文件")
+    parser.add_argument("--db-path", default=":memory:", help="sqlite 后端的数据库文件")
+    parser.add_argument("--pool-sizes", type=_int_list, default=[10, 1000, 100000])
+    parser.add_argument("--threads", type=_int_list, default=[1, 8, 32])
+    parser.add_argument("--hold", type=_spec_list, default=["const:0"], help="持有时间分布，逗号分隔多个")
+    parser.add_argument("--cooldown", type=_spec_list, default=["const:0"], help="冷却时间分布，逗号分隔多个")
+    parser.add_argument("--duration", type=float, default=5.0, help="每组参数的压测时长（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-journal", action="store_true", help="压测时不写事件日志")
+    parser.add_argument("--output", default="account_pool_benchmark.json", help="结果 JSON 文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    # 每次获取/释放的日志会显著拖慢压测
+    for name in ("AccountManager", "LocalAccountManager"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    manager = create_account_manager(args.backend)
+    if args.backend == "sqlite":
+        manager.update_config(path=args.db_path)
+        report = run_benchmark(manager, args, {"db_path": args.db_path})
+    else:
+        with contextlib.ExitStack() as stack:
+            host, port = args.host, args.port
+            if args.start_server:
+                host, port = "127.0.0.1", stack.enter_context(LocalRedisServer(args.redis_server)).port
+            manager.cache_enabled = False
+            if args.no_journal:
+                manager.journal_max_length = 0
+            # 每个阻塞等待的线程占用一条连接
+            manager.update_config(
+                host=host, port=port, password=args.password, db=args.db, max_connections=max(args.threads) + 5
+            )
+            report = run_benchmark(manager, args, {
+                "redis_version": redis_version(manager.get_redis_client()),
+                "redis_address": f"{host}:{port}",
+                "journal": not args.no_journal,
+            })
+
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, ensure_ascii=False, indent=2)
+    logging.getLogger("AccountPoolBenchmark").info("压测结果已保存到 %s", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+账号池状态与账号列表的进程内缓存
+账号池脚本在改动状态时向 {pool}:v4:changes 发布通知，后台线程订阅全部账号池的通知并失效对应缓存，
+界面刷新、状态轮询等重复读取在账号池没有改动时不再访问 Redis。
+
+一致性约定:
+    只有订阅确认后才启用缓存，订阅断开期间全部读取直接访问 Redis；
+    读取开始时记录代数，读取期间收到通知（代数变化）的结果不写入缓存；
+    冷却到期不经过脚本也会改变统计，缓存条目在最早的冷却到期时间失效。
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+
+import account_pool_schema as schema
+
+# 超过该账号数的列表不缓存，避免大账号池常驻内存
+CACHE_MAX_ACCOUNTS = 50000
+# 订阅线程单次等待消息的时间（秒），需小于客户端 socket_timeout(5 秒)
+LISTEN_POLL_SECONDS = 1.0
+# 订阅断开后重连的间隔（秒）
+RESUBSCRIBE_DELAY = 2.0
+
+
+class PoolStateCache:
+    """按账号池缓存状态统计与账号列表，由改动通知失效"""
+
+    def __init__(self, client_factory: Callable[[], redis.Redis]):
+        self.logger = logging.getLogger("PoolStateCache")
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        # 账号池 -> 代数，收到改动通知或本进程执行脚本后递增
+        self._generations: Dict[str, int] = {}
+        # 订阅断开或重置时递增，使之前开始的读取全部作废
+        self._epoch = 0
+        # 账号池 -> (状态统计, 失效时间)
+        self._status: Dict[str, Tuple[Dict, float]] = {}
+        # (账号池, 状态筛选) -> (账号列表, 失效时间)
+        self._listings: Dict[Tuple[str, Optional[str]], Tuple[List[Dict], float]] = {}
+        self._active = False
+        self._stop_event: Optional[threading.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 订阅 --------------------------------------------------------------
+    def start(self) -> None:
+        """启动订阅线程，重复调用无副作用"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=self._listen, args=(self._stop_event,), name="PoolCacheListener", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """停止订阅并清空缓存，切换 Redis 配置时调用"""
+        with self._lock:
+            if self._stop_event is not None:
+                self._stop_event.set()
+            self._stop_event = None
+            self._thread = None
+        self._deactivate()
+
+    def _listen(self, stop_event: threading.Event) -> None:
+        failing = False
+        while not stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self._client_factory().pubsub()
+                pubsub.psubscribe(schema.CHANGES_PATTERN)
+                while not stop_event.is_set():
+                    message = pubsub.get_message(timeout=LISTEN_POLL_SECONDS)
+                    if message is None:
+                        continue
+                    if message["type"] == "psubscribe":
+                        with self._lock:
+                            self._active = True
+                        failing = False
+                        self.logger.info("账号池改动通知订阅成功，启用本地缓存")
+                    elif message["type"] == "pmessage":
+                        self.invalidate(schema.pool_of_changes_channel(message["channel"]))
+            except Exception as exc:
+                # 连接持续不可用时只在首次失败时记录
+                if not failing:
+                    self.logger.warning(f"账号池改动通知订阅中断，暂停本地缓存: {exc}")
+                failing = True
+                stop_event.wait(RESUBSCRIBE_DELAY)
+            finally:
+                # 已被 stop 替换的旧线程退出时不影响新线程
+                if self._stop_event is stop_event:
+                    self._deactivate()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _deactivate(self) -> None:
+        with self._lock:
+            self._active = False
+            self._epoch += 1
+            self._status.clear()
+            self._listings.clear()
+
+    # ---- 失效 --------------------------------------------------------------
+    def invalidate(self, pool_key: Optional[str] = None) -> None:
+        """失效一个账号池的缓存，pool_key 为 None 时失效全部"""
+        with self._lock:
+            if pool_key is None:
+                self._epoch += 1
+                self._status.clear()
+                self._listings.clear()
+                return
+            self._generations[pool_key] = self._generations.get(pool_key, 0) + 1
+            self._status.pop(pool_key, None)
+            for key in [key for key in self._listings if key[0] == pool_key]:
+                del self._listings[key]
+
+    def generation(self, pool_key: str) -> Tuple[int, int]:
+        """读取开始前记录的代数，写入缓存时用于判断读取期间是否有改动"""
+        with self._lock:
+            return self._epoch, self._generations.get(pool_key, 0)
+
+    def _can_store(self, pool_key: str, generation: Tuple[int, int]) -> bool:
+        return self._active and generation == (self._epoch, self._generations.get(pool_key, 0))
+
+    # ---- 状态统计 ----------------------------------------------------------
+    def get_status(self, pool_key: str, now: float) -> Optional[Dict]:
+        with self._lock:
+            entry = self._status.get(pool_key) if self._active else None
+        if entry is None or now >= entry[1]:
+            return None
+        status = dict(entry[0])
+        if status["next_cooldown_at"] is not None:
+            status["next_cooldown_in"] = max(0.0, status["next_cooldown_at"] - now)
+        return status
+
+    def put_status(self, pool_key: str, status: Dict, generation: Tuple[int, int]) -> None:
+        expires_at = status["next_cooldown_at"] if status["next_cooldown_at"] is not None else float("inf")
+        with self._lock:
+            if self._can_store(pool_key, generation):
+                self._status[pool_key] = (dict(status), expires_at)
+
+    # ---- 账号列表 ----------------------------------------------------------
+    def get_listing(self, pool_key: str, status: Optional[str]) -> Optional[List[Dict]]:
+        """返回缓存的账号列表副本，调用方修改返回的账号不影响缓存"""
+        with self._lock:
+            entry = self._listings.get((pool_key, status)) if self._active else None
+        if entry is None or time.time() >= entry[1]:
+            return None
+        return [dict(account) for account in entry[0]]
+
+    def put_listing(
+        self,
+        pool_key: str,
+        status: Optional[str],
+        accounts: List[Dict],
+        generation: Tuple[int, int],
+        expires_at: float = float("inf"),
+    ) -> None:
+        if len(accounts) > CACHE_MAX_ACCOUNTS:
+            return
+        snapshot = [dict(account) for account in accounts]
+        with self._lock:
+            if self._can_store(pool_key, generation):
+                self._listings[(pool_key, status)] = (snapshot, expires_at)
@@ -0,0 +1,356 @@
+"""
+账号池操作的延迟与往返统计
+按 (操作, 账号池) 记录 HDR 风格的延迟直方图、Redis 往返次数、建连次数与重试次数，
+按 (脚本, 账号池) 记录脚本调用耗时，通过 stats() 读取快照，或由本地 HTTP 端点输出 Prometheus 文本格式。
+
+统计口径:
+    往返次数在连接层计数：一条命令或一次管道提交各算一次，连接健康检查的 PING 也计入；
+    操作可以嵌套（如 acquire_account 内的 ensure_pool），内层的往返与重试同时计入外层操作；
+    脚本耗时为客户端观测到的 EVALSHA 调用时间，包含一次网络往返，合并在一次 pipeline 中的多次调用记为一次；
+    重试次数为操作内的重复尝试：阻塞获取被唤醒后的重新获取、冷却提升等分批循环的后续批次。
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import redis
+
+# 每个 2 的幂区间再细分的子桶位数，5 位即 32 个子桶，桶宽不超过桶下界的 1/32
+SUB_BUCKET_BITS = 5
+# 快照中输出的分位数
+SNAPSHOT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# Prometheus 直方图的桶上界（秒），由 HDR 直方图折算
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 统计端点默认只监听本机
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9464
+
+
+def _bucket_index(value: int) -> int:
+    """微秒值所在的桶序号：小于 2^SUB_BUCKET_BITS 的值每个整数一个桶，之后每个 2 的幂区间等分"""
+    if value < (1 << SUB_BUCKET_BITS):
+        return value
+    # 取最高的 SUB_BUCKET_BITS + 1 位，落在 [2^SUB_BUCKET_BITS, 2^(SUB_BUCKET_BITS+1)) 内
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def _bucket_bounds(index: int) -> Tuple[int, int]:
+    """桶序号对应的微秒取值范围 [lower, upper]"""
+    if index < (1 << SUB_BUCKET_BITS):
+        return index, index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    top = index - (shift << SUB_BUCKET_BITS)
+    return top << shift, ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """以微秒为单位的对数-线性直方图，只保存非空的桶；本身不加锁，由 PoolMetrics 保护"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        value = max(0, int(seconds * 1_000_000))
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        """分位数（秒），取所在桶的中点，并限制在实际最小与最大值之间"""
+        if not self.count:
+            return 0.0
+        target = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                lower, upper = _bucket_bounds(index)
+                return min(max((lower + upper) / 2, self.min), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def cumulative(self, bounds: Tuple[float, ...]) -> List[int]:
+        """每个上界（秒）以内的累计次数；桶跨越上界时按桶的上沿归入下一个上界"""
+        limits = [int(bound * 1_000_000) for bound in bounds]
+        result = [0] * len(limits)
+        for index, count in self.counts.items():
+            upper = min(_bucket_bounds(index)[1], self.max)
+            for position, limit in enumerate(limits):
+                if upper <= limit:
+                    result[position] += count
+        return result
+
+    def summary(self) -> Dict:
+        if not self.count:
+            return {"count": 0}
+        summary = {
+            "count": self.count,
+            "sum": self.total / 1_000_000,
+            "min": self.min / 1_000_000,
+            "mean": self.total / self.count / 1_000_000,
+            "max": self.max / 1_000_000,
+        }
+        for q in SNAPSHOT_QUANTILES:
+            summary[f"p{q * 100:g}"] = self.quantile(q)
+        return summary
+
+
+class _OperationStats:
+    """单个 (操作, 账号池) 的累计统计"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.round_trips = 0
+        self.connects = 0
+        self.retries = 0
+        self.errors = 0
+
+
+class _Frame:
+    """线程内正在执行的一次操作，计数在结束时并入累计统计"""
+
+    __slots__ = ("operation", "pool_key", "round_trips", "connects", "retries")
+
+    def __init__(self, operation: str, pool_key: str):
+        self.operation = operation
+        self.pool_key = pool_key
+        self.round_trips = 0
+        self.connects = 0
+        self.retries = 0
+
+
+class PoolMetrics:
+    """按操作与账号池汇总的统计，线程安全；往返与重试先记在线程内的操作栈上，操作结束时合并"""
+
+    def __init__(self):
+        self.logger = logging.getLogger("PoolMetrics")
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations: Dict[Tuple[str, str], _OperationStats] = {}
+        self._scripts: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.started_at = time.time()
+
+    def _stack(self) -> List[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def operation(self, operation: str, pool_key: str) -> Iterator[None]:
+        """统计一次操作的耗时，并把期间本线程的往返、建连与重试计入该操作"""
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        frame = _Frame(operation, pool_key)
+        stack.append(frame)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            with self._lock:
+                stats = self._operations.get((operation, pool_key))
+                if stats is None:
+                    stats = self._operations[(operation, pool_key)] = _OperationStats()
+                stats.latency.record(elapsed)
+                stats.round_trips += frame.round_trips
+                stats.connects += frame.connects
+                stats.retries += frame.retries
+                stats.errors += failed
+
+    def record_round_trip(self) -> None:
+        for frame in getattr(self._local, "stack", ()):
+            frame.round_trips += 1
+
+    def record_connect(self) -> None:
+        for frame in getattr(self._local, "stack", ()):
+            frame.connects += 1
+
+    def record_retry(self) -> None:
+        for frame in getattr(self._local, "stack", ()):
+            frame.retries += 1
+
+    def current_pool(self) -> str:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1].pool_key if stack else ""
+
+    def record_script(self, script: str, seconds: float) -> None:
+        """记录一次脚本调用耗时，账号池取当前线程最内层的操作"""
+        if not self.enabled:
+            return
+        key = (script, self.current_pool())
+        with self._lock:
+            histogram = self._scripts.get(key)
+            if histogram is None:
+                histogram = self._scripts[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._operations.clear()
+            self._scripts.clear()
+            self.started_at = time.time()
+
+    def stats(self) -> Dict:
+        """统计快照: operations[操作][账号池] 与 scripts[脚本][账号池]，耗时单位为秒"""
+        with self._lock:
+            operations: Dict[str, Dict[str, Dict]] = {}
+            for (operation, pool_key), stats in sorted(self._operations.items()):
+                count = stats.latency.count
+                operations.setdefault(operation, {})[pool_key] = {
+                    "latency": stats.latency.summary(),
+                    "round_trips": stats.round_trips,
+                    "round_trips_per_call": stats.round_trips / count if count else 0.0,
+                    "connects": stats.connects,
+                    "retries": stats.retries,
+                    "errors": stats.errors,
+                }
+            scripts: Dict[str, Dict[str, Dict]] = {}
+            for (script, pool_key), histogram in sorted(self._scripts.items()):
+                scripts.setdefault(script, {})[pool_key] = histogram.summary()
+            return {
+                "started_at": self.started_at,
+                "uptime": time.time() - self.started_at,
+                "operations": operations,
+                "scripts": scripts,
+            }
+
+    def prometheus_text(self) -> str:
+        """按 Prometheus 文本格式输出全部统计"""
+        lines: List[str] = []
+        with self._lock:
+            operations = sorted(self._operations.items())
+            lines += _histogram_lines(
+                "account_pool_operation_seconds",
+                "账号池操作耗时",
+                [({"operation": op, "pool": pool}, stats.latency) for (op, pool), stats in operations],
+            )
+            for name, attribute, help_text in (
+                ("account_pool_round_trips_total", "round_trips", "账号池操作内的 Redis 往返次数"),
+                ("account_pool_connects_total", "connects", "账号池操作内新建的 Redis 连接数"),
+                ("account_pool_retries_total", "retries", "账号池操作内的重复尝试次数"),
+                ("account_pool_errors_total", "errors", "以异常结束的账号池操作次数"),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (op, pool), stats in operations:
+                    labels = _format_labels({"operation": op, "pool": pool})
+                    lines.append(f"{name}{labels} {getattr(stats, attribute)}")
+            lines += _histogram_lines(
+                "account_pool_script_seconds",
+                "账号池脚本调用耗时（含一次往返）",
+                [({"script": script, "pool": pool}, histogram)
+                 for (script, pool), histogram in sorted(self._scripts.items())],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, series: List[Tuple[Dict[str, str], LatencyHistogram]]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        for bound, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative(PROMETHEUS_BUCKETS)):
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': f'{bound:g}'})} {count}")
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total / 1_000_000}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+# 进程内共享的统计，AccountManager 与连接层都写入这里
+metrics = PoolMetrics()
+
+
+def instrumented(operation: str):
+    """AccountManager 方法装饰器：按方法的 pool_key 参数记录到 self.metrics"""
+
+    def decorate(method):
+        parameters = inspect.signature(method).parameters
+        position = list(parameters).index("pool_key") - 1
+        default = parameters["pool_key"].default
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if "pool_key" in kwargs:
+                pool_key = kwargs["pool_key"]
+            else:
+                pool_key = args[position] if len(args) > position else default
+            with self.metrics.operation(operation, pool_key):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class CountingConnection(redis.Connection):
+    """每次发送命令或管道记一次往返、每次建连记一次建连，计入当前线程正在执行的操作"""
+
+    def connect(self):
+        if self._sock is None:
+            metrics.record_connect()
+        return super().connect()
+
+    def send_packed_command(self, command, check_health=True):
+        metrics.record_round_trip()
+        return super().send_packed_command(command, check_health)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: PoolMetrics = metrics
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger("PoolMetrics").debug("统计端点 %s - %s", self.address_string(), format % args)
+
+
+def start_http_server(
+    port: int = DEFAULT_METRICS_PORT, host: str = DEFAULT_METRICS_HOST, registry: Optional[PoolMetrics] = None
+) -> ThreadingHTTPServer:
+    """在后台线程启动 /metrics 端点，返回的服务器用 shutdown() + server_close() 关闭"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="PoolMetricsServer", daemon=True)
+    thread.start()
+    logging.getLogger("PoolMetrics").info("统计端点已启动: http://%s:%d/metrics", host, server.server_address[1])
+    return server
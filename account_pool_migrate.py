@@ -0,0 +1,122 @@
+"""
+账号池键名迁移与跨实例复制工具
+1. 把旧键名（v3 结构、无哈希标签的 v4 键）迁移为带哈希标签的 {pool}:v4:... 键名，需在单实例 Redis 上执行；
+2. 把迁移后的账号池用 DUMP/RESTORE 逐键复制到另一个实例或 Redis Cluster。
+   同一账号池的键带相同的哈希标签，在集群中落在同一槽位，不同账号池分布到不同节点。
+
+用法:
+    python account_pool_migrate.py                                  # 迁移 config.json 中的账号池
+    python account_pool_migrate.py pool_a pool_b
+    python account_pool_migrate.py --copy-to 10.0.0.5:7000 --target-cluster
+"""
+import argparse
+import logging
+import sys
+from typing import Dict, Iterator, List, Optional
+
+import redis
+from redis.cluster import RedisCluster
+
+import account_pool_schema as schema
+from account_importer import load_redis_defaults
+from account_manager import AccountManager
+
+# 复制时单个 pipeline 处理的键数
+COPY_BATCH_SIZE = 200
+
+
+def iter_pool_keys(client: redis.Redis, pool_key: str) -> Iterator[str]:
+    """账号池当前键名下的全部键：固定键与各账号哈希"""
+    yield from schema.pool_fixed_keys(pool_key)
+    for username in client.sscan_iter(schema.registry_key(pool_key), count=schema.ACCOUNT_BATCH_SIZE):
+        yield schema.account_key(pool_key, username)
+
+
+def copy_pool(source: redis.Redis, target: redis.Redis, pool_key: str, replace: bool = False) -> Dict[str, int]:
+    """用 DUMP/RESTORE 把账号池复制到另一个实例，返回 {copied, skipped}
+
+    复制期间源账号池应停止写入；目标已存在的键在 replace 为 False 时跳过。
+    使用中账号的租约按原到期时间保留，复制后由目标上的回收逻辑照常处理。
+    """
+    report = {"copied": 0, "skipped": 0}
+    keys: List[str] = []
+
+    def flush():
+        with source.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.dump(key)
+            payloads = pipe.execute()
+        with target.pipeline(transaction=False) as pipe:
+            for key, payload in zip(keys, payloads):
+                if payload is None:
+                    continue
+                pipe.restore(key, 0, payload, replace=replace)
+            results = pipe.execute(raise_on_error=False)
+        for result in results:
+            if isinstance(result, Exception):
+                if "BUSYKEY" not in str(result):
+                    raise result
+                report["skipped"] += 1
+            else:
+                report["copied"] += 1
+        keys.clear()
+
+    for key in iter_pool_keys(source, pool_key):
+        keys.append(key)
+        if len(keys) >= COPY_BATCH_SIZE:
+            flush()
+    if keys:
+        flush()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default="config.json")
+    known, _ = pre_parser.parse_known_args(argv)
+    defaults = load_redis_defaults(known.config)
+
+    parser = argparse.ArgumentParser(description="账号池键名迁移与跨实例复制", parents=[pre_parser])
+    parser.add_argument("pools", nargs="*", help="账号池键名，默认取 config.json 中的账号池")
+    parser.add_argument("--host", default=defaults["host"])
+    parser.add_argument("--port", type=int, default=defaults["port"])
+    parser.add_argument("--password", default=defaults["password"])
+    parser.add_argument("--db", type=int, default=defaults["db"])
+    parser.add_argument("--copy-to", metavar="HOST:PORT", help="迁移后复制到该实例")
+    parser.add_argument("--target-password", default="")
+    parser.add_argument("--target-db", type=int, default=0)
+    parser.add_argument("--target-cluster", action="store_true", help="目标为 Redis Cluster")
+    parser.add_argument("--replace", action="store_true", help="覆盖目标中已存在的键")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger("AccountPoolMigrate")
+    pools = args.pools or [defaults["pool"]]
+
+    manager = AccountManager()
+    manager.cache_enabled = False
+    manager.update_config(host=args.host, port=args.port, password=args.password, db=args.db)
+    for pool_key in pools:
+        migrated = manager.migrate_pool(pool_key)
+        status = manager.get_account_status(pool_key)
+        logger.info(
+            "账号池 '%s': 迁移 %d 个账号, 当前共 %d 个 (可用 %d, 使用中 %d, 冷却 %d)",
+            pool_key, migrated, status["total"], status["available"], status["in_use"], status["cooldown"],
+        )
+
+    if args.copy_to:
+        host, _, port = args.copy_to.rpartition(":")
+        if args.target_cluster:
+            target = RedisCluster(host=host, port=int(port), password=args.target_password or None)
+        else:
+            target = redis.Redis(host=host, port=int(port), password=args.target_password or None, db=args.target_db)
+        source = manager.get_redis_client()
+        for pool_key in pools:
+            report = copy_pool(source, target, pool_key, replace=args.replace)
+            logger.info("账号池 '%s' 已复制到 %s: %d 个键, 跳过已存在的 %d 个", pool_key, args.copy_to, report["copied"], report["skipped"])
+        target.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
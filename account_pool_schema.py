@@ -0,0 +1,1436 @@
+"""
+账号池的 Redis 键结构与 Lua 脚本
+同步的 AccountManager 与异步的 AsyncAccountManager 共用本模块，保证两者的行为不会分叉
+
+v4 结构（pool 为配置中的账号池名，键名中的花括号为 Redis Cluster 哈希标签）:
+    {pool}:v4:accounts            集合，全部账号的用户名
+    {pool}:v4:accounts:<用户名>   哈希，账号字段，字段值均为 JSON 编码
+    {pool}:v4:available           有序集合，可用账号，分数为最近一次释放时间（可按成功率加权），分数小的先取出
+    {pool}:v4:in_use              有序集合，使用中账号，分数为租约到期时间
+    {pool}:v4:cooldown            有序集合，冷却中账号，分数为冷却结束时间
+    {pool}:v4:quarantine          有序集合，连续失败被隔离的账号，分数为隔离时间
+    {pool}:v4:waiters             有序集合，阻塞获取的排队票据，分数为票据序号，可用账号按序号先到先得
+    {pool}:v4:grant:<序号>        列表，分给该票据的账号用户名（空字符串为重新计算等待的令牌）
+    {pool}:v4:journal             流，账号状态切换的事件日志，按近似长度截断
+    {pool}:v4:meta                哈希，结构版本、账号选择策略等元信息
+    {pool}:v4:changes             发布/订阅频道，账号池有改动时发布，用于失效本地缓存
+    {pool}:v4:reaper              字符串，冷却回收进程的选主租约，值为持有者标识，带过期时间
+
+冷却到期的账号由选出的冷却回收进程（见 LUA_REAP_COOLDOWN）按批提升；没有回收进程持有租约时，
+由获取账号顺带提升（列表查询可选择提升）。
+状态结构只存用户名，状态切换只需移动用户名并更新少量字段，不再整体解码/编码账号 JSON。
+每次状态切换在同一次脚本调用内追加一条事件到 journal，由 account_journal 消费。
+一个账号池的全部键（含账号哈希）带相同的哈希标签 {pool}，落在同一个槽位，多键脚本可在 Redis Cluster 上执行，
+不同账号池分布到不同节点。更早的无标签 v4 键名（pool:v4:...）由 LUA_MIGRATE_UNTAGGED 在线迁移。
+旧版 v3 结构（{pool} 列表、:used_map、:cooldown 等存放 JSON 的键）由 LUA_MIGRATE_V3 分批在线迁移。
+"""
+import json
+import random
+import socket
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+SCHEMA_VERSION = 4
+
+# 同步与异步管理器的连接池默认参数；阻塞获取期间每个等待者会占用一条连接，max_connections 需覆盖并发等待数
+DEFAULT_POOL_OPTIONS = {
+    "max_connections": 50,
+    "pool_timeout": 10,
+    "health_check_interval": 30,
+    "socket_keepalive": True,
+    "retry_attempts": 3,
+}
+
+# 阻塞获取时单次 BLPOP 的最长等待，需小于客户端 socket_timeout(5 秒)
+BLOCKING_WAIT_SLICE = 4.0
+MIN_BLOCKING_WAIT = 0.05
+# 排队票据在等待截止时间之后保留的秒数，容忍各主机间的时钟偏差；过期票据在服务队首时丢弃
+WAITER_EXPIRY_GRACE = 5.0
+# 单次脚本调用最多提升的冷却账号数/回收的过期租约数，限制脚本阻塞 Redis 的时间
+COOLDOWN_PROMOTE_BATCH = 100
+# 冷却回收进程两次调度的最长间隔，有冷却即将到期时提前调度
+DEFAULT_REAPER_INTERVAL = 1.0
+# 冷却回收进程选主租约的最短时长，持有者每次调度时续期；持有者退出后其他进程最迟在租约到期后接替
+REAPER_LEASE_SECONDS = 5.0
+# 批量获取/释放/迁移时单次脚本调用处理的账号数上限
+ACCOUNT_BATCH_SIZE = 500
+# 批量写入账号时一次 pipeline 提交的脚本调用数，即每次往返写入 ACCOUNT_BATCH_SIZE * PIPELINE_SCRIPT_CALLS 个账号
+PIPELINE_SCRIPT_CALLS = 10
+# 账号租约默认时长，持有者需在到期前调用 renew_lease 续约
+DEFAULT_LEASE_SECONDS = 300
+# 租约过期被回收的账号进入的冷却时间
+LEASE_RECLAIM_COOLDOWN = 30
+# 账号所处的四种状态，对应 available / in_use / cooldown / quarantine 四个有序集合
+ACCOUNT_STATUSES = ("available", "in_use", "cooldown", "quarantined")
+# 释放账号时报告的使用结果，为 None 时不计入成功/失败统计
+RELEASE_OUTCOMES = ("success", "failure")
+# 失败释放的冷却由释放脚本计算: 第 n 次连续失败冷却 min(cap, base * 2^(n-1)) 秒，
+# 再随机缩短至多 jitter 比例，避免同一批失败的账号同时回到账号池
+FAILURE_COOLDOWN_BASE = 30
+FAILURE_COOLDOWN_CAP = 3600
+FAILURE_COOLDOWN_JITTER = 0.2
+# 连续失败达到该次数的账号进入隔离，不再被获取，需调用 release_quarantined 解除；为 0 时不隔离
+QUARANTINE_AFTER_FAILURES = 5
+# 分页列出账号时每页的默认条数
+DEFAULT_PAGE_SIZE = 500
+# 增量修复时单次脚本调用检查的账号数，以及两步之间让出 Redis 的间隔（秒）
+REPAIR_BATCH_SIZE = 200
+REPAIR_STEP_PAUSE = 0.05
+# 后台修复两轮之间的间隔（秒）
+DEFAULT_REPAIR_INTERVAL = 600
+# 事件日志的近似最大长度，为 0 时不记录事件
+JOURNAL_MAX_LENGTH = 100000
+# 事件日志的字段: 事件类型、用户名、主机、工作通道、时间、结果、关联时间（租约/冷却到期）、
+# 释放时报告的使用结果（RELEASE_OUTCOMES 之一，未报告时没有该字段）
+JOURNAL_FIELDS = {
+    "e": "event",
+    "u": "username",
+    "h": "host",
+    "l": "lane",
+    "t": "ts",
+    "o": "outcome",
+    "s": "until",
+    "r": "result",
+}
+# 获取账号时的选择策略，记录在账号池元信息中:
+#   lru      取最久未使用（最早释放）的账号
+#   success  按成功率提前: 释放时分数减去 success_weight * 平滑成功率，成功率高的账号排在更早释放的账号之前
+#   random   在最久未使用的 top_k 个账号中随机选取，避免多个工作线程总是争抢同一批账号
+SELECTION_POLICIES = ("lru", "success", "random")
+DEFAULT_SELECTION_POLICY = "lru"
+# success 策略下成功率从 0 到 1 相当于提前的秒数
+DEFAULT_SUCCESS_WEIGHT = 3600
+DEFAULT_TOP_K = 10
+# 由账号池结构推导、不写入账号哈希的字段
+DERIVED_FIELDS = ("in_use", "status", "cooldown_until", "lease_until", "acquired_at", "quarantined_at", "lease_token")
+# 元信息中的单调计数: 顺序号、租约令牌、排队票据序号；整体替换或删除账号池时保留，
+# 否则新发出的租约令牌（票据）可能与旧持有者（等待者）手中的相同
+COUNTER_META_FIELDS = ("sequence", "fence", "ticket")
+
+
+# ---- Redis key helpers -------------------------------------------------
+def key_prefix(pool_key: str) -> str:
+    """账号池 v4 键的公共前缀，花括号为哈希标签"""
+    return f"{{{pool_key}}}:v4"
+
+
+def registry_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:accounts"
+
+
+def account_key(pool_key: str, username: str) -> str:
+    return f"{registry_key(pool_key)}:{username}"
+
+
+def available_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:available"
+
+
+def in_use_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:in_use"
+
+
+def cooldown_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:cooldown"
+
+
+def quarantine_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:quarantine"
+
+
+def waiters_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:waiters"
+
+
+def grant_key(pool_key: str, ticket: str) -> str:
+    """排队票据分到的账号列表，键名只取票据的序号部分"""
+    return f"{key_prefix(pool_key)}:grant:{ticket.split(':', 1)[0]}"
+
+
+def reaper_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:reaper"
+
+
+def retired_keys(pool_key: str) -> List[str]:
+    """v4 中已不再使用的键（旧版阻塞获取的唤醒信号列表），删除账号池时一并清理"""
+    return [f"{key_prefix(pool_key)}:signal"]
+
+
+def journal_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:journal"
+
+
+def meta_key(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:meta"
+
+
+def changes_channel(pool_key: str) -> str:
+    return f"{key_prefix(pool_key)}:changes"
+
+
+# 订阅全部账号池改动通知的频道模式
+CHANGES_PATTERN = "{*}:v4:changes"
+
+
+def pool_of_changes_channel(channel: str) -> str:
+    return channel[1:-len("}:v4:changes")]
+
+
+def status_key(pool_key: str, status: str) -> str:
+    """账号状态对应的有序集合"""
+    return {
+        "available": available_key,
+        "in_use": in_use_key,
+        "cooldown": cooldown_key,
+        "quarantined": quarantine_key,
+    }[status](pool_key)
+
+
+def pool_script_keys(pool_key: str) -> List[str]:
+    """账号池脚本的 KEYS，顺序与 _LUA_POOL_PRELUDE 一致"""
+    return [
+        available_key(pool_key),
+        in_use_key(pool_key),
+        cooldown_key(pool_key),
+        registry_key(pool_key),
+        journal_key(pool_key),
+        meta_key(pool_key),
+        quarantine_key(pool_key),
+    ]
+
+
+def pool_fixed_keys(pool_key: str) -> List[str]:
+    """账号池除账号哈希以外的全部 v4 键"""
+    return pool_script_keys(pool_key)
+
+
+# ---- 旧版无哈希标签的 v4 键，仅用于迁移 -----------------------------------
+def untagged_keys(pool_key: str) -> List[str]:
+    """无哈希标签的旧 v4 键，迁移脚本按该顺序读取（旧版没有隔离集合，signal 为旧版的唤醒信号列表）"""
+    return [
+        f"{pool_key}:v4:{name}"
+        for name in ("available", "in_use", "cooldown", "accounts", "signal", "journal", "meta")
+    ]
+
+
+# ---- 旧版 v3 键，仅用于迁移与兼容读取 ------------------------------------
+def v3_available_key(pool_key: str) -> str:
+    return pool_key
+
+
+def v3_used_map_key(pool_key: str) -> str:
+    return f"{pool_key}:used_map"
+
+
+def v3_used_list_key(pool_key: str) -> str:
+    return f"{pool_key}:used"
+
+
+def v3_cooldown_key(pool_key: str) -> str:
+    return f"{pool_key}:cooldown"
+
+
+def v3_keys(pool_key: str) -> List[str]:
+    """v3 结构的全部键，前四个存放账号 JSON，其余为租约/索引/信号"""
+    return [
+        v3_available_key(pool_key),
+        v3_used_map_key(pool_key),
+        v3_used_list_key(pool_key),
+        v3_cooldown_key(pool_key),
+        f"{pool_key}:leases",
+        f"{pool_key}:available_index",
+        f"{pool_key}:used_index",
+        f"{pool_key}:signal",
+    ]
+
+
+# ---- Lua 脚本 ----------------------------------------------------------
+# 所有账号池脚本共用的 KEYS 布局与辅助函数，顺序与 pool_script_keys 一致
+# ARGV[1..3] 为事件日志上下文（见 journal_context），各脚本自己的参数从 ARGV[4] 开始
+_LUA_POOL_PRELUDE = """
+local available_key = KEYS[1]
+local in_use_key = KEYS[2]
+local cooldown_key = KEYS[3]
+local registry_key = KEYS[4]
+local journal_key = KEYS[5]
+local meta_key = KEYS[6]
+local quarantine_key = KEYS[7]
+local journal_max = tonumber(ARGV[1]) or 0
+local journal_host = ARGV[2]
+local journal_lane = ARGV[3]
+-- 改动通知频道、排队等待与冷却回收的键与注册集合同前缀: {pool}:v4:accounts -> {pool}:v4:changes
+local pool_prefix = string.sub(registry_key, 1, -9)
+local changes_channel = pool_prefix .. 'changes'
+local waiters_key = pool_prefix .. 'waiters'
+local reaper_key = pool_prefix .. 'reaper'
+local changes_published = false
+
+-- 记录一次状态切换: 每次脚本调用在首次改动时发布一条改动通知，并向事件日志追加事件；
+-- host / lane 默认为本次调用者，分给排队票据的账号记在票据登记者名下；result 为释放时报告的使用结果
+local function journal(event, username, now, outcome, until_at, host, lane, result)
+    if not changes_published then
+        redis.call('PUBLISH', changes_channel, event)
+        changes_published = true
+    end
+    if journal_max <= 0 then
+        return
+    end
+    local fields = {'e', event, 'u', username, 'h', host or journal_host, 'l', lane or journal_lane, 't', now}
+    if outcome then
+        fields[#fields + 1] = 'o'
+        fields[#fields + 1] = outcome
+    end
+    if until_at then
+        fields[#fields + 1] = 's'
+        fields[#fields + 1] = until_at
+    end
+    if result then
+        fields[#fields + 1] = 'r'
+        fields[#fields + 1] = result
+    end
+    redis.call('XADD', journal_key, 'MAXLEN', '~', journal_max, '*', unpack(fields))
+end
+
+local function account_key(username)
+    return registry_key .. ':' .. username
+end
+
+local selection = redis.call('HMGET', meta_key, 'policy', 'success_weight', 'top_k')
+local selection_policy = selection[1] or 'lru'
+local success_weight = tonumber(selection[2]) or 0
+local top_k = tonumber(selection[3]) or 1
+
+-- 失败冷却参数，只有释放脚本按 ARGV 设置，其余脚本中失败不会发生
+local failure_policy = {base = 0, cap = 0, jitter = 0, quarantine_after = 0}
+-- 本次脚本调用中被隔离的账号数
+local quarantined = 0
+-- 本次脚本调用中因租约令牌不符被拒绝的释放数
+local stale = 0
+
+-- 账号交给新的持有者: 登记租约并发放本账号池内单调递增的租约令牌，释放与续约需出示该令牌
+local function lease_account(username, now, lease_seconds, outcome, host, lane)
+    local token = redis.call('HINCRBY', meta_key, 'fence', 1)
+    redis.call('HSET', account_key(username), 'acquired_at', now, 'lease_token', token)
+    redis.call('ZADD', in_use_key, now + lease_seconds, username)
+    journal('acquire', username, now, outcome, now + lease_seconds, host, lane)
+    return token
+end
+
+-- 账号回到可用集合时的分数，分数小的先被取出
+local function available_score(username, now)
+    if selection_policy ~= 'success' or success_weight <= 0 then
+        return now
+    end
+    local stats = redis.call('HMGET', account_key(username), 'successes', 'failures')
+    local successes = tonumber(stats[1]) or 0
+    local failures = tonumber(stats[2]) or 0
+    -- 平滑后的成功率，没有记录的账号按 0.5 计
+    return now - success_weight * (successes + 1) / (successes + failures + 2)
+end
+
+-- 按选择策略取出最多 n 个用户名，返回与 ZPOPMIN 相同的 {用户名, 分数, ...} 数组
+local function pop_available(n)
+    if selection_policy ~= 'random' or top_k <= 1 then
+        return redis.call('ZPOPMIN', available_key, n)
+    end
+    local candidates = redis.call('ZRANGE', available_key, 0, top_k - 1)
+    if #candidates == 0 then
+        return {}
+    end
+    local username = candidates[math.random(#candidates)]
+    redis.call('ZREM', available_key, username)
+    return {username, 0}
+end
+
+-- 排队等待的票据为 "序号:等待截止时间:租约秒数:主机名:工作通道"，分数为序号；分到的账号用户名推入票据自己的列表
+local function grant_key(ticket)
+    return pool_prefix .. 'grant:' .. string.match(ticket, '^[^:]+')
+end
+
+-- 把可用账号按票据顺序交给排队的等待者，已过截止时间的票据直接丢弃；返回交出的账号数
+local function serve_waiters(now)
+    local served = 0
+    while true do
+        local ticket = redis.call('ZRANGE', waiters_key, 0, 0)[1]
+        if not ticket then
+            break
+        end
+        local _, wait_until, lease_seconds, host, lane = string.match(ticket, '^([^:]+):([^:]+):([^:]+):([^:]*):(.*)$')
+        if (tonumber(wait_until) or 0) < now then
+            redis.call('ZREM', waiters_key, ticket)
+        else
+            local popped = pop_available(1)
+            if #popped == 0 then
+                break
+            end
+            local username = popped[1]
+            local key = account_key(username)
+            -- 账号哈希已不存在的用户名直接丢弃，票据留给下一个账号
+            if redis.call('EXISTS', key) == 1 then
+                lease_seconds = tonumber(lease_seconds) or 300
+                redis.call('ZREM', waiters_key, ticket)
+                lease_account(username, now, lease_seconds, 'granted', host, lane)
+                local granted_key = grant_key(ticket)
+                redis.call('RPUSH', granted_key, username)
+                redis.call('EXPIRE', granted_key, math.ceil(lease_seconds))
+                served = served + 1
+            end
+        end
+    end
+    return served
+end
+
+-- 账号池有账号变为可用或冷却时间变化时调用: 先按顺序分给排队的票据；
+-- 仍有票据在排队时向队首推一个空令牌，让其按新的冷却到期时间重新计算等待
+local function wake_waiters(count, now)
+    count = count - serve_waiters(now)
+    if count > 0 then
+        local head = redis.call('ZRANGE', waiters_key, 0, 0)[1]
+        if head then
+            redis.call('RPUSH', grant_key(head), '')
+            redis.call('EXPIRE', grant_key(head), 60)
+        end
+    end
+end
+
+-- 有冷却回收进程持有租约时，其他脚本不再顺带提升冷却账号
+local function reaper_active()
+    return redis.call('EXISTS', reaper_key) == 1
+end
+
+local function promote_expired(now, limit)
+    local due = redis.call('ZRANGEBYSCORE', cooldown_key, '-inf', now, 'LIMIT', 0, limit)
+    local promoted = 0
+    for _, username in ipairs(due) do
+        redis.call('ZREM', cooldown_key, username)
+        if redis.call('SISMEMBER', registry_key, username) == 1 then
+            redis.call('ZADD', available_key, available_score(username, now), username)
+            journal('promote', username, now)
+            promoted = promoted + 1
+        end
+    end
+    return promoted
+end
+
+-- event 为 release（持有者释放）或 expire（租约过期被回收）
+-- outcome 为 success / failure 时累计账号的成功/失败次数，供 success 策略使用；
+-- 失败时按连续失败次数计算冷却时间，连续失败达到上限的账号进入隔离
+-- token 不为 nil 时须与账号当前的租约令牌一致（都没有时为空串），否则视为过期持有者的释放，计入 stale
+local function release_one(username, cooldown_seconds, now, event, outcome, token)
+    if token then
+        if not redis.call('ZSCORE', in_use_key, username) then
+            return 0
+        end
+        if (redis.call('HGET', account_key(username), 'lease_token') or '') ~= token then
+            stale = stale + 1
+            return 0
+        end
+    end
+    if redis.call('ZREM', in_use_key, username) == 0 then
+        return 0
+    end
+
+    local key = account_key(username)
+    -- 事件中的 outcome 为账号的去向，使用结果另记在 result 中
+    local result = nil
+    if outcome == 'success' or outcome == 'failure' then
+        result = outcome
+    end
+    -- 使用期间已被删除的账号不再放回账号池
+    if redis.call('SISMEMBER', registry_key, username) == 0 then
+        redis.call('DEL', key)
+        journal(event, username, now, 'deleted', nil, nil, nil, result)
+        return 0
+    end
+
+    redis.call('HDEL', key, 'acquired_at', 'lease_token')
+    redis.call('HSET', key, 'released_at', now)
+    if outcome == 'success' then
+        redis.call('HINCRBY', key, 'successes', 1)
+        redis.call('HDEL', key, 'consecutive_failures')
+    elseif outcome == 'failure' then
+        redis.call('HINCRBY', key, 'failures', 1)
+        local failures = redis.call('HINCRBY', key, 'consecutive_failures', 1)
+        if failure_policy.quarantine_after > 0 and failures >= failure_policy.quarantine_after then
+            redis.call('ZADD', quarantine_key, now, username)
+            journal(event, username, now, 'quarantined', nil, nil, nil, result)
+            quarantined = quarantined + 1
+            return 1
+        end
+        if failure_policy.base > 0 then
+            local delay = math.min(failure_policy.cap, failure_policy.base * 2 ^ (failures - 1))
+            cooldown_seconds = delay * (1 - failure_policy.jitter * math.random())
+        end
+    end
+    if cooldown_seconds > 0 then
+        redis.call('ZADD', cooldown_key, now + cooldown_seconds, username)
+        journal(event, username, now, 'cooldown', now + cooldown_seconds, nil, nil, result)
+    else
+        redis.call('ZADD', available_key, available_score(username, now), username)
+        journal(event, username, now, 'available', nil, nil, nil, result)
+    end
+    return 1
+end
+
+-- 回收租约已过期的账号，只访问过期部分: O(log N + k)
+local function reclaim_expired(now, limit, cooldown_seconds)
+    local expired = redis.call('ZRANGEBYSCORE', in_use_key, '-inf', now, 'LIMIT', 0, limit)
+    local reclaimed = 0
+    for _, username in ipairs(expired) do
+        reclaimed = reclaimed + release_one(username, cooldown_seconds, now, 'expire')
+    end
+    return reclaimed
+end
+"""
+
+# 一次取出最多 count 个账号；返回 {最早冷却到期时间或 nil, 排队票据或 nil, 账号1字段数组, 账号2字段数组, ...}
+# 取出顺序由账号池的选择策略决定，ARGV[9] 为 random 策略的随机种子
+# 公平排队: 已有票据排队时新来的调用不能插队，可用账号先按票据顺序分给排队者；
+#   ARGV[11] 大于当前时间且未取到账号时，登记一张截止到 ARGV[11] 的票据并返回，之后带着 ARGV[10] 的票据重试，
+#   分给该票据的账号从其列表中取出
+LUA_ACQUIRE_ACCOUNT = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local batch_limit = tonumber(ARGV[5]) or 100
+local lease_seconds = tonumber(ARGV[6]) or 300
+local reclaim_cooldown = tonumber(ARGV[7]) or 30
+local count = tonumber(ARGV[8]) or 1
+math.randomseed(tonumber(ARGV[9]) or 0)
+local ticket = ARGV[10] or ''
+local wait_until = tonumber(ARGV[11]) or 0
+
+local reclaimed = reclaim_expired(now, batch_limit, reclaim_cooldown)
+local reaping = reaper_active()
+local promoted = 0
+if not reaping then
+    promoted = promote_expired(now, batch_limit)
+end
+-- 先服务排在前面的票据，本次调用只能取用剩下的账号
+local served = serve_waiters(now)
+local acquired = {}
+local taken = 0
+local queued = false
+
+if ticket ~= '' then
+    local granted_key = grant_key(ticket)
+    local username = redis.call('LPOP', granted_key)
+    while username == '' do
+        username = redis.call('LPOP', granted_key)
+    end
+    if username and redis.call('EXISTS', account_key(username)) == 1 then
+        redis.call('DEL', granted_key)
+        acquired[1] = redis.call('HGETALL', account_key(username))
+    elseif redis.call('ZSCORE', waiters_key, ticket) then
+        queued = ticket
+    end
+else
+    while #acquired < count do
+        local popped = pop_available(count - #acquired)
+        if #popped == 0 then
+            break
+        end
+        for i = 1, #popped, 2 do
+            local username = popped[i]
+            local key = account_key(username)
+            -- 账号哈希已不存在的用户名直接丢弃
+            if redis.call('EXISTS', key) == 1 then
+                lease_account(username, now, lease_seconds)
+                acquired[#acquired + 1] = redis.call('HGETALL', key)
+            end
+        end
+    end
+    taken = #acquired
+    if taken < count and wait_until > now then
+        local sequence = redis.call('HINCRBY', meta_key, 'ticket', 1)
+        queued = table.concat({sequence, ARGV[11], lease_seconds, journal_host, journal_lane}, ':')
+        redis.call('ZADD', waiters_key, sequence, queued)
+    end
+end
+
+-- 本次回收/提升但未被取走的账号，分给排队的等待者
+wake_waiters(promoted + reclaimed - served - taken, now)
+
+local result = {false, queued}
+if #acquired < count and not reaping then
+    -- 账号不足时返回最早的冷却到期时间，供阻塞等待计算超时；
+    -- 有冷却回收进程时由其提升账号并唤醒等待者，不需要按冷却到期时间重试
+    local earliest = redis.call('ZRANGE', cooldown_key, 0, 0, 'WITHSCORES')
+    result[1] = earliest[2] or false
+end
+for i = 1, #acquired do
+    result[i + 2] = acquired[i]
+end
+return result
+"""
+
+# ARGV[6] 为使用结果（success / failure / '' 未知），ARGV[7..11] 为失败冷却参数与随机种子，
+# ARGV[12] 为 1 时校验租约令牌（0 为管理操作，不校验），ARGV[13..] 依次为 用户名, 租约令牌；
+# 返回 {实际释放的个数, 其中被隔离的个数, 令牌不符被拒绝的个数}
+LUA_RELEASE_ACCOUNT = _LUA_POOL_PRELUDE + """
+local cooldown_seconds = tonumber(ARGV[4]) or 0
+local now = tonumber(ARGV[5])
+local outcome = ARGV[6]
+failure_policy.base = tonumber(ARGV[7]) or 0
+failure_policy.cap = tonumber(ARGV[8]) or 0
+failure_policy.jitter = tonumber(ARGV[9]) or 0
+failure_policy.quarantine_after = tonumber(ARGV[10]) or 0
+math.randomseed(tonumber(ARGV[11]) or 0)
+
+local fenced = ARGV[12] == '1'
+
+local released = 0
+for i = 13, #ARGV, 2 do
+    local username = ARGV[i]
+    if username ~= '' then
+        local token = nil
+        if fenced then
+            token = ARGV[i + 1] or ''
+        end
+        released = released + release_one(username, cooldown_seconds, now, 'release', outcome, token)
+    end
+end
+
+-- 分给排队的等待者；进入冷却时也唤醒队首，让其按新的冷却到期时间重新计算等待
+wake_waiters(released - quarantined, now)
+return {released, quarantined, stale}
+"""
+
+LUA_REQUEUE_COOLDOWN = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local limit = tonumber(ARGV[5]) or 100
+
+if reaper_active() then
+    return 0
+end
+local promoted = promote_expired(now, limit)
+wake_waiters(promoted, now)
+return promoted
+"""
+
+# 冷却回收进程的一次调度: ARGV[6] 为回收进程标识，ARGV[7] 为选主租约的毫秒数，0 表示退出并交出租约；
+# 租约由其他进程持有时返回 {-1, false}，否则续期租约、提升至多 ARGV[5] 个冷却到期的账号，
+# 返回 {提升的账号数, 最早的冷却到期时间}
+LUA_REAP_COOLDOWN = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local limit = tonumber(ARGV[5]) or 100
+local owner = ARGV[6]
+local lease_ms = tonumber(ARGV[7]) or 0
+
+local holder = redis.call('GET', reaper_key)
+if holder and holder ~= owner then
+    return {-1, false}
+end
+if lease_ms <= 0 then
+    if holder then
+        redis.call('DEL', reaper_key)
+    end
+    return {0, false}
+end
+redis.call('SET', reaper_key, owner, 'PX', lease_ms)
+
+local promoted = promote_expired(now, limit)
+wake_waiters(promoted, now)
+local earliest = redis.call('ZRANGE', cooldown_key, 0, 0, 'WITHSCORES')
+return {promoted, earliest[2] or false}
+"""
+
+LUA_RECLAIM_EXPIRED_LEASES = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local limit = tonumber(ARGV[5]) or 100
+local cooldown_seconds = tonumber(ARGV[6]) or 30
+
+local reclaimed = reclaim_expired(now, limit, cooldown_seconds)
+wake_waiters(reclaimed, now)
+return reclaimed
+"""
+
+# ARGV[7] 为持有者的租约令牌；返回 1 续约成功，0 账号已不在使用中，-1 令牌不符（已被回收并重新分配）
+LUA_RENEW_LEASE = _LUA_POOL_PRELUDE + """
+local username = ARGV[4]
+local now = tonumber(ARGV[5])
+local lease_seconds = tonumber(ARGV[6]) or 300
+local token = ARGV[7] or ''
+
+if not redis.call('ZSCORE', in_use_key, username) then
+    return 0
+end
+if (redis.call('HGET', account_key(username), 'lease_token') or '') ~= token then
+    return -1
+end
+redis.call('ZADD', in_use_key, now + lease_seconds, username)
+journal('renew', username, now, nil, now + lease_seconds)
+return 1
+"""
+
+# 放弃排队: ARGV[4] 为票据，ARGV[5] 为当前时间；撤销前已分到账号时返回该账号的字段数组，由调用方照常持有
+LUA_CANCEL_WAIT = _LUA_POOL_PRELUDE + """
+local ticket = ARGV[4]
+local now = tonumber(ARGV[5])
+
+local was_head = redis.call('ZRANGE', waiters_key, 0, 0)[1] == ticket
+redis.call('ZREM', waiters_key, ticket)
+local granted_key = grant_key(ticket)
+local username = redis.call('LPOP', granted_key)
+while username == '' do
+    username = redis.call('LPOP', granted_key)
+end
+redis.call('DEL', granted_key)
+-- 队首离开后让新的队首重新计算等待
+if was_head then
+    local head = redis.call('ZRANGE', waiters_key, 0, 0)[1]
+    if head then
+        redis.call('RPUSH', grant_key(head), '')
+        redis.call('EXPIRE', grant_key(head), 60)
+    end
+end
+if username and redis.call('EXISTS', account_key(username)) == 1 then
+    return redis.call('HGETALL', account_key(username))
+end
+return false
+"""
+
+# 解除隔离: ARGV[4] 为当前时间，ARGV[5..] 为用户名；清零连续失败次数并放回可用集合，返回解除的个数
+LUA_RELEASE_QUARANTINED = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+
+local restored = 0
+for i = 5, #ARGV do
+    local username = ARGV[i]
+    if redis.call('ZREM', quarantine_key, username) == 1 then
+        local key = account_key(username)
+        if redis.call('SISMEMBER', registry_key, username) == 1 and redis.call('EXISTS', key) == 1 then
+            redis.call('HDEL', key, 'consecutive_failures')
+            redis.call('ZADD', available_key, available_score(username, now), username)
+            journal('unquarantine', username, now, 'available')
+            restored = restored + 1
+        end
+    end
+end
+
+wake_waiters(restored, now)
+return restored
+"""
+
+# 逐个检查一批用户名并只修复出现偏差的条目，返回 {清理的残留数, 移除的重复数, 找回的账号数}
+#   账号已不在注册集合或账号哈希丢失: 从所有结构中清理；
+#     已删除但租约未到期的使用中账号除外（见 LUA_REMOVE_ACCOUNTS），留给持有者释放时删除
+#   同时出现在多个状态集合: 按 使用中 > 隔离 > 冷却 > 可用 保留一份
+#   不在任何状态集合: 放回可用集合
+LUA_REPAIR_ACCOUNTS = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+
+local orphaned = 0
+local duplicates = 0
+local restored = 0
+
+for i = 5, #ARGV do
+    local username = ARGV[i]
+    local key = account_key(username)
+    local registered = redis.call('SISMEMBER', registry_key, username) == 1
+    local in_use = redis.call('ZSCORE', in_use_key, username)
+    local isolated = redis.call('ZSCORE', quarantine_key, username)
+    local cooling = redis.call('ZSCORE', cooldown_key, username)
+    local available = redis.call('ZSCORE', available_key, username)
+
+    local exists = redis.call('EXISTS', key) == 1
+    if not registered and exists and in_use and tonumber(in_use) > now then
+        -- 持有者仍在使用，释放或租约到期回收时删除账号哈希
+    elseif not registered or not exists then
+        local cleared = redis.call('ZREM', in_use_key, username)
+            + redis.call('ZREM', quarantine_key, username)
+            + redis.call('ZREM', cooldown_key, username)
+            + redis.call('ZREM', available_key, username)
+            + redis.call('SREM', registry_key, username)
+            + redis.call('DEL', key)
+        if cleared > 0 then
+            journal('repair', username, now, 'orphaned')
+            orphaned = orphaned + cleared
+        end
+    elseif in_use then
+        local dropped = redis.call('ZREM', quarantine_key, username)
+            + redis.call('ZREM', cooldown_key, username)
+            + redis.call('ZREM', available_key, username)
+        if dropped > 0 then
+            journal('repair', username, now, 'in_use', in_use)
+            duplicates = duplicates + dropped
+        end
+    elseif isolated then
+        local dropped = redis.call('ZREM', cooldown_key, username)
+            + redis.call('ZREM', available_key, username)
+        if dropped > 0 then
+            journal('repair', username, now, 'quarantined')
+            duplicates = duplicates + dropped
+        end
+    elseif cooling then
+        if redis.call('ZREM', available_key, username) > 0 then
+            journal('repair', username, now, 'cooldown', cooling)
+            duplicates = duplicates + 1
+        end
+    elseif not available then
+        redis.call('ZADD', available_key, available_score(username, now), username)
+        journal('repair', username, now, 'available')
+        restored = restored + 1
+    end
+end
+
+wake_waiters(restored, now)
+return {orphaned, duplicates, restored}
+"""
+
+# 批量写入账号；返回 {新增数, 更新数, 未改动数}
+# ARGV[4..]: now, 结构版本, 模式, 然后每个账号依次为 用户名, 字段数 n, 字段1, 值1, ..., 字段n, 值n
+#   模式 insert: 已存在的用户名跳过（计入未改动）
+#   模式 update: 已存在的用户名只写入取值不同的字段，created_at 不覆盖，账号所处状态保持不变
+LUA_UPSERT_ACCOUNTS = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local update_existing = ARGV[6] == 'update'
+
+local accounts = {}
+local i = 7
+while i <= #ARGV do
+    local field_count = tonumber(ARGV[i + 1])
+    accounts[#accounts + 1] = {ARGV[i], i + 2, i + 1 + field_count * 2}
+    i = i + 2 + field_count * 2
+end
+
+-- 一次预留本批的顺序号，新账号按传入顺序排在已释放账号之前
+local last_sequence = redis.call('HINCRBY', meta_key, 'sequence', #accounts)
+redis.call('HSETNX', meta_key, 'version', ARGV[5])
+
+local added = 0
+local updated = 0
+local unchanged = 0
+for index, entry in ipairs(accounts) do
+    local username = entry[1]
+    local key = account_key(username)
+    if redis.call('SADD', registry_key, username) == 1 then
+        redis.call('DEL', key)
+        redis.call('HSET', key, unpack(ARGV, entry[2], entry[3]))
+        redis.call('ZADD', available_key, last_sequence - #accounts + index, username)
+        journal('add', username, now)
+        added = added + 1
+    elseif update_existing then
+        local changes = {}
+        for j = entry[2], entry[3], 2 do
+            local field = ARGV[j]
+            if field ~= 'created_at' and redis.call('HGET', key, field) ~= ARGV[j + 1] then
+                changes[#changes + 1] = field
+                changes[#changes + 1] = ARGV[j + 1]
+            end
+        end
+        if #changes > 0 then
+            redis.call('HSET', key, unpack(changes))
+            journal('update', username, now)
+            updated = updated + 1
+        else
+            unchanged = unchanged + 1
+        end
+    else
+        unchanged = unchanged + 1
+    end
+end
+
+wake_waiters(added, now)
+return {added, updated, unchanged}
+"""
+
+# ARGV[4] 为当前时间，ARGV[5..] 为待删除的用户名，返回删除的账号数
+# 使用中的账号只从注册集合移除，由持有者释放时删除账号哈希，避免释放时找不到账号
+LUA_REMOVE_ACCOUNTS = _LUA_POOL_PRELUDE + """
+local now = tonumber(ARGV[4])
+local removed = 0
+for i = 5, #ARGV do
+    local username = ARGV[i]
+    if redis.call('SREM', registry_key, username) == 1 then
+        redis.call('ZREM', available_key, username)
+        redis.call('ZREM', cooldown_key, username)
+        redis.call('ZREM', quarantine_key, username)
+        if not redis.call('ZSCORE', in_use_key, username) then
+            redis.call('DEL', account_key(username))
+        end
+        journal('remove', username, now)
+        removed = removed + 1
+    end
+end
+return removed
+"""
+
+# 把 v3 结构中的账号分批迁移到 v4，每次调用最多处理 batch_size 条；返回 {迁移数, 重复丢弃数, v3 剩余条数}
+# 迁移顺序为 使用中 > 冷却 > 可用，同一账号在多个结构中重复时保留先迁移的一份
+LUA_MIGRATE_V3 = _LUA_POOL_PRELUDE + """
+local v3_available_key = KEYS[8]
+local v3_used_map_key = KEYS[9]
+local v3_used_list_key = KEYS[10]
+local v3_cooldown_key = KEYS[11]
+local v3_lease_key = KEYS[12]
+local now = tonumber(ARGV[4])
+local batch_size = tonumber(ARGV[5]) or 500
+local lease_seconds = tonumber(ARGV[6]) or 300
+
+-- 脚本中使用 HSCAN 后仍需写入，旧版本 Redis 需切换为按命令复制
+if redis.replicate_commands then
+    pcall(redis.replicate_commands)
+end
+
+local processed = 0
+local moved = 0
+local duplicates = 0
+local made_available = 0
+
+local function import(payload, target_key, status, score_of)
+    processed = processed + 1
+    local ok, account = pcall(cjson.decode, payload)
+    if not ok or type(account) ~= 'table' then
+        return
+    end
+    local username = account['username']
+    if type(username) ~= 'string' or username == '' then
+        return
+    end
+    if redis.call('SADD', registry_key, username) == 0 then
+        duplicates = duplicates + 1
+        return
+    end
+
+    local key = account_key(username)
+    local fields = {}
+    for field, value in pairs(account) do
+        if field ~= 'in_use' and field ~= 'status' and field ~= 'cooldown_until'
+            and field ~= 'lease_until' and field ~= 'acquired_at' then
+            fields[#fields + 1] = field
+            fields[#fields + 1] = cjson.encode(value)
+        end
+    end
+    redis.call('DEL', key)
+    redis.call('HSET', key, unpack(fields))
+    if target_key == in_use_key then
+        redis.call('HSET', key, 'acquired_at', tonumber(account['acquired_at']) or now)
+    elseif target_key == available_key then
+        made_available = made_available + 1
+    end
+    local score = score_of(account, username)
+    redis.call('ZADD', target_key, score, username)
+    if status == 'available' then
+        journal('migrate', username, now, status)
+    else
+        journal('migrate', username, now, status, score)
+    end
+    moved = moved + 1
+end
+
+local function lease_of(account, username)
+    local lease_until = tonumber(redis.call('ZSCORE', v3_lease_key, username))
+    if lease_until then
+        return lease_until
+    end
+    return (tonumber(account['acquired_at']) or now) + lease_seconds
+end
+
+-- 使用中: used_map 哈希，迁移后即删除，每次从游标 0 开始也不会重复
+local cursor = '0'
+repeat
+    local page = redis.call('HSCAN', v3_used_map_key, cursor, 'COUNT', batch_size)
+    cursor = page[1]
+    local entries = page[2]
+    for i = 1, #entries, 2 do
+        redis.call('HDEL', v3_used_map_key, entries[i])
+        import(entries[i + 1], in_use_key, 'in_use', lease_of)
+    end
+until cursor == '0' or processed >= batch_size
+
+-- 使用中: 更早版本的 used 列表
+if processed < batch_size then
+    local entries = redis.call('LRANGE', v3_used_list_key, 0, batch_size - processed - 1)
+    if #entries > 0 then
+        redis.call('LTRIM', v3_used_list_key, #entries, -1)
+    end
+    for _, payload in ipairs(entries) do
+        import(payload, in_use_key, 'in_use', lease_of)
+    end
+end
+
+-- 冷却
+if processed < batch_size then
+    local entries = redis.call('ZRANGE', v3_cooldown_key, 0, batch_size - processed - 1, 'WITHSCORES')
+    for i = 1, #entries, 2 do
+        local ready_at = tonumber(entries[i + 1]) or now
+        redis.call('ZREM', v3_cooldown_key, entries[i])
+        import(entries[i], cooldown_key, 'cooldown', function() return ready_at end)
+    end
+end
+
+-- 可用
+if processed < batch_size then
+    local entries = redis.call('LRANGE', v3_available_key, 0, batch_size - processed - 1)
+    if #entries > 0 then
+        redis.call('LTRIM', v3_available_key, #entries, -1)
+    end
+    -- 按 v3 列表顺序编号，排在迁移后释放的账号之前
+    local function next_sequence()
+        return redis.call('HINCRBY', meta_key, 'sequence', 1)
+    end
+    for _, payload in ipairs(entries) do
+        import(payload, available_key, 'available', next_sequence)
+    end
+end
+
+wake_waiters(made_available, now)
+
+local remaining = redis.call('HLEN', v3_used_map_key)
+    + redis.call('LLEN', v3_used_list_key)
+    + redis.call('ZCARD', v3_cooldown_key)
+    + redis.call('LLEN', v3_available_key)
+if remaining == 0 then
+    -- v3 的租约/索引/信号键随最后一批一起删除
+    for i = 12, #KEYS do
+        redis.call('DEL', KEYS[i])
+    end
+    redis.call('HSET', meta_key, 'version', ARGV[7], 'migrated_at', now)
+end
+return {moved, duplicates, remaining}
+"""
+
+
+# 把无哈希标签的旧 v4 键分批移到带标签的键名，每次调用最多处理 batch_size 个用户名；返回 {迁移数, 剩余数}
+# KEYS[8..14] 为 untagged_keys；旧键与新键不在同一槽位，只能在单实例 Redis 上执行（迁移到集群之前）
+# 新键中已有的账号与状态优先保留，旧键中的同名条目丢弃
+LUA_MIGRATE_UNTAGGED = _LUA_POOL_PRELUDE + """
+local old_available_key = KEYS[8]
+local old_in_use_key = KEYS[9]
+local old_cooldown_key = KEYS[10]
+local old_registry_key = KEYS[11]
+local old_signal_key = KEYS[12]
+local old_journal_key = KEYS[13]
+local old_meta_key = KEYS[14]
+local now = tonumber(ARGV[4])
+local batch_size = tonumber(ARGV[5]) or 500
+
+-- 脚本中使用 SSCAN 后仍需写入，旧版本 Redis 需切换为按命令复制
+if redis.replicate_commands then
+    pcall(redis.replicate_commands)
+end
+
+local processed = 0
+local made_available = 0
+-- 同一用户名在多个旧状态集合中时按 使用中 > 冷却 > 可用 保留一份
+local statuses = {
+    {old_in_use_key, in_use_key, 'in_use'},
+    {old_cooldown_key, cooldown_key, 'cooldown'},
+    {old_available_key, available_key, 'available'},
+}
+
+local function move(username, registered)
+    processed = processed + 1
+    local old_key = old_registry_key .. ':' .. username
+    if redis.call('EXISTS', old_key) == 1 then
+        if redis.call('EXISTS', account_key(username)) == 0 then
+            redis.call('RENAME', old_key, account_key(username))
+        else
+            redis.call('DEL', old_key)
+        end
+    end
+    if registered then
+        redis.call('SADD', registry_key, username)
+    end
+
+    local placed = redis.call('ZSCORE', in_use_key, username)
+        or redis.call('ZSCORE', quarantine_key, username)
+        or redis.call('ZSCORE', cooldown_key, username)
+        or redis.call('ZSCORE', available_key, username)
+    for _, entry in ipairs(statuses) do
+        local score = redis.call('ZSCORE', entry[1], username)
+        if score then
+            redis.call('ZREM', entry[1], username)
+            if not placed then
+                redis.call('ZADD', entry[2], score, username)
+                if entry[3] == 'available' then
+                    made_available = made_available + 1
+                    journal('migrate', username, now, entry[3])
+                else
+                    journal('migrate', username, now, entry[3], score)
+                end
+                placed = true
+            end
+        end
+    end
+end
+
+-- 注册集合中的账号，迁移后即从旧集合删除，每次从游标 0 开始也不会重复
+local cursor = '0'
+repeat
+    local page = redis.call('SSCAN', old_registry_key, cursor, 'COUNT', batch_size)
+    cursor = page[1]
+    for _, username in ipairs(page[2]) do
+        redis.call('SREM', old_registry_key, username)
+        move(username, true)
+    end
+until cursor == '0' or processed >= batch_size
+
+-- 已删除但仍在状态集合中的账号（如使用中被删除），保持未注册
+for _, entry in ipairs(statuses) do
+    if processed < batch_size and redis.call('SCARD', old_registry_key) == 0 then
+        for _, username in ipairs(redis.call('ZRANGE', entry[1], 0, batch_size - processed - 1)) do
+            move(username, false)
+        end
+    end
+end
+
+wake_waiters(made_available, now)
+
+local remaining = redis.call('SCARD', old_registry_key)
+    + redis.call('ZCARD', old_in_use_key)
+    + redis.call('ZCARD', old_cooldown_key)
+    + redis.call('ZCARD', old_available_key)
+if remaining == 0 then
+    -- 元信息逐项合并，顺序号取两者较大值，避免新账号排在已有账号之前
+    local old_meta = redis.call('HGETALL', old_meta_key)
+    for i = 1, #old_meta, 2 do
+        if old_meta[i] == 'sequence' then
+            local current = tonumber(redis.call('HGET', meta_key, 'sequence')) or 0
+            redis.call('HSET', meta_key, 'sequence', math.max(current, tonumber(old_meta[i + 1]) or 0))
+        else
+            redis.call('HSETNX', meta_key, old_meta[i], old_meta[i + 1])
+        end
+    end
+    if redis.call('EXISTS', old_journal_key) == 1 and redis.call('EXISTS', journal_key) == 0 then
+        redis.call('RENAME', old_journal_key, journal_key)
+    end
+    redis.call('DEL', old_meta_key, old_signal_key, old_journal_key)
+    redis.call('HSET', meta_key, 'layout_migrated_at', now)
+end
+return {processed, remaining}
+"""
+
+# 脚本 -> 统计中使用的名称
+SCRIPT_NAMES = {
+    LUA_ACQUIRE_ACCOUNT: "acquire",
+    LUA_RELEASE_ACCOUNT: "release",
+    LUA_REQUEUE_COOLDOWN: "requeue_cooldown",
+    LUA_REAP_COOLDOWN: "reap_cooldown",
+    LUA_RECLAIM_EXPIRED_LEASES: "reclaim_leases",
+    LUA_RENEW_LEASE: "renew_lease",
+    LUA_CANCEL_WAIT: "cancel_wait",
+    LUA_RELEASE_QUARANTINED: "release_quarantined",
+    LUA_REPAIR_ACCOUNTS: "repair",
+    LUA_UPSERT_ACCOUNTS: "upsert",
+    LUA_REMOVE_ACCOUNTS: "remove",
+    LUA_MIGRATE_V3: "migrate_v3",
+    LUA_MIGRATE_UNTAGGED: "migrate_untagged",
+}
+
+
+# ---- 脚本参数 ----------------------------------------------------------
+def journal_context(lane: str = "", host: Optional[str] = None, max_length: int = JOURNAL_MAX_LENGTH) -> List:
+    """脚本 ARGV 开头的事件日志上下文: 日志最大长度、主机名、工作通道"""
+    return [max_length, host or socket.gethostname(), lane]
+
+
+def journal_fields(context: List, event: str, username: str, now: float, outcome: Optional[str] = None) -> Dict:
+    """在脚本外（如事务 pipeline 中）写入事件时使用，字段与脚本中的 journal 一致"""
+    fields = {"e": event, "u": username, "h": context[1], "l": context[2], "t": now}
+    if outcome is not None:
+        fields["o"] = outcome
+    return fields
+
+
+def acquire_args(
+    now: float, count: int, lease_seconds: float, ticket: Optional[str] = None, wait_until: Optional[float] = None
+) -> List:
+    """ticket 为之前登记的排队票据；未带票据且 wait_until 晚于 now 时，取不到账号会登记新票据"""
+    return [
+        now,
+        COOLDOWN_PROMOTE_BATCH,
+        lease_seconds,
+        LEASE_RECLAIM_COOLDOWN,
+        count,
+        random.randrange(2 ** 31),
+        ticket or "",
+        wait_until + WAITER_EXPIRY_GRACE if wait_until else 0,
+    ]
+
+
+def parse_acquire_result(result: List) -> Tuple[List[Dict], Optional[float], Optional[str]]:
+    """拆分获取脚本的返回值为 (账号列表, 最早冷却到期时间, 排队票据)"""
+    next_ready_at = float(result[0]) if result[0] is not None else None
+    return [decode_account(fields) for fields in result[2:]], next_ready_at, result[1]
+
+
+def cancel_wait_args(ticket: str, now: float) -> List:
+    return [ticket, now]
+
+
+def release_args(
+    usernames: List[str],
+    cooldown_seconds: int,
+    now: float,
+    outcome: Optional[str] = None,
+    tokens: Optional[List] = None,
+) -> List:
+    """outcome 为 RELEASE_OUTCOMES 之一或 None；failure 时冷却时间由脚本按连续失败次数计算
+
+    tokens 为与 usernames 一一对应的租约令牌（持有者释放），为 None 时不校验令牌（一键释放等管理操作）。
+    """
+    entries = []
+    for index, username in enumerate(usernames):
+        entries.append(username)
+        entries.append(lease_token_arg(tokens[index]) if tokens is not None else "")
+    return [
+        cooldown_seconds,
+        now,
+        normalize_outcome(outcome) or "",
+        FAILURE_COOLDOWN_BASE,
+        FAILURE_COOLDOWN_CAP,
+        FAILURE_COOLDOWN_JITTER,
+        QUARANTINE_AFTER_FAILURES,
+        random.randrange(2 ** 31),
+        1 if tokens is not None else 0,
+        *entries,
+    ]
+
+
+def lease_token_arg(token) -> str:
+    """账号字典中的租约令牌转为脚本参数，没有令牌（旧版取出的账号）时为空串"""
+    return "" if token is None or token == "" else str(int(token))
+
+
+def normalize_outcome(outcome: Optional[str] = None, success: Optional[bool] = None) -> Optional[str]:
+    """校验使用结果；兼容旧的 success 参数（True / False）"""
+    if outcome is None and success is not None:
+        outcome = "success" if success else "failure"
+    if outcome is not None and outcome not in RELEASE_OUTCOMES:
+        raise ValueError(f"未知的使用结果: {outcome}")
+    return outcome
+
+
+def failure_cooldown(consecutive_failures: int, rand: float) -> float:
+    """与释放脚本相同的失败冷却时间，rand 为 [0, 1) 的随机数，供不经过 Lua 的本地后端使用"""
+    delay = min(FAILURE_COOLDOWN_CAP, FAILURE_COOLDOWN_BASE * 2 ** (consecutive_failures - 1))
+    return delay * (1 - FAILURE_COOLDOWN_JITTER * rand)
+
+
+def release_quarantined_args(usernames: List[str], now: float) -> List:
+    return [now, *usernames]
+
+
+def requeue_args(now: float) -> List:
+    return [now, COOLDOWN_PROMOTE_BATCH]
+
+
+def reap_args(now: float, owner: str, lease_seconds: float) -> List:
+    """lease_seconds 为 0 时交出选主租约"""
+    return [now, COOLDOWN_PROMOTE_BATCH, owner, int(lease_seconds * 1000)]
+
+
+def parse_reap_result(result: List) -> Tuple[int, Optional[float]]:
+    """拆分冷却回收脚本的返回值为 (提升的账号数，租约由其他进程持有时为 -1, 最早冷却到期时间)"""
+    return int(result[0]), float(result[1]) if result[1] is not None else None
+
+
+def reclaim_args(now: float) -> List:
+    return [now, COOLDOWN_PROMOTE_BATCH, LEASE_RECLAIM_COOLDOWN]
+
+
+def renew_args(username: str, now: float, lease_seconds: float, token=None) -> List:
+    return [username, now, lease_seconds, lease_token_arg(token)]
+
+
+def repair_args(usernames: List[str], now: float) -> List:
+    return [now, *usernames]
+
+
+def upsert_keys(pool_key: str) -> List[str]:
+    return pool_fixed_keys(pool_key)
+
+
+def upsert_args(accounts: List[Tuple[str, Dict[str, str]]], now: float, update_existing: bool = False) -> List:
+    """accounts 为 (用户名, encode_account 编码后的字段) 列表"""
+    args = [now, SCHEMA_VERSION, "update" if update_existing else "insert"]
+    for username, fields in accounts:
+        args.append(username)
+        args.append(len(fields))
+        for field, value in fields.items():
+            args.append(field)
+            args.append(value)
+    return args
+
+
+def remove_args(usernames: List[str], now: float) -> List:
+    return [now, *usernames]
+
+
+def selection_fields(policy: str, success_weight: Optional[float] = None, top_k: Optional[int] = None) -> Dict:
+    """校验选择策略并返回写入账号池元信息的字段"""
+    if policy not in SELECTION_POLICIES:
+        raise ValueError(f"未知的账号选择策略: {policy}")
+    return {
+        "policy": policy,
+        "success_weight": DEFAULT_SUCCESS_WEIGHT if success_weight is None else max(0.0, float(success_weight)),
+        "top_k": DEFAULT_TOP_K if top_k is None else max(1, int(top_k)),
+    }
+
+
+def migrate_untagged_keys(pool_key: str) -> List[str]:
+    return pool_fixed_keys(pool_key) + untagged_keys(pool_key)
+
+
+def migrate_untagged_args(now: float) -> List:
+    return [now, ACCOUNT_BATCH_SIZE]
+
+
+def migrate_keys(pool_key: str) -> List[str]:
+    return pool_fixed_keys(pool_key) + v3_keys(pool_key)
+
+
+def migrate_args(now: float, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List:
+    return [now, ACCOUNT_BATCH_SIZE, lease_seconds, SCHEMA_VERSION]
+
+
+# ---- 分页 --------------------------------------------------------------
+def cursor_page(
+    entries: List[Tuple[str, float]], cursor: Optional[Tuple[float, str]]
+) -> Tuple[List[Tuple[str, float]], Optional[Tuple[float, str]], int]:
+    """按 (分数, 用户名) 游标分页，返回 (本页, 新游标, 新游标分数下已读过的账号数)
+
+    entries 为 ZRANGEBYSCORE 从游标分数（含）起取出的 (用户名, 分数)，去掉游标及之前的同分账号后即为本页。
+    下一页从新游标的分数（含）起多取已读过的同分账号数，遍历期间其他账号移入移出不会造成遗漏。
+    """
+    page = entries
+    if cursor is not None:
+        page = [(username, score) for username, score in entries if score > cursor[0] or username > cursor[1]]
+    if page:
+        cursor = (page[-1][1], page[-1][0])
+    if cursor is None:
+        return page, cursor, 0
+    seen = sum(1 for username, score in entries if score == cursor[0] and username <= cursor[1])
+    return page, cursor, seen
+
+
+# ---- 状态统计 ----------------------------------------------------------
+def empty_status() -> Dict:
+    return {
+        "total": 0,
+        "in_use": 0,
+        "available": 0,
+        "cooldown": 0,
+        "quarantined": 0,
+        "next_cooldown_at": None,
+        "next_cooldown_in": None,
+    }
+
+
+def queue_status_reads(pipe, pool_key: str, now: float) -> None:
+    """向非事务 pipeline 追加状态统计所需的只读命令，结果交给 build_status 解析
+
+    同时读取 v4 与尚未迁移的 v3 结构，迁移完成前的账号池也能得到正确统计。
+    """
+    for zset in (cooldown_key(pool_key), v3_cooldown_key(pool_key)):
+        pipe.zcard(zset)
+        pipe.zcount(zset, "-inf", now)
+        pipe.zrangebyscore(zset, f"({now}", "+inf", start=0, num=1, withscores=True)
+    pipe.zcard(available_key(pool_key))
+    pipe.zcard(in_use_key(pool_key))
+    pipe.llen(v3_available_key(pool_key))
+    pipe.hlen(v3_used_map_key(pool_key))
+    pipe.llen(v3_used_list_key(pool_key))
+    pipe.zcard(quarantine_key(pool_key))
+
+
+def build_status(results: List, now: float) -> Dict:
+    """把 queue_status_reads 的结果换算为状态统计
+
+    冷却已到期但尚未被获取脚本提升的账号按可用计算，与下一次获取时看到的结果一致。
+    隔离的账号计入总数，但不属于可用、使用中或冷却。
+    """
+    cooldown_total = cooldown_ready = 0
+    upcoming = []
+    for total, ready, next_entry in (results[0:3], results[3:6]):
+        cooldown_total += int(total)
+        cooldown_ready += int(ready)
+        if next_entry:
+            upcoming.append(float(next_entry[0][1]))
+
+    available_count, used_count, v3_available_count, v3_used_count, v3_used_list_count, quarantined_count = map(
+        int, results[6:12]
+    )
+    available_count += v3_available_count + cooldown_ready
+    used_count += v3_used_count + v3_used_list_count
+    cooldown_count = cooldown_total - cooldown_ready
+
+    status = empty_status()
+    status.update({
+        "total": available_count + used_count + cooldown_count + quarantined_count,
+        "in_use": used_count,
+        "available": available_count,
+        "cooldown": cooldown_count,
+        "quarantined": quarantined_count,
+    })
+    if upcoming:
+        next_cooldown_at = min(upcoming)
+        status["next_cooldown_at"] = next_cooldown_at
+        status["next_cooldown_in"] = max(0.0, next_cooldown_at - now)
+    return status
+
+
+def has_v3_entries(results: List) -> bool:
+    """queue_status_reads 的结果中是否还有未迁移的 v3 账号"""
+    return any(int(count) for count in (results[3], *results[8:11]))
+
+
+# ---- 账号数据 ----------------------------------------------------------
+def encode_account(account: Dict) -> Dict[str, str]:
+    """把账号字典编码为账号哈希的字段，状态相关的派生字段不写入"""
+    return {
+        field: json.dumps(value, ensure_ascii=False)
+        for field, value in account.items()
+        if field not in DERIVED_FIELDS
+    }
+
+
+def encode_new_account(account: Dict, created_at: float) -> Optional[Tuple[str, Dict[str, str]]]:
+    """校验并编码一个新账号，返回 (用户名, 账号哈希字段)，缺少用户名或密码时返回 None"""
+    if not isinstance(account, dict):
+        return None
+    username = account.get("username")
+    if not username or not account.get("password"):
+        return None
+    account = dict(account)
+    account["username"] = str(username)
+    # 导入文件中的 created_at 多为占位的 0，统一记为写入时间
+    if not account.get("created_at"):
+        account["created_at"] = created_at
+    return account["username"], encode_account(account)
+
+
+def decode_account(fields: Union[Dict, List]) -> Dict:
+    """解码 HGETALL 的结果（字典或扁平的字段/值数组），无法按 JSON 解析的值保留原字符串"""
+    if not isinstance(fields, dict):
+        fields = dict(zip(fields[::2], fields[1::2]))
+
+    account = {}
+    for field, value in fields.items():
+        try:
+            account[field] = json.loads(value)
+        except (TypeError, ValueError):
+            account[field] = value
+    return account
+
+
+def annotate_account(account: Dict, status: str, score=None) -> Dict:
+    """按所在结构为账号补充 status / in_use / cooldown_until / lease_until / quarantined_at 字段
+
+    score 为账号在状态有序集合中的分数：冷却中为冷却结束时间，使用中为租约到期时间，隔离中为隔离时间。
+    """
+    account["in_use"] = status == "in_use"
+    account.pop("cooldown_until", None)
+    account.pop("lease_until", None)
+    account.pop("quarantined_at", None)
+    if status == "cooldown":
+        try:
+            account["cooldown_until"] = float(score)
+        except (TypeError, ValueError):
+            account["cooldown_until"] = time.time() + 5
+    elif status == "in_use" and score is not None:
+        account["lease_until"] = float(score)
+    elif status == "quarantined" and score is not None:
+        account["quarantined_at"] = float(score)
+    account["status"] = status
+    return account
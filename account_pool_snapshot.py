@@ -0,0 +1,217 @@
+"""
+账号池快照的二进制文件格式与命令行工具
+快照保存账号池的全部账号（账号哈希的原始字段、所处状态及其分数: 冷却结束时间、租约到期时间、隔离时间）
+与账号池元信息（选择策略、顺序号、租约令牌计数等），可恢复到同一个或另一个实例、同一个或另一个后端。
+
+文件格式:
+    文件头   MAGIC + 格式版本(1 字节) + 编码(1 字节: m 为 msgpack, j 为 JSON)
+    帧       4 字节大端长度 + zlib 压缩的编码数据，依次为:
+             header   {"type": "header", "pool", "schema", "created_at", "meta"}
+             accounts {"type": "accounts", "accounts": [[用户名, 状态, 分数, {字段: 原始字段值}], ...]}（可有多帧）
+             end      {"type": "end", "count": 账号总数}，缺少该帧说明快照不完整
+安装了 msgpack 时使用 msgpack 编码，否则使用 JSON；读取 msgpack 编码的快照需要安装 msgpack。
+
+用法:
+    python account_pool_snapshot.py save pool.snap                  # 保存 config.json 中的账号池
+    python account_pool_snapshot.py load pool.snap --replace        # 覆盖恢复到快照中的账号池
+    python account_pool_snapshot.py load pool.snap --pool pool_b --backend sqlite
+"""
+import argparse
+import json
+import logging
+import struct
+import sys
+import time
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import account_pool_schema as schema
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"APSNAP"
+FORMAT_VERSION = 1
+# 单帧的账号数，快照与恢复均按帧分批，内存占用与账号池大小无关
+SNAPSHOT_CHUNK_SIZE = 500
+# 同一账号同时出现在多个状态集合时（快照期间状态切换）按该顺序保留一份，与修复脚本一致
+SNAPSHOT_STATUS_PRIORITY = ("in_use", "quarantined", "cooldown", "available")
+# 元信息中不随快照恢复的字段: 排队票据只对当时的等待者有效，冷却回收租约只属于当时的进程
+TRANSIENT_META_FIELDS = ("ticket", "reaper")
+
+_FRAME_HEADER = struct.Struct(">I")
+
+# (用户名, 状态, 分数, 账号哈希的原始字段)
+SnapshotRecord = Tuple[str, str, float, Dict[str, str]]
+
+
+class SnapshotError(Exception):
+    """快照文件无法识别、编码不受支持或内容不完整"""
+
+
+def _encode(codec: bytes, payload: Dict) -> bytes:
+    if codec == b"m":
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(codec: bytes, data: bytes) -> Dict:
+    if codec == b"m":
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data.decode("utf-8"))
+
+
+class SnapshotWriter:
+    """按帧流式写入快照，close() 时写入结束帧"""
+
+    def __init__(self, handle: BinaryIO, pool_key: str, meta: Dict[str, str], codec: Optional[bytes] = None):
+        self.handle = handle
+        self.codec = codec or (b"m" if msgpack is not None else b"j")
+        if self.codec == b"m" and msgpack is None:
+            raise SnapshotError("msgpack 未安装，无法使用 msgpack 编码")
+        self.count = 0
+        self.bytes_written = 0
+        self._write_raw(MAGIC + bytes([FORMAT_VERSION]) + self.codec)
+        meta = {field: value for field, value in meta.items() if field not in TRANSIENT_META_FIELDS}
+        self._write_frame({
+            "type": "header",
+            "pool": pool_key,
+            "schema": schema.SCHEMA_VERSION,
+            "created_at": time.time(),
+            "meta": meta,
+        })
+
+    def _write_raw(self, data: bytes) -> None:
+        self.handle.write(data)
+        self.bytes_written += len(data)
+
+    def _write_frame(self, payload: Dict) -> None:
+        data = zlib.compress(_encode(self.codec, payload))
+        self._write_raw(_FRAME_HEADER.pack(len(data)) + data)
+
+    def write_accounts(self, records: List[SnapshotRecord]) -> None:
+        if not records:
+            return
+        self._write_frame({"type": "accounts", "accounts": [list(record) for record in records]})
+        self.count += len(records)
+
+    def close(self) -> None:
+        self._write_frame({"type": "end", "count": self.count})
+
+
+class SnapshotReader:
+    """按帧流式读取快照；header 在构造时读取，iter_chunks() 逐帧返回账号记录并校验结束帧"""
+
+    def __init__(self, handle: BinaryIO):
+        self.handle = handle
+        prefix = handle.read(len(MAGIC) + 2)
+        if len(prefix) < len(MAGIC) + 2 or not prefix.startswith(MAGIC):
+            raise SnapshotError("不是账号池快照文件")
+        if prefix[len(MAGIC)] != FORMAT_VERSION:
+            raise SnapshotError(f"不支持的快照格式版本: {prefix[len(MAGIC)]}")
+        self.codec = prefix[len(MAGIC) + 1:]
+        if self.codec not in (b"m", b"j"):
+            raise SnapshotError(f"未知的快照编码: {self.codec!r}")
+        if self.codec == b"m" and msgpack is None:
+            raise SnapshotError("快照使用 msgpack 编码，需要先安装 msgpack")
+        self.header = self._read_frame()
+        if not self.header or self.header.get("type") != "header":
+            raise SnapshotError("快照缺少文件头")
+        self.pool_key: str = self.header["pool"]
+        self.meta: Dict[str, str] = self.header.get("meta") or {}
+
+    def _read_frame(self) -> Optional[Dict]:
+        size = self.handle.read(_FRAME_HEADER.size)
+        if not size:
+            return None
+        if len(size) < _FRAME_HEADER.size:
+            raise SnapshotError("快照文件被截断")
+        length = _FRAME_HEADER.unpack(size)[0]
+        data = self.handle.read(length)
+        if len(data) < length:
+            raise SnapshotError("快照文件被截断")
+        try:
+            return _decode(self.codec, zlib.decompress(data))
+        except (zlib.error, ValueError) as exc:
+            raise SnapshotError(f"快照数据损坏: {exc}") from exc
+
+    def iter_chunks(self) -> Iterator[List[SnapshotRecord]]:
+        count = 0
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                raise SnapshotError(f"快照不完整: 读取 {count} 个账号后文件结束")
+            if frame.get("type") == "end":
+                if frame.get("count") != count:
+                    raise SnapshotError(f"快照账号数不符: 结束帧记录 {frame.get('count')}, 实际读取 {count}")
+                return
+            records = [
+                (str(username), status, float(score), {str(field): str(value) for field, value in fields.items()})
+                for username, status, score, fields in frame.get("accounts", [])
+            ]
+            count += len(records)
+            yield records
+
+
+def merge_meta(current: Dict[str, str], saved: Dict[str, str]) -> Dict[str, str]:
+    """恢复时写入的元信息: 顺序号与租约令牌计数取两者较大值，保证恢复后继续单调递增"""
+    merged = dict(saved)
+    for field in schema.COUNTER_META_FIELDS:
+        if field in current or field in saved:
+            merged[field] = str(max(int(current.get(field) or 0), int(saved.get(field) or 0)))
+    return merged
+
+
+def pick_status(scores: Dict[str, Optional[float]], now: float) -> Tuple[str, float]:
+    """按 SNAPSHOT_STATUS_PRIORITY 选出账号的状态与分数，不在任何状态集合中时按可用处理"""
+    for status in SNAPSHOT_STATUS_PRIORITY:
+        if scores.get(status) is not None:
+            return status, float(scores[status])
+    return "available", now
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from account_importer import load_redis_defaults
+    from account_manager import ACCOUNT_BACKENDS, create_account_manager
+    from local_account_manager import DEFAULT_DB_PATH
+
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default="config.json")
+    known, _ = pre_parser.parse_known_args(argv)
+    defaults = load_redis_defaults(known.config)
+
+    parser = argparse.ArgumentParser(description="账号池快照的保存与恢复", parents=[pre_parser])
+    parser.add_argument("action", choices=("save", "load"), help="save 保存快照, load 从快照恢复")
+    parser.add_argument("path", help="快照文件路径")
+    parser.add_argument("--pool", default=None, help="账号池键名，保存时默认取 config.json，恢复时默认取快照中的账号池")
+    parser.add_argument("--replace", action="store_true", help="恢复前清空目标账号池")
+    parser.add_argument("--backend", default="redis", choices=ACCOUNT_BACKENDS)
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH, help="sqlite 后端的数据库文件")
+    parser.add_argument("--host", default=defaults["host"])
+    parser.add_argument("--port", type=int, default=defaults["port"])
+    parser.add_argument("--password", default=defaults["password"])
+    parser.add_argument("--db", type=int, default=defaults["db"])
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    manager = create_account_manager(args.backend)
+    if args.backend == "sqlite":
+        manager.update_config(path=args.db_path)
+    else:
+        manager.cache_enabled = False
+        manager.update_config(host=args.host, port=args.port, password=args.password, db=args.db)
+
+    try:
+        if args.action == "save":
+            report = manager.snapshot(args.pool or defaults["pool"], args.path)
+            return 0 if report is not None else 1
+        report = manager.restore(args.path, args.pool, replace=args.replace)
+        return 0 if report is not None else 1
+    finally:
+        manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,694 @@
+"""
+基于 redis.asyncio 的异步账号池管理器
+与 AccountManager 共用 account_pool_schema 中的键结构与 Lua 脚本，单个事件循环即可驱动多条通道
+"""
+import asyncio
+import contextvars
+import logging
+import socket
+import time
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import account_pool_schema as schema
+
+
+class AsyncAccountManager:
+    """AccountManager 的异步版本，获取/释放/冷却/状态语义与同步版本一致"""
+
+    def __init__(self):
+        self.logger = logging.getLogger("AsyncAccountManager")
+        self.redis_client: Optional[aioredis.Redis] = None
+        self._connection_pool: Optional[aioredis.BlockingConnectionPool] = None
+        self._client_lock = asyncio.Lock()
+        # 已确认完成 v3 -> v4 迁移的账号池，避免每次调用都检查旧结构
+        self._migrated_pools: Set[str] = set()
+        # 已注册的 Lua 脚本，调用时走 EVALSHA
+        self._scripts: Dict[str, object] = {}
+        # 事件日志中记录的主机名与各任务的工作通道
+        self.host = socket.gethostname()
+        self.journal_max_length = schema.JOURNAL_MAX_LENGTH
+        self._lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("account_lane", default=None)
+        self.config = {
+            "host": "localhost",
+            "port": 6379,
+            "password": "",
+            "db": 0,
+            "cluster": False,
+            **schema.DEFAULT_POOL_OPTIONS,
+        }
+
+    def update_config(
+        self,
+        host="localhost",
+        port=6379,
+        password="",
+        db=0,
+        max_connections=schema.DEFAULT_POOL_OPTIONS["max_connections"],
+        pool_timeout=schema.DEFAULT_POOL_OPTIONS["pool_timeout"],
+        health_check_interval=schema.DEFAULT_POOL_OPTIONS["health_check_interval"],
+        socket_keepalive=schema.DEFAULT_POOL_OPTIONS["socket_keepalive"],
+        retry_attempts=schema.DEFAULT_POOL_OPTIONS["retry_attempts"],
+        cluster=False,
+    ):
+        """更新 Redis 连接配置，下一次调用时按新配置建立连接池；cluster 为 True 时按 Redis Cluster 连接"""
+        self.config.update({
+            "host": host,
+            "port": port,
+            "password": password,
+            "db": db,
+            "cluster": cluster,
+            "max_connections": max_connections,
+            "pool_timeout": pool_timeout,
+            "health_check_interval": health_check_interval,
+            "socket_keepalive": socket_keepalive,
+            "retry_attempts": retry_attempts,
+        })
+
+        self.redis_client = None
+        self._connection_pool = None
+        self._migrated_pools.clear()
+        self._scripts.clear()
+        self.logger.info(
+            f"更新 Redis 配置: {host}:{port}, {'集群模式' if cluster else f'DB: {db}'}, 最大连接数: {max_connections}"
+        )
+
+    async def get_redis_client(self) -> aioredis.Redis:
+        """延迟初始化异步 Redis 客户端，连接池绑定到当前事件循环"""
+        async with self._client_lock:
+            if self.redis_client is None:
+                try:
+                    retry = Retry(EqualJitterBackoff(cap=5, base=0.2), self.config["retry_attempts"])
+                    if self.config["cluster"]:
+                        client = RedisCluster(
+                            host=self.config["host"],
+                            port=self.config["port"],
+                            password=self.config["password"] or None,
+                            decode_responses=True,
+                            max_connections=self.config["max_connections"],
+                            socket_timeout=5,
+                            socket_connect_timeout=5,
+                            socket_keepalive=self.config["socket_keepalive"],
+                            health_check_interval=self.config["health_check_interval"],
+                            retry=retry,
+                        )
+                        await client.ping()
+                        self.redis_client = client
+                        self.logger.info("Redis 集群连接成功")
+                        return self.redis_client
+
+                    pool = aioredis.BlockingConnectionPool(
+                        max_connections=self.config["max_connections"],
+                        timeout=self.config["pool_timeout"],
+                        host=self.config["host"],
+                        port=self.config["port"],
+                        password=self.config["password"] or None,
+                        db=self.config["db"],
+                        decode_responses=True,
+                        socket_timeout=5,
+                        socket_connect_timeout=5,
+                        socket_keepalive=self.config["socket_keepalive"],
+                        health_check_interval=self.config["health_check_interval"],
+                        retry=retry,
+                        retry_on_error=[RedisConnectionError],
+                    )
+                    client = aioredis.Redis(connection_pool=pool)
+                    await client.ping()
+                    self._connection_pool = pool
+                    self.redis_client = client
+                    self.logger.info("Redis 连接成功")
+                except Exception as exc:
+                    self.logger.error(f"Redis 连接失败: {exc}")
+                    raise
+
+            return self.redis_client
+
+    async def close(self) -> None:
+        """断开连接池"""
+        if self._connection_pool is not None:
+            await self._connection_pool.disconnect()
+        elif isinstance(self.redis_client, RedisCluster):
+            await self.redis_client.aclose()
+        self.redis_client = None
+        self._connection_pool = None
+
+    async def test_connection(self) -> bool:
+        """测试 Redis 连接是否可用"""
+        try:
+            client = await self.get_redis_client()
+            await client.ping()
+            return True
+        except Exception as exc:
+            self.logger.error(f"Redis 连接测试失败: {exc}")
+            return False
+
+    def set_lane(self, lane: str) -> None:
+        """设置当前任务写入事件日志的工作通道，未设置时使用任务名"""
+        self._lane.set(lane)
+
+    # ---- 内部工具方法 ------------------------------------------------------
+    def _journal_context(self) -> List:
+        lane = self._lane.get()
+        if not lane:
+            task = asyncio.current_task()
+            lane = task.get_name() if task is not None else ""
+        return schema.journal_context(lane, self.host, self.journal_max_length)
+
+    async def _run_script(self, client: aioredis.Redis, lua: str, keys: List[str], args: List):
+        """通过 EVALSHA 执行脚本，服务端缺少脚本缓存时自动回退到 EVAL
+
+        脚本参数前自动加上事件日志上下文。
+        """
+        script = self._scripts.get(lua)
+        if script is None:
+            script = client.register_script(lua)
+            self._scripts[lua] = script
+        return await script(keys=keys, args=[*self._journal_context(), *args], client=client)
+
+    async def _migrate_untagged(self, client: aioredis.Redis, pool_key: str) -> int:
+        """把无哈希标签的旧 v4 键分批移到带标签的键名，返回迁移的用户名数"""
+        if not await client.exists(*schema.untagged_keys(pool_key)):
+            return 0
+
+        migrated = 0
+        while True:
+            moved, remaining = await self._run_script(
+                client,
+                schema.LUA_MIGRATE_UNTAGGED,
+                schema.migrate_untagged_keys(pool_key),
+                schema.migrate_untagged_args(time.time()),
+            )
+            migrated += int(moved)
+            if not int(remaining):
+                break
+
+        self.logger.info("账号池 '%s' 迁移到带哈希标签的键名: %d 个账号", pool_key, migrated)
+        return migrated
+
+    async def _migrate_v3(
+        self, client: aioredis.Redis, pool_key: str, lease_seconds: float = schema.DEFAULT_LEASE_SECONDS
+    ) -> Tuple[int, int]:
+        """把 v3 结构分批迁移到 v4，返回 (迁移的账号数, 丢弃的重复条目数)；没有 v3 键时不执行迁移脚本"""
+        migrated = duplicates = 0
+        if not await client.exists(*schema.v3_keys(pool_key)):
+            self._migrated_pools.add(pool_key)
+            return migrated, duplicates
+
+        while True:
+            moved, dropped, remaining = await self._run_script(
+                client,
+                schema.LUA_MIGRATE_V3,
+                schema.migrate_keys(pool_key),
+                schema.migrate_args(time.time(), lease_seconds),
+            )
+            migrated += int(moved)
+            duplicates += int(dropped)
+            if not int(remaining):
+                break
+
+        self._migrated_pools.add(pool_key)
+        if migrated or duplicates:
+            self.logger.info("账号池 '%s' 迁移到 v4: 迁移 %d 个账号, 丢弃重复 %d 条", pool_key, migrated, duplicates)
+        return migrated, duplicates
+
+    async def _ensure_pool(self, client: aioredis.Redis, pool_key: str) -> None:
+        """每个账号池在本进程内首次访问时，检查并迁移无标签的旧键名与旧版 v3 结构"""
+        if pool_key not in self._migrated_pools:
+            await self._migrate_untagged(client, pool_key)
+            await self._migrate_v3(client, pool_key)
+
+    async def _requeue_expired_cooldown(self, client: aioredis.Redis, pool_key: str) -> int:
+        """将冷却到期的账号重新加入可用集合"""
+        requeued = 0
+        try:
+            while True:
+                promoted = int(await self._run_script(
+                    client,
+                    schema.LUA_REQUEUE_COOLDOWN,
+                    schema.pool_script_keys(pool_key),
+                    schema.requeue_args(time.time()),
+                ))
+                requeued += promoted
+                if promoted < schema.COOLDOWN_PROMOTE_BATCH:
+                    break
+        except Exception as exc:
+            self.logger.error(f"处理冷却账号失败: {exc}")
+
+        if requeued:
+            self.logger.info("从冷却池恢复 %d 个账号", requeued)
+        return requeued
+
+    async def _acquire_batch(
+        self,
+        client: aioredis.Redis,
+        pool_key: str,
+        count: int,
+        lease_seconds: float,
+        ticket: Optional[str] = None,
+        wait_until: Optional[float] = None,
+    ) -> Tuple[List[Dict], Optional[float], Optional[str]]:
+        """一次脚本调用内回收过期租约、提升冷却到期账号并取出最多 count 个账号，排队票据同 AccountManager"""
+        await self._ensure_pool(client, pool_key)
+        now = time.time()
+        result = await self._run_script(
+            client,
+            schema.LUA_ACQUIRE_ACCOUNT,
+            schema.pool_script_keys(pool_key),
+            schema.acquire_args(now, count, lease_seconds, ticket, wait_until),
+        )
+        accounts, next_ready_at, ticket = schema.parse_acquire_result(result)
+        for account in accounts:
+            schema.annotate_account(account, "in_use", now + lease_seconds)
+        return accounts, next_ready_at, ticket
+
+    async def _wait_for_grant(
+        self, client: aioredis.Redis, pool_key: str, ticket: str, timeout: float, lease_seconds: float
+    ) -> Optional[Dict]:
+        """阻塞等待分给票据的账号；收到重新计算等待的令牌或超时返回 None"""
+        popped = await client.blpop([schema.grant_key(pool_key, ticket)], timeout=timeout)
+        if not popped or not popped[1]:
+            return None
+        username = popped[1]
+        fields = await client.hgetall(schema.account_key(pool_key, username))
+        if not fields:
+            return None
+        account = schema.decode_account(fields)
+        account.setdefault("username", username)
+        return schema.annotate_account(account, "in_use", time.time() + lease_seconds)
+
+    async def _cancel_wait(
+        self, client: aioredis.Redis, pool_key: str, ticket: str, lease_seconds: float
+    ) -> Optional[Dict]:
+        """撤销排队票据；撤销前已分到的账号照常返回给调用方"""
+        now = time.time()
+        fields = await self._run_script(
+            client,
+            schema.LUA_CANCEL_WAIT,
+            schema.pool_script_keys(pool_key),
+            schema.cancel_wait_args(ticket, now),
+        )
+        if not fields:
+            return None
+        return schema.annotate_account(schema.decode_account(fields), "in_use", now + lease_seconds)
+
+    async def _abandon_wait(self, client: aioredis.Redis, pool_key: str, ticket: str, lease_seconds: float) -> None:
+        """出错或任务被取消时撤销票据，已分到的账号放回账号池"""
+        try:
+            account = await self._cancel_wait(client, pool_key, ticket, lease_seconds)
+            if account is not None:
+                await self.release_account(account, pool_key)
+        except Exception:
+            # 撤销失败时票据过了截止时间会被丢弃，已分到的账号由租约到期回收
+            pass
+
+    async def _release_usernames(
+        self,
+        client: aioredis.Redis,
+        pool_key: str,
+        usernames: List[str],
+        cooldown_seconds: int,
+        outcome: Optional[str] = None,
+        tokens: Optional[List] = None,
+    ) -> Tuple[int, int, int]:
+        """按批次调用释放脚本，返回 (实际释放的账号数, 其中被隔离的账号数, 租约令牌不符被拒绝的账号数)"""
+        await self._ensure_pool(client, pool_key)
+        released = quarantined = stale = 0
+        for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+            chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+            chunk_tokens = tokens[start:start + schema.ACCOUNT_BATCH_SIZE] if tokens is not None else None
+            result = await self._run_script(
+                client,
+                schema.LUA_RELEASE_ACCOUNT,
+                schema.pool_script_keys(pool_key),
+                schema.release_args(chunk, cooldown_seconds, time.time(), outcome, chunk_tokens),
+            )
+            released += int(result[0])
+            quarantined += int(result[1])
+            stale += int(result[2])
+        return released, quarantined, stale
+
+    # ---- 对外方法 ----------------------------------------------------------
+    async def acquire_account(
+        self,
+        pool_key: str = "account_pool_v3",
+        timeout: Optional[float] = None,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> Optional[Dict]:
+        """从账号池原子地取出一个账号，timeout 大于 0 时按票据顺序在服务端排队等待"""
+        ticket = None
+        try:
+            client = await self.get_redis_client()
+            deadline = time.time() + timeout if timeout and timeout > 0 else None
+
+            while True:
+                accounts, next_ready_at, ticket = await self._acquire_batch(
+                    client, pool_key, 1, lease_seconds, ticket, deadline
+                )
+                account = accounts[0] if accounts else None
+                remaining = deadline - time.time() if deadline is not None else 0
+                if account is None and ticket:
+                    if remaining <= 0:
+                        account = await self._cancel_wait(client, pool_key, ticket, lease_seconds)
+                    else:
+                        wait = min(remaining, schema.BLOCKING_WAIT_SLICE)
+                        if next_ready_at is not None:
+                            wait = min(wait, next_ready_at - time.time())
+                        account = await self._wait_for_grant(
+                            client, pool_key, ticket, max(wait, schema.MIN_BLOCKING_WAIT), lease_seconds
+                        )
+                        if account is None:
+                            continue
+                    ticket = None
+
+                if account is not None:
+                    self.logger.info("取回账号: %s", account.get("username"))
+                    return account
+                if remaining <= 0:
+                    self.logger.warning(f"账号池 '{pool_key}' 暂无可用账号")
+                    return None
+
+        except asyncio.CancelledError:
+            if ticket:
+                await asyncio.shield(self._abandon_wait(client, pool_key, ticket, lease_seconds))
+            raise
+        except Exception as exc:
+            if ticket:
+                await self._abandon_wait(client, pool_key, ticket, lease_seconds)
+            self.logger.error(f"获取账号失败: {exc}")
+            return None
+
+    async def acquire_many(
+        self,
+        pool_key: str = "account_pool_v3",
+        count: int = 1,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> List[Dict]:
+        """一次性取出最多 count 个账号，账号不足时返回已取到的部分"""
+        try:
+            client = await self.get_redis_client()
+            accounts: List[Dict] = []
+            while len(accounts) < count:
+                batch_size = min(count - len(accounts), schema.ACCOUNT_BATCH_SIZE)
+                batch, _, _ = await self._acquire_batch(client, pool_key, batch_size, lease_seconds)
+                accounts.extend(batch)
+                if len(batch) < batch_size:
+                    break
+            return accounts
+        except Exception as exc:
+            self.logger.error(f"批量获取账号失败: {exc}")
+            return []
+
+    async def release_account(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> bool:
+        """释放账号，并根据需要推入冷却队列；outcome / success 的含义同 AccountManager.release_account"""
+        username = (account or {}).get("username")
+        if not username:
+            self.logger.warning(f"release_account 缺少用户名: {account}")
+            return False
+
+        try:
+            client = await self.get_redis_client()
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, quarantined, stale = await self._release_usernames(
+                client, pool_key, [username], cooldown_seconds, outcome, [account.get("lease_token")]
+            )
+            if stale:
+                self.logger.warning("账号 %s 的租约令牌已失效（租约过期后已重新分配），跳过释放", username)
+                return False
+            if released:
+                if quarantined:
+                    self.logger.warning(
+                        "账号 %s 连续失败 %d 次，已隔离", username, schema.QUARANTINE_AFTER_FAILURES
+                    )
+                elif outcome == "failure":
+                    self.logger.info("账号 %s 使用失败，按连续失败次数进入冷却", username)
+                elif cooldown_seconds > 0:
+                    self.logger.info("账号 %s 进入冷却 %s 秒", username, cooldown_seconds)
+                else:
+                    self.logger.info("释放账号: %s", username)
+                return True
+            self.logger.warning("账号 '%s' 不在使用列表中，跳过释放", username)
+            return False
+        except Exception as exc:
+            self.logger.error(f"释放账号失败: {exc}")
+            return False
+
+    async def release_many(
+        self,
+        accounts: List[Dict],
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> int:
+        """批量释放账号，返回实际释放的个数；租约令牌不符的账号跳过"""
+        accounts = [account for account in accounts or [] if account and account.get("username")]
+        if not accounts:
+            return 0
+        usernames = [account["username"] for account in accounts]
+
+        try:
+            client = await self.get_redis_client()
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, _, stale = await self._release_usernames(
+                client, pool_key, usernames, cooldown_seconds, outcome,
+                [account.get("lease_token") for account in accounts],
+            )
+            if stale:
+                self.logger.warning("批量释放: %d 个账号的租约令牌已失效，跳过", stale)
+            return released
+        except Exception as exc:
+            self.logger.error(f"批量释放账号失败: {exc}")
+            return 0
+
+    async def set_selection_policy(
+        self,
+        pool_key: str = "account_pool_v3",
+        policy: str = schema.DEFAULT_SELECTION_POLICY,
+        success_weight: Optional[float] = None,
+        top_k: Optional[int] = None,
+    ) -> bool:
+        """设置账号池的选择策略（lru / success / random），对之后释放和获取的账号生效"""
+        try:
+            fields = schema.selection_fields(policy, success_weight, top_k)
+            client = await self.get_redis_client()
+            await client.hset(schema.meta_key(pool_key), mapping=fields)
+            self.logger.info(
+                "账号池 '%s' 选择策略: %s, 成功率权重 %s 秒, top_k %s",
+                pool_key,
+                fields["policy"],
+                fields["success_weight"],
+                fields["top_k"],
+            )
+            return True
+        except Exception as exc:
+            self.logger.error(f"设置选择策略失败: {exc}")
+            return False
+
+    async def get_selection_policy(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池当前的选择策略 {policy, success_weight, top_k}"""
+        try:
+            client = await self.get_redis_client()
+            policy, success_weight, top_k = await client.hmget(
+                schema.meta_key(pool_key), "policy", "success_weight", "top_k"
+            )
+            return {
+                "policy": policy or schema.DEFAULT_SELECTION_POLICY,
+                "success_weight": float(success_weight) if success_weight is not None else 0.0,
+                "top_k": int(top_k) if top_k is not None else 1,
+            }
+        except Exception as exc:
+            self.logger.error(f"获取选择策略失败: {exc}")
+            return {"policy": schema.DEFAULT_SELECTION_POLICY, "success_weight": 0.0, "top_k": 1}
+
+    async def release_quarantined(
+        self, usernames: Optional[List[str]] = None, pool_key: str = "account_pool_v3"
+    ) -> int:
+        """解除隔离并清零连续失败次数，usernames 为 None 时解除全部，返回解除的个数"""
+        try:
+            client = await self.get_redis_client()
+            await self._ensure_pool(client, pool_key)
+            if usernames is None:
+                usernames = list(await client.zrange(schema.quarantine_key(pool_key), 0, -1))
+            restored = 0
+            for start in range(0, len(usernames), schema.ACCOUNT_BATCH_SIZE):
+                chunk = usernames[start:start + schema.ACCOUNT_BATCH_SIZE]
+                restored += int(await self._run_script(
+                    client,
+                    schema.LUA_RELEASE_QUARANTINED,
+                    schema.pool_script_keys(pool_key),
+                    schema.release_quarantined_args(chunk, time.time()),
+                ))
+            self.logger.info("账号池 '%s' 解除隔离 %d 个账号", pool_key, restored)
+            return restored
+        except Exception as exc:
+            self.logger.error(f"解除隔离失败: {exc}")
+            return 0
+
+    async def renew_lease(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> bool:
+        """为仍在使用中的账号续约，账号已被回收或释放、或租约令牌已失效时返回 False"""
+        username = (account or {}).get("username")
+        if not username:
+            return False
+
+        try:
+            client = await self.get_redis_client()
+            now = time.time()
+            renewed = await self._run_script(
+                client,
+                schema.LUA_RENEW_LEASE,
+                schema.pool_script_keys(pool_key),
+                schema.renew_args(username, now, lease_seconds, account.get("lease_token")),
+            )
+            if renewed == 1:
+                account["lease_until"] = now + lease_seconds
+                return True
+            if renewed == -1:
+                self.logger.warning("账号 '%s' 的租约令牌已失效（租约过期后已重新分配），续约失败", username)
+                return False
+            self.logger.warning("账号 '%s' 已不在使用中，续约失败", username)
+            return False
+        except Exception as exc:
+            self.logger.error(f"账号续约失败: {exc}")
+            return False
+
+    async def get_account_status(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池状态统计，只做一次 pipeline 只读查询，不会触发迁移或重建"""
+        try:
+            client = await self.get_redis_client()
+            now = time.time()
+            async with client.pipeline(transaction=False) as pipe:
+                schema.queue_status_reads(pipe, pool_key, now)
+                return schema.build_status(await pipe.execute(), now)
+        except Exception as exc:
+            self.logger.error(f"获取账号状态失败: {exc}")
+            return schema.empty_status()
+
+    async def get_all_accounts(self, pool_key: str = "account_pool_v3") -> List[Dict]:
+        """获取账号池的完整列表，包含使用中和冷却中的账号；大账号池请改用 iter_accounts 分页读取"""
+        accounts_by_username: Dict[str, Dict] = {}
+        async for page in self.iter_accounts(pool_key):
+            for account in page:
+                accounts_by_username.setdefault(account["username"], account)
+        return list(accounts_by_username.values())
+
+    async def iter_accounts(
+        self,
+        pool_key: str = "account_pool_v3",
+        status: Optional[str] = None,
+        page_size: int = schema.DEFAULT_PAGE_SIZE,
+        promote_cooldown: bool = False,
+    ) -> AsyncIterator[List[Dict]]:
+        """按页遍历账号池，status 为 available / in_use / cooldown / quarantined 时只读取对应的状态集合
+
+        与同步版本不同，这里不保留 v3 兼容读取，尚未迁移的账号池会先完成迁移。
+        分页方式与 promote_cooldown 的含义与同步版本相同。
+        """
+        if status is not None and status not in schema.ACCOUNT_STATUSES:
+            self.logger.warning(f"未知的账号状态筛选: {status}")
+            return
+
+        page_size = max(1, int(page_size))
+        statuses = [status] if status else list(schema.ACCOUNT_STATUSES)
+
+        try:
+            client = await self.get_redis_client()
+            await self._ensure_pool(client, pool_key)
+            if promote_cooldown and status != "in_use":
+                await self._requeue_expired_cooldown(client, pool_key)
+
+            for current in statuses:
+                zset_key = schema.status_key(pool_key, current)
+                cursor, seen = None, 0
+                while True:
+                    count = page_size + seen
+                    low = cursor[0] if cursor else "-inf"
+                    entries = await client.zrangebyscore(zset_key, low, "+inf", start=0, num=count, withscores=True)
+                    chunk, cursor, seen = schema.cursor_page(entries, cursor)
+                    page = await self._load_accounts(client, pool_key, chunk, current)
+                    if page:
+                        yield page
+                    if len(entries) < count:
+                        break
+        except Exception as exc:
+            self.logger.error(f"分页获取账号列表失败: {exc}")
+
+    async def _load_accounts(self, client: aioredis.Redis, pool_key: str, entries: List, status: str) -> List[Dict]:
+        """按 (用户名, 分数) 列表批量读取账号哈希"""
+        async with client.pipeline(transaction=False) as pipe:
+            for username, _ in entries:
+                pipe.hgetall(schema.account_key(pool_key, username))
+            rows = await pipe.execute()
+
+        accounts = []
+        for (username, score), fields in zip(entries, rows):
+            if not fields:
+                continue
+            account = schema.decode_account(fields)
+            account.setdefault("username", username)
+            accounts.append(schema.annotate_account(account, status, score))
+        return accounts
+
+    async def cleanup_expired_accounts(self, pool_key: str = "account_pool_v3", timeout: int = 3600) -> int:
+        """在服务端回收租约已过期的账号，尚未迁移的旧使用中账号按 acquired_at + timeout 登记租约"""
+        try:
+            client = await self.get_redis_client()
+            await self._migrate_untagged(client, pool_key)
+            await self._migrate_v3(client, pool_key, lease_seconds=timeout)
+
+            cleaned_count = 0
+            while True:
+                reclaimed = int(await self._run_script(
+                    client,
+                    schema.LUA_RECLAIM_EXPIRED_LEASES,
+                    schema.pool_script_keys(pool_key),
+                    schema.reclaim_args(time.time()),
+                ))
+                cleaned_count += reclaimed
+                if reclaimed < schema.COOLDOWN_PROMOTE_BATCH:
+                    break
+
+            if cleaned_count:
+                self.logger.info(f"已回收 {cleaned_count} 个超时账号")
+            return cleaned_count
+        except Exception as exc:
+            self.logger.error(f"清理超时账号失败: {exc}")
+            return 0
+
+    async def release_all_accounts(self, pool_key: str = "account_pool_v3") -> int:
+        """批量释放所有使用中的账号（无冷却）"""
+        try:
+            client = await self.get_redis_client()
+            await self._ensure_pool(client, pool_key)
+            in_use_key = schema.in_use_key(pool_key)
+            released = 0
+            while True:
+                usernames = await client.zrange(in_use_key, 0, schema.ACCOUNT_BATCH_SIZE - 1)
+                if not usernames:
+                    break
+                released += (await self._release_usernames(client, pool_key, usernames, 0))[0]
+                if len(usernames) < schema.ACCOUNT_BATCH_SIZE:
+                    break
+            self.logger.info("已一键释放 %d 个账号", released)
+            return released
+        except Exception as exc:
+            self.logger.error(f"一键释放账号失败: {exc}")
+            return 0
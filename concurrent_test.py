@@ -12,17 +12,11 @@ COOLDOWN_SECONDS = 5
 MAX_WAIT_SECONDS = 120
 
 am = AccountManager()
-am.update_config(host="118.145.197.212", port=6379, password="redis_AGZ8Gd", db=0)
+# 每个阻塞等待的线程占用一条连接，连接池需覆盖全部线程
+am.update_config(host="118.145.197.212", port=6379, password="redis_AGZ8Gd", db=0, max_connections=THREADS + 5)
 client = am.get_redis_client()
 
-keys = [
-    POOL_KEY,
-    f"{POOL_KEY}:used",
-    f"{POOL_KEY}:available_index",
-    f"{POOL_KEY}:used_index",
-    f"{POOL_KEY}:cooldown",
-]
-client.delete(*keys)
+am.delete_pool(POOL_KEY)
 
 accounts = [
     {"username": f"concurrent_user_{i}", "password": "pass"}
@@ -43,13 +37,12 @@ def worker(idx):
     start_event.wait()
     while time.time() < deadline and account is None:
         attempt += 1
-        account = am.acquire_account(POOL_KEY)
+        account = am.acquire_account(POOL_KEY, timeout=deadline - time.time())
         if account:
             am.release_account(account, POOL_KEY, cooldown_seconds=COOLDOWN_SECONDS)
             with lock:
                 results[idx] = (account.get("username"), attempt)
             return
-        time.sleep(0.3)
     with lock:
         failures[idx] = attempt
 
@@ -79,5 +72,5 @@ else:
 status = am.get_account_status(POOL_KEY)
 print("[Status]", status)
 
-client.delete(*keys)
+am.delete_pool(POOL_KEY)
 print("[Cleanup] Cleared keys")
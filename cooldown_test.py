@@ -1,6 +1,7 @@
 import time
 import logging
 from account_manager import AccountManager
+import account_pool_schema as schema
 
 POOL_KEY = "account_pool_v3_test"
 
@@ -10,9 +11,8 @@ am = AccountManager()
 am.update_config(host="118.145.197.212", port=6379, password="redis_AGZ8Gd", db=0)
 
 client = am.get_redis_client()
-keys = [POOL_KEY, f"{POOL_KEY}:used", f"{POOL_KEY}:available_index", f"{POOL_KEY}:used_index", f"{POOL_KEY}:cooldown"]
-client.delete(*keys)
-print("[Setup] Cleared keys:", keys)
+am.delete_pool(POOL_KEY)
+print("[Setup] Cleared pool:", POOL_KEY)
 
 accounts = [{"username": "test_success", "password": "pass123"}]
 am.save_accounts(accounts, POOL_KEY)
@@ -26,8 +26,8 @@ if not account:
 
 am.release_account(account, POOL_KEY, cooldown_seconds=5)
 print("[Scenario1] Released with 5s cooldown")
-print("[Scenario1] Available count: ", client.llen(POOL_KEY))
-print("[Scenario1] Cooldown count: ", client.zcard(f"{POOL_KEY}:cooldown"))
+print("[Scenario1] Available count: ", client.zcard(schema.available_key(POOL_KEY)))
+print("[Scenario1] Cooldown count: ", client.zcard(schema.cooldown_key(POOL_KEY)))
 
 acc_before_expire = am.acquire_account(POOL_KEY)
 print("[Scenario1] Acquire during cooldown ->", acc_before_expire)
@@ -43,8 +43,8 @@ if not acc_after_expire:
 # Scenario 2: failure flow (cooldown 30s)
 am.release_account(acc_after_expire, POOL_KEY, cooldown_seconds=30)
 print("[Scenario2] Released with 30s cooldown")
-print("[Scenario2] Available count: ", client.llen(POOL_KEY))
-print("[Scenario2] Cooldown count: ", client.zcard(f"{POOL_KEY}:cooldown"))
+print("[Scenario2] Available count: ", client.zcard(schema.available_key(POOL_KEY)))
+print("[Scenario2] Cooldown count: ", client.zcard(schema.cooldown_key(POOL_KEY)))
 
 acc_during_30 = am.acquire_account(POOL_KEY)
 print("[Scenario2] Acquire during 30s cooldown ->", acc_during_30)
@@ -58,5 +58,5 @@ print("[Scenario2] Acquire after 30s cooldown ->", acc_after_30)
 status = am.get_account_status(POOL_KEY)
 print("[Final] Account status:", status)
 
-client.delete(*keys)
+am.delete_pool(POOL_KEY)
 print("[Cleanup] Cleared keys again.")
@@ -15,14 +15,7 @@ am = AccountManager()
 am.update_config(host="118.145.197.212", port=6379, password="redis_AGZ8Gd", db=0)
 client = am.get_redis_client()
 
-keys = [
-    POOL_KEY,
-    f"{POOL_KEY}:used",
-    f"{POOL_KEY}:available_index",
-    f"{POOL_KEY}:used_index",
-    f"{POOL_KEY}:cooldown",
-]
-client.delete(*keys)
+am.delete_pool(POOL_KEY)
 accounts = [
     {"username": f"fail30_user_{i}", "password": "pass"}
     for i in range(1, TOTAL_ACCOUNTS + 1)
@@ -40,14 +33,13 @@ def worker(idx):
     attempt = 0
     while time.time() < deadline:
         attempt += 1
-        account = am.acquire_account(POOL_KEY)
+        account = am.acquire_account(POOL_KEY, timeout=deadline - time.time())
         if account:
             # 模拟失败后进入 30 秒冷却
             am.release_account(account, POOL_KEY, cooldown_seconds=FAIL_COOLDOWN)
             with lock:
                 results[idx] = (account.get("username"), attempt)
             return
-        time.sleep(0.5)
     with lock:
         results[idx] = (None, attempt)
 
@@ -71,5 +63,5 @@ print(f"[Summary] failed threads: {len(failures)} {failures}")
 status = am.get_account_status(POOL_KEY)
 print("[Status]", status)
 
-client.delete(*keys)
+am.delete_pool(POOL_KEY)
 print("[Cleanup] Cleared keys")
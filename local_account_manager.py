@@ -0,0 +1,1074 @@
+"""
+账号池的本地嵌入式后端（SQLite）
+与 AccountManager 提供相同的获取/释放/冷却/隔离/状态接口与语义，单机部署时省去到远端 Redis 的往返，
+也可以在没有网络的机器上运行账号池逻辑与压测。
+
+表结构:
+    accounts   主键 (pool, username)；data 为账号字段的 JSON，status 为 ACCOUNT_STATUSES 之一，
+               score 与 Redis 版状态有序集合的分数含义相同（可用: 顺序号或释放时间，使用中: 租约到期，
+               冷却: 冷却结束，隔离: 隔离时间）
+    pool_meta  主键 (pool, name)；选择策略、顺序号等元信息，reaper 为冷却回收进程的选主租约
+
+数据库文件使用 WAL 模式，多个进程可共用同一个文件；写操作在 BEGIN IMMEDIATE 事务中执行，
+获取/释放与 Redis 版的 Lua 脚本一样是原子的。path 为 ":memory:" 时为进程内的内存数据库，进程退出后不保留。
+本地后端不记录事件日志、不发布改动通知：同进程内的阻塞等待由条件变量唤醒，其他进程按 LOCAL_POLL_SECONDS 轮询。
+同进程内的阻塞获取按到达顺序排队，只有队首可以取账号；不同进程之间不排队。
+"""
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import account_pool_schema as schema
+import account_pool_snapshot as snapshot
+
+DEFAULT_DB_PATH = "account_pool.db"
+# 其他进程持有写锁时的最长等待（秒）
+BUSY_TIMEOUT_SECONDS = 5.0
+# 阻塞获取时单次等待的上限，其他进程释放的账号最迟在该间隔后被发现
+LOCAL_POLL_SECONDS = 1.0
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS accounts (
+    pool TEXT NOT NULL,
+    username TEXT NOT NULL,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (pool, username)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS accounts_by_status ON accounts (pool, status, score);
+CREATE TABLE IF NOT EXISTS pool_meta (
+    pool TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (pool, name)
+) WITHOUT ROWID;
+"""
+
+
+class _LocalDatabase:
+    """一个数据库文件在本进程内共用的连接、锁与唤醒条件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False
+        )
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA_SQL)
+        # 同一进程内的全部线程串行访问连接；释放账号后通过 changed 唤醒阻塞等待者
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        # 账号池 -> 本进程内排队的阻塞获取票据，先到先得
+        self.waiters: Dict[str, Deque[object]] = {}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+# 按数据库路径共享的连接，进程内的多个 LocalAccountManager 共用同一个连接与锁
+_databases: Dict[str, _LocalDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> _LocalDatabase:
+    with _databases_lock:
+        database = _databases.get(path)
+        if database is None:
+            database = _LocalDatabase(path)
+            _databases[path] = database
+        return database
+
+
+def close_databases() -> None:
+    """关闭全部共享连接，程序退出时调用"""
+    with _databases_lock:
+        for database in _databases.values():
+            database.close()
+        _databases.clear()
+
+
+def _available_score(selection: Dict, account: Dict, now: float) -> float:
+    """账号回到可用状态时的分数，与 Lua 中的 available_score 一致"""
+    if selection["policy"] != "success" or selection["success_weight"] <= 0:
+        return now
+    successes = account.get("successes", 0)
+    failures = account.get("failures", 0)
+    return now - selection["success_weight"] * (successes + 1) / (successes + failures + 2)
+
+
+class LocalAccountManager:
+    """基于 SQLite 的账号池，公开方法与 AccountManager 同名同参"""
+
+    backend = "sqlite"
+
+    def __init__(self):
+        self.logger = logging.getLogger("LocalAccountManager")
+        self.config = {"path": DEFAULT_DB_PATH}
+        self._random = random.Random()
+
+    def update_config(self, path: str = DEFAULT_DB_PATH):
+        """更新数据库文件路径，":memory:" 为进程内的内存数据库"""
+        self.config["path"] = path
+        self.logger.info(f"更新本地账号池配置: {path}")
+
+    def test_connection(self) -> bool:
+        """测试数据库是否可以打开"""
+        try:
+            with self._read() as conn:
+                conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception as exc:
+            self.logger.error(f"本地账号池打开失败: {exc}")
+            return False
+
+    def set_lane(self, lane: str) -> None:
+        """与 AccountManager 保持接口一致；本地后端不记录事件日志"""
+
+    def close(self) -> None:
+        """与 AccountManager 保持接口一致；共享连接由 close_databases 关闭"""
+
+    # ---- 内部工具方法 ------------------------------------------------------
+    def _database(self) -> _LocalDatabase:
+        return get_database(self.config["path"])
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        database = self._database()
+        with database.lock:
+            yield database.connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务，提交后唤醒本进程内阻塞等待的获取"""
+        database = self._database()
+        with database.lock:
+            conn = database.connection
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            database.changed.notify_all()
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection, pool_key: str) -> Dict[str, str]:
+        rows = conn.execute("SELECT name, value FROM pool_meta WHERE pool = ?", (pool_key,))
+        return {name: value for name, value in rows}
+
+    def _selection(self, conn: sqlite3.Connection, pool_key: str) -> Dict:
+        meta = self._meta(conn, pool_key)
+        return {
+            "policy": meta.get("policy") or schema.DEFAULT_SELECTION_POLICY,
+            "success_weight": float(meta["success_weight"]) if meta.get("success_weight") is not None else 0.0,
+            "top_k": int(meta["top_k"]) if meta.get("top_k") is not None else 1,
+        }
+
+    @staticmethod
+    def _reserve_sequence(conn: sqlite3.Connection, pool_key: str, count: int, name: str = "sequence") -> int:
+        """预留 count 个顺序号（name 为 fence 时为租约令牌），返回预留前的顺序号"""
+        row = conn.execute(
+            "SELECT value FROM pool_meta WHERE pool = ? AND name = ?", (pool_key, name)
+        ).fetchone()
+        sequence = int(row[0]) if row else 0
+        conn.execute(
+            "INSERT OR REPLACE INTO pool_meta (pool, name, value) VALUES (?, ?, ?)",
+            (pool_key, name, str(sequence + count)),
+        )
+        return sequence
+
+    @staticmethod
+    def _set_row(conn: sqlite3.Connection, pool_key: str, username: str, account: Dict, status: str, score: float):
+        conn.execute(
+            "UPDATE accounts SET data = ?, status = ?, score = ? WHERE pool = ? AND username = ?",
+            (json.dumps(account, ensure_ascii=False), status, score, pool_key, username),
+        )
+
+    @staticmethod
+    def _reaper_holder(conn: sqlite3.Connection, pool_key: str, now: float) -> Optional[str]:
+        """持有冷却回收租约的进程标识，租约不存在或已过期时返回 None"""
+        row = conn.execute(
+            "SELECT value FROM pool_meta WHERE pool = ? AND name = 'reaper'", (pool_key,)
+        ).fetchone()
+        if row is None:
+            return None
+        lease = json.loads(row[0])
+        return lease["owner"] if lease["until"] > now else None
+
+    def _promote_expired(
+        self,
+        conn: sqlite3.Connection,
+        pool_key: str,
+        now: float,
+        selection: Dict,
+        limit: int = -1,
+        owner: Optional[str] = None,
+    ) -> int:
+        """冷却到期的账号回到可用状态；有冷却回收进程时只由其执行（owner 为其标识），limit 为单次上限"""
+        holder = self._reaper_holder(conn, pool_key, now)
+        if holder is not None and holder != owner:
+            return 0
+        due = conn.execute(
+            "SELECT username, data FROM accounts WHERE pool = ? AND status = 'cooldown' AND score <= ? "
+            "ORDER BY score LIMIT ?",
+            (pool_key, now, limit),
+        ).fetchall()
+        for username, data in due:
+            account = json.loads(data)
+            self._set_row(conn, pool_key, username, account, "available", _available_score(selection, account, now))
+        return len(due)
+
+    def _release_row(
+        self,
+        conn: sqlite3.Connection,
+        pool_key: str,
+        username: str,
+        cooldown_seconds: float,
+        now: float,
+        selection: Dict,
+        outcome: Optional[str] = None,
+        token: Optional[str] = None,
+    ) -> Optional[str]:
+        """与 Lua 中的 release_one 一致，返回释放后的状态；账号不在使用中时返回 None，租约令牌不符时返回 stale"""
+        row = conn.execute(
+            "SELECT data FROM accounts WHERE pool = ? AND username = ? AND status = 'in_use'", (pool_key, username)
+        ).fetchone()
+        if row is None:
+            return None
+
+        account = json.loads(row[0])
+        if token is not None and schema.lease_token_arg(account.get("lease_token")) != token:
+            return "stale"
+        account.pop("acquired_at", None)
+        account.pop("lease_token", None)
+        account["released_at"] = now
+        if outcome == "success":
+            account["successes"] = account.get("successes", 0) + 1
+            account.pop("consecutive_failures", None)
+        elif outcome == "failure":
+            account["failures"] = account.get("failures", 0) + 1
+            failures = account.get("consecutive_failures", 0) + 1
+            account["consecutive_failures"] = failures
+            if 0 < schema.QUARANTINE_AFTER_FAILURES <= failures:
+                self._set_row(conn, pool_key, username, account, "quarantined", now)
+                return "quarantined"
+            cooldown_seconds = schema.failure_cooldown(failures, self._random.random())
+
+        if cooldown_seconds > 0:
+            self._set_row(conn, pool_key, username, account, "cooldown", now + cooldown_seconds)
+            return "cooldown"
+        self._set_row(conn, pool_key, username, account, "available", _available_score(selection, account, now))
+        return "available"
+
+    def _reclaim_expired(
+        self,
+        conn: sqlite3.Connection,
+        pool_key: str,
+        now: float,
+        selection: Dict,
+        limit: int = schema.COOLDOWN_PROMOTE_BATCH,
+    ) -> int:
+        """回收租约最早过期的至多 limit 个账号，与 Lua 中的 reclaim_expired 一致，返回实际释放的账号数"""
+        expired = conn.execute(
+            "SELECT username FROM accounts WHERE pool = ? AND status = 'in_use' AND score <= ? ORDER BY score LIMIT ?",
+            (pool_key, now, limit),
+        ).fetchall()
+        reclaimed = 0
+        for (username,) in expired:
+            if self._release_row(conn, pool_key, username, schema.LEASE_RECLAIM_COOLDOWN, now, selection) is not None:
+                reclaimed += 1
+        return reclaimed
+
+    def _acquire_batch(
+        self, pool_key: str, count: int, lease_seconds: float, reserve: int = 0
+    ) -> Tuple[List[Dict], Optional[float]]:
+        """取出最多 count 个账号；按选择顺序排在最前的 reserve 个可用账号留给排队的等待者，不取"""
+        now = time.time()
+        with self._transaction() as conn:
+            selection = self._selection(conn, pool_key)
+            self._reclaim_expired(conn, pool_key, now, selection)
+            reaping = self._reaper_holder(conn, pool_key, now) is not None
+            if not reaping:
+                self._promote_expired(conn, pool_key, now, selection)
+
+            if selection["policy"] == "random" and selection["top_k"] > 1:
+                candidates = conn.execute(
+                    "SELECT username, data FROM accounts WHERE pool = ? AND status = 'available' "
+                    "ORDER BY score, username LIMIT ? OFFSET ?",
+                    (pool_key, max(count, selection["top_k"]), reserve),
+                ).fetchall()
+                rows = self._random.sample(candidates, min(count, len(candidates)))
+            else:
+                rows = conn.execute(
+                    "SELECT username, data FROM accounts WHERE pool = ? AND status = 'available' "
+                    "ORDER BY score, username LIMIT ? OFFSET ?",
+                    (pool_key, count, reserve),
+                ).fetchall()
+
+            accounts = []
+            fence = self._reserve_sequence(conn, pool_key, len(rows), "fence")
+            for index, (username, data) in enumerate(rows, 1):
+                account = json.loads(data)
+                account["acquired_at"] = now
+                account["lease_token"] = fence + index
+                self._set_row(conn, pool_key, username, account, "in_use", now + lease_seconds)
+                accounts.append(schema.annotate_account(account, "in_use", now + lease_seconds))
+
+            next_ready_at = None
+            # 有冷却回收进程时由其提升账号并唤醒等待者
+            if len(accounts) < count and not reaping:
+                row = conn.execute(
+                    "SELECT MIN(score) FROM accounts WHERE pool = ? AND status = 'cooldown'", (pool_key,)
+                ).fetchone()
+                next_ready_at = row[0]
+        return accounts, next_ready_at
+
+    def _release_usernames(
+        self,
+        pool_key: str,
+        usernames: List[str],
+        cooldown_seconds: int,
+        outcome: Optional[str] = None,
+        tokens: Optional[List] = None,
+    ) -> Tuple[int, int, int]:
+        """返回 (实际释放的账号数, 其中被隔离的账号数, 租约令牌不符被拒绝的账号数)；tokens 为 None 时不校验"""
+        released = quarantined = stale = 0
+        now = time.time()
+        with self._transaction() as conn:
+            selection = self._selection(conn, pool_key)
+            for index, username in enumerate(usernames):
+                token = schema.lease_token_arg(tokens[index]) if tokens is not None else None
+                status = self._release_row(conn, pool_key, username, cooldown_seconds, now, selection, outcome, token)
+                if status == "stale":
+                    stale += 1
+                elif status is not None:
+                    released += 1
+                    quarantined += status == "quarantined"
+        return released, quarantined, stale
+
+    def _upsert(
+        self, pool_key: str, encoded: List[Tuple[str, Dict[str, str]]], update_existing: bool
+    ) -> Tuple[int, int, int]:
+        """与 LUA_UPSERT_ACCOUNTS 一致，返回 (新增数, 更新数, 未改动数)"""
+        added = updated = unchanged = 0
+        with self._transaction() as conn:
+            sequence = self._reserve_sequence(conn, pool_key, len(encoded))
+            conn.execute(
+                "INSERT OR IGNORE INTO pool_meta (pool, name, value) VALUES (?, 'version', ?)",
+                (pool_key, str(schema.SCHEMA_VERSION)),
+            )
+            for index, (username, fields) in enumerate(encoded, start=1):
+                account = schema.decode_account(fields)
+                row = conn.execute(
+                    "SELECT data FROM accounts WHERE pool = ? AND username = ?", (pool_key, username)
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO accounts (pool, username, data, status, score) VALUES (?, ?, ?, 'available', ?)",
+                        (pool_key, username, json.dumps(account, ensure_ascii=False), sequence + index),
+                    )
+                    added += 1
+                elif update_existing:
+                    current = json.loads(row[0])
+                    changes = {
+                        field: value
+                        for field, value in account.items()
+                        if field != "created_at" and current.get(field) != value
+                    }
+                    if changes:
+                        current.update(changes)
+                        conn.execute(
+                            "UPDATE accounts SET data = ? WHERE pool = ? AND username = ?",
+                            (json.dumps(current, ensure_ascii=False), pool_key, username),
+                        )
+                        updated += 1
+                    else:
+                        unchanged += 1
+                else:
+                    unchanged += 1
+        return added, updated, unchanged
+
+    def _encode_accounts(self, accounts: List[Dict], report: Dict[str, int], skip_duplicates: bool):
+        created_at = time.time()
+        seen: Set[str] = set()
+        encoded = []
+        for account in accounts:
+            entry = schema.encode_new_account(account, created_at)
+            if entry is None:
+                self.logger.warning(f"忽略无效账号: {account}")
+                report["invalid"] += 1
+                continue
+            if skip_duplicates and entry[0] in seen:
+                self.logger.warning(f"跳过重复账号: {entry[0]}")
+                report["invalid"] += 1
+                continue
+            seen.add(entry[0])
+            encoded.append(entry)
+        return encoded
+
+    # ---- 对外方法 ----------------------------------------------------------
+    def save_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> bool:
+        """保存账号列表，替换账号池中原有的全部账号；选择策略保持不变"""
+        try:
+            now = time.time()
+            seen_usernames = set()
+            with self._transaction() as conn:
+                sequence = int(self._meta(conn, pool_key).get("sequence") or 0)
+                conn.execute("DELETE FROM accounts WHERE pool = ?", (pool_key,))
+                for account in accounts:
+                    username = account.get("username")
+                    password = account.get("password")
+                    if not username or not password:
+                        self.logger.warning(f"忽略无效账号: {account}")
+                        continue
+                    if username in seen_usernames:
+                        self.logger.warning(f"跳过重复账号: {username}")
+                        continue
+                    account_data = {"username": username, "password": password, "created_at": now}
+                    conn.execute(
+                        "INSERT INTO accounts (pool, username, data, status, score) VALUES (?, ?, ?, 'available', ?)",
+                        (pool_key, username, json.dumps(account_data, ensure_ascii=False), len(seen_usernames)),
+                    )
+                    seen_usernames.add(username)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pool_meta (pool, name, value) VALUES (?, ?, ?)",
+                    [
+                        (pool_key, "version", str(schema.SCHEMA_VERSION)),
+                        (pool_key, "created_at", str(now)),
+                        (pool_key, "sequence", str(max(sequence, len(seen_usernames)))),
+                    ],
+                )
+            self.logger.info("成功写入 %d 个账号到 '%s'", len(seen_usernames), pool_key)
+            return True
+        except Exception as exc:
+            self.logger.error(f"保存账号失败: {exc}")
+            return False
+
+    def sync_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """按差异把账号池同步为给定的账号列表，返回 {added, updated, removed, unchanged, invalid}"""
+        report = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "invalid": 0}
+        try:
+            encoded = self._encode_accounts(accounts, report, skip_duplicates=True)
+            report["added"], report["updated"], report["unchanged"] = self._upsert(pool_key, encoded, True)
+            wanted = {username for username, _ in encoded}
+            with self._read() as conn:
+                stale = [
+                    username
+                    for (username,) in conn.execute("SELECT username FROM accounts WHERE pool = ?", (pool_key,))
+                    if username not in wanted
+                ]
+            report["removed"] = self._remove_usernames(pool_key, stale)
+            self.logger.info(
+                "同步账号池 '%s': 新增 %d, 更新 %d, 删除 %d, 未变 %d",
+                pool_key,
+                report["added"],
+                report["updated"],
+                report["removed"],
+                report["unchanged"],
+            )
+        except Exception as exc:
+            self.logger.error(f"同步账号失败: {exc}")
+        return report
+
+    def _remove_usernames(self, pool_key: str, usernames: List[str]) -> int:
+        with self._transaction() as conn:
+            return sum(
+                conn.execute("DELETE FROM accounts WHERE pool = ? AND username = ?", (pool_key, username)).rowcount
+                for username in usernames
+            )
+
+    def remove_accounts(self, usernames: List[str], pool_key: str = "account_pool_v3") -> int:
+        """从账号池删除指定用户名，返回删除的账号数；使用中的账号删除后释放时返回 False"""
+        try:
+            removed = self._remove_usernames(pool_key, [username for username in usernames if username])
+            self.logger.info("已删除 %d 个账号", removed)
+            return removed
+        except Exception as exc:
+            self.logger.error(f"删除账号失败: {exc}")
+            return 0
+
+    def add_accounts(self, accounts: List[Dict], pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """向账号池追加账号，已存在的用户名跳过，返回 {imported, duplicates, invalid, failed}"""
+        report = {"imported": 0, "duplicates": 0, "invalid": 0, "failed": 0}
+        encoded = self._encode_accounts(accounts, report, skip_duplicates=False)
+        try:
+            report["imported"], _, report["duplicates"] = self._upsert(pool_key, encoded, False)
+        except Exception as exc:
+            # 全部账号在同一事务中写入，出错时整体回滚
+            report["failed"] = len(encoded)
+            self.logger.error(f"追加账号失败: {exc}")
+        return report
+
+    def delete_pool(self, pool_key: str = "account_pool_v3") -> int:
+        """删除整个账号池，返回删除的账号数"""
+        try:
+            with self._transaction() as conn:
+                deleted = conn.execute("DELETE FROM accounts WHERE pool = ?", (pool_key,)).rowcount
+                # 保留顺序号与租约令牌计数，避免新令牌与旧持有者手中的令牌相同
+                conn.execute(
+                    f"DELETE FROM pool_meta WHERE pool = ? AND name NOT IN "
+                    f"({', '.join('?' * len(schema.COUNTER_META_FIELDS))})",
+                    (pool_key, *schema.COUNTER_META_FIELDS),
+                )
+            self.logger.info("已删除账号池 '%s' 的 %d 个账号", pool_key, deleted)
+            return deleted
+        except Exception as exc:
+            self.logger.error(f"删除账号池失败: {exc}")
+            return 0
+
+    def snapshot(self, pool_key: str = "account_pool_v3", path: str = "account_pool.snap") -> Optional[Dict[str, int]]:
+        """把账号池流式写入快照文件，格式与 AccountManager 相同，返回 {accounts, bytes}，失败时返回 None"""
+        temp_path = f"{path}.tmp"
+        try:
+            with self._read() as conn:
+                meta = self._meta(conn, pool_key)
+            last = ""
+            with open(temp_path, "wb") as handle:
+                writer = snapshot.SnapshotWriter(handle, pool_key, meta)
+                while True:
+                    with self._read() as conn:
+                        rows = conn.execute(
+                            "SELECT username, data, status, score FROM accounts WHERE pool = ? AND username > ? "
+                            "ORDER BY username LIMIT ?",
+                            (pool_key, last, snapshot.SNAPSHOT_CHUNK_SIZE),
+                        ).fetchall()
+                    writer.write_accounts([
+                        (username, status, score, {
+                            field: json.dumps(value, ensure_ascii=False) for field, value in json.loads(data).items()
+                        })
+                        for username, data, status, score in rows
+                    ])
+                    if len(rows) < snapshot.SNAPSHOT_CHUNK_SIZE:
+                        break
+                    last = rows[-1][0]
+                writer.close()
+            os.replace(temp_path, path)
+            self.logger.info("账号池 '%s' 已保存快照 %s: %d 个账号, %d 字节", pool_key, path, writer.count, writer.bytes_written)
+            return {"accounts": writer.count, "bytes": writer.bytes_written}
+        except Exception as exc:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.logger.error(f"保存账号池快照失败: {exc}")
+            return None
+
+    def restore(
+        self, path: str, pool_key: Optional[str] = None, replace: bool = False
+    ) -> Optional[Dict[str, int]]:
+        """从快照恢复账号池，pool_key 默认为快照中的账号池；返回 {restored, 各状态账号数}，失败时返回 None
+
+        目标账号池非空时需指定 replace 先清空；每帧账号在一个事务中写入。
+        """
+        report = {"restored": 0, **{status: 0 for status in schema.ACCOUNT_STATUSES}}
+        try:
+            with open(path, "rb") as handle:
+                reader = snapshot.SnapshotReader(handle)
+                pool_key = pool_key or reader.pool_key
+                # 清空前读取当前元信息，恢复后的计数不低于当前值
+                with self._read() as conn:
+                    current_meta = self._meta(conn, pool_key)
+                if replace:
+                    self.delete_pool(pool_key)
+                else:
+                    with self._read() as conn:
+                        existing = conn.execute(
+                            "SELECT 1 FROM accounts WHERE pool = ? LIMIT 1", (pool_key,)
+                        ).fetchone()
+                    if existing:
+                        self.logger.error("账号池 '%s' 非空，恢复快照需先清空（replace）", pool_key)
+                        return None
+
+                with self._transaction() as conn:
+                    meta = snapshot.merge_meta(current_meta, reader.meta)
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO pool_meta (pool, name, value) VALUES (?, ?, ?)",
+                        [(pool_key, name, value) for name, value in meta.items()],
+                    )
+                for records in reader.iter_chunks():
+                    rows = []
+                    for username, status, score, fields in records:
+                        if status not in schema.ACCOUNT_STATUSES:
+                            status, score = "available", time.time()
+                        account = schema.decode_account(fields)
+                        rows.append((pool_key, username, json.dumps(account, ensure_ascii=False), status, score))
+                        report[status] += 1
+                    with self._transaction() as conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO accounts (pool, username, data, status, score) VALUES (?, ?, ?, ?, ?)",
+                            rows,
+                        )
+                    report["restored"] += len(rows)
+
+            self.logger.info(
+                "账号池 '%s' 已从快照 %s 恢复 %d 个账号 (可用 %d, 使用中 %d, 冷却 %d, 隔离 %d)",
+                pool_key, path, report["restored"], report["available"], report["in_use"],
+                report["cooldown"], report["quarantined"],
+            )
+            return report
+        except Exception as exc:
+            self.logger.error(f"恢复账号池快照失败: {exc}")
+            return None
+
+    def get_all_accounts(self, pool_key: str = "account_pool_v3") -> List[Dict]:
+        """获取账号池的完整列表，包含使用中、冷却中和隔离中的账号"""
+        return [account for page in self.iter_accounts(pool_key) for account in page]
+
+    def iter_accounts(
+        self,
+        pool_key: str = "account_pool_v3",
+        status: Optional[str] = None,
+        page_size: int = schema.DEFAULT_PAGE_SIZE,
+        promote_cooldown: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """按页遍历账号池，status 为 ACCOUNT_STATUSES 之一时只读取该状态，顺序、分页方式与参数含义与 AccountManager 一致"""
+        if status is not None and status not in schema.ACCOUNT_STATUSES:
+            self.logger.warning(f"未知的账号状态筛选: {status}")
+            return
+
+        page_size = max(1, int(page_size))
+        statuses = [status] if status else list(schema.ACCOUNT_STATUSES)
+        try:
+            if promote_cooldown and status != "in_use":
+                with self._transaction() as conn:
+                    self._promote_expired(conn, pool_key, time.time(), self._selection(conn, pool_key))
+
+            for current in statuses:
+                # 按 (分数, 用户名) 游标分页，遍历期间其他账号的改动不会造成遗漏
+                cursor = (float("-inf"), "")
+                while True:
+                    with self._read() as conn:
+                        rows = conn.execute(
+                            "SELECT data, score, username FROM accounts WHERE pool = ? AND status = ? "
+                            "AND (score > ? OR (score = ? AND username > ?)) ORDER BY score, username LIMIT ?",
+                            (pool_key, current, cursor[0], cursor[0], cursor[1], page_size),
+                        ).fetchall()
+                    page = [schema.annotate_account(json.loads(data), current, score) for data, score, _ in rows]
+                    if page:
+                        yield page
+                    if len(rows) < page_size:
+                        break
+                    cursor = (rows[-1][1], rows[-1][2])
+        except Exception as exc:
+            self.logger.error(f"分页获取账号列表失败: {exc}")
+
+    def acquire_account(
+        self,
+        pool_key: str = "account_pool_v3",
+        timeout: Optional[float] = None,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> Optional[Dict]:
+        """原子地取出一个账号并标记为使用中，timeout 大于 0 时阻塞等待，语义同 AccountManager.acquire_account
+
+        阻塞等待者在本进程内按到达顺序排队，已有等待者时后来的调用不能插队。
+        """
+        try:
+            database = self._database()
+            deadline = time.time() + timeout if timeout and timeout > 0 else None
+            # 持有锁直到开始等待，释放与唤醒不会落在两者之间
+            with database.lock:
+                queue = database.waiters.setdefault(pool_key, deque())
+                ticket = None
+                try:
+                    while True:
+                        next_ready_at = None
+                        if not queue or queue[0] is ticket:
+                            accounts, next_ready_at = self._acquire_batch(pool_key, 1, lease_seconds)
+                            if accounts:
+                                account = accounts[0]
+                                self.logger.info("取回账号: %s", account.get("username"))
+                                return account
+
+                        remaining = deadline - time.time() if deadline is not None else 0
+                        if remaining <= 0:
+                            self.logger.warning(f"账号池 '{pool_key}' 暂无可用账号")
+                            return None
+
+                        if ticket is None:
+                            ticket = object()
+                            queue.append(ticket)
+                        wait = min(remaining, LOCAL_POLL_SECONDS)
+                        if next_ready_at is not None:
+                            wait = min(wait, next_ready_at - time.time())
+                        database.changed.wait(max(wait, schema.MIN_BLOCKING_WAIT))
+                finally:
+                    if ticket is not None:
+                        queue.remove(ticket)
+                        # 队首离开后唤醒下一个等待者
+                        database.changed.notify_all()
+        except Exception as exc:
+            self.logger.error(f"获取账号失败: {exc}")
+            return None
+
+    def release_account(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> bool:
+        """释放账号，参数与语义同 AccountManager.release_account"""
+        username = (account or {}).get("username")
+        if not username:
+            self.logger.warning(f"release_account 缺少用户名: {account}")
+            return False
+
+        try:
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, quarantined, stale = self._release_usernames(
+                pool_key, [username], cooldown_seconds, outcome, [account.get("lease_token")]
+            )
+            if stale:
+                self.logger.warning("账号 %s 的租约令牌已失效（租约过期后已重新分配），跳过释放", username)
+                return False
+            if released:
+                if quarantined:
+                    self.logger.warning(
+                        "账号 %s 连续失败 %d 次，已隔离", username, schema.QUARANTINE_AFTER_FAILURES
+                    )
+                elif outcome == "failure":
+                    self.logger.info("账号 %s 使用失败，按连续失败次数进入冷却", username)
+                elif cooldown_seconds > 0:
+                    self.logger.info("账号 %s 进入冷却 %s 秒", username, cooldown_seconds)
+                else:
+                    self.logger.info("释放账号: %s", username)
+                return True
+            self.logger.warning("账号 '%s' 不在使用列表中，跳过释放", username)
+            return False
+        except Exception as exc:
+            self.logger.error(f"释放账号失败: {exc}")
+            return False
+
+    def acquire_many(
+        self,
+        pool_key: str = "account_pool_v3",
+        count: int = 1,
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> List[Dict]:
+        """一次性取出最多 count 个账号，账号不足时返回已取到的部分
+
+        与 acquire_account 相同的公平排队：本进程内已有阻塞等待者时，先为每个等待者留下一个可用账号。
+        """
+        try:
+            database = self._database()
+            with database.lock:
+                waiting = len(database.waiters.get(pool_key) or ())
+                accounts, _ = self._acquire_batch(pool_key, max(0, int(count)), lease_seconds, reserve=waiting)
+                if waiting:
+                    # 获取时提升或回收的账号可能已经可用，唤醒等待者取走留给它们的账号
+                    database.changed.notify_all()
+            if len(accounts) < count:
+                self.logger.warning(f"账号池 '{pool_key}' 仅取到 {len(accounts)}/{count} 个账号")
+            else:
+                self.logger.info("批量取回 %d 个账号", len(accounts))
+            return accounts
+        except Exception as exc:
+            self.logger.error(f"批量获取账号失败: {exc}")
+            return []
+
+    def release_many(
+        self,
+        accounts: List[Dict],
+        pool_key: str = "account_pool_v3",
+        cooldown_seconds: int = 0,
+        outcome: Optional[str] = None,
+        success: Optional[bool] = None,
+    ) -> int:
+        """批量释放账号，返回实际释放的个数；租约令牌不符的账号跳过"""
+        accounts = [account for account in accounts or [] if account and account.get("username")]
+        if not accounts:
+            return 0
+        usernames = [account["username"] for account in accounts]
+
+        try:
+            cooldown_seconds = max(0, int(cooldown_seconds or 0))
+            outcome = schema.normalize_outcome(outcome, success)
+            released, quarantined, stale = self._release_usernames(
+                pool_key, usernames, cooldown_seconds, outcome, [account.get("lease_token") for account in accounts]
+            )
+            if stale:
+                self.logger.warning("批量释放: %d 个账号的租约令牌已失效，跳过", stale)
+            if outcome == "failure":
+                self.logger.info("批量释放 %d/%d 个失败账号, 其中隔离 %d 个", released, len(usernames), quarantined)
+            else:
+                self.logger.info("批量释放 %d/%d 个账号, 冷却 %s 秒", released, len(usernames), cooldown_seconds)
+            return released
+        except Exception as exc:
+            self.logger.error(f"批量释放账号失败: {exc}")
+            return 0
+
+    def set_selection_policy(
+        self,
+        pool_key: str = "account_pool_v3",
+        policy: str = schema.DEFAULT_SELECTION_POLICY,
+        success_weight: Optional[float] = None,
+        top_k: Optional[int] = None,
+    ) -> bool:
+        """设置账号池的选择策略（lru / success / random），对之后释放和获取的账号生效"""
+        try:
+            fields = schema.selection_fields(policy, success_weight, top_k)
+            with self._transaction() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pool_meta (pool, name, value) VALUES (?, ?, ?)",
+                    [(pool_key, name, str(value)) for name, value in fields.items()],
+                )
+            self.logger.info(
+                "账号池 '%s' 选择策略: %s, 成功率权重 %s 秒, top_k %s",
+                pool_key,
+                fields["policy"],
+                fields["success_weight"],
+                fields["top_k"],
+            )
+            return True
+        except Exception as exc:
+            self.logger.error(f"设置选择策略失败: {exc}")
+            return False
+
+    def get_selection_policy(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池当前的选择策略 {policy, success_weight, top_k}"""
+        try:
+            with self._read() as conn:
+                return self._selection(conn, pool_key)
+        except Exception as exc:
+            self.logger.error(f"获取选择策略失败: {exc}")
+            return {"policy": schema.DEFAULT_SELECTION_POLICY, "success_weight": 0.0, "top_k": 1}
+
+    def release_quarantined(self, usernames: Optional[List[str]] = None, pool_key: str = "account_pool_v3") -> int:
+        """解除隔离并清零连续失败次数，usernames 为 None 时解除全部，返回解除的个数"""
+        try:
+            now = time.time()
+            restored = 0
+            with self._transaction() as conn:
+                selection = self._selection(conn, pool_key)
+                rows = conn.execute(
+                    "SELECT username, data FROM accounts WHERE pool = ? AND status = 'quarantined'", (pool_key,)
+                ).fetchall()
+                wanted = set(usernames) if usernames is not None else None
+                for username, data in rows:
+                    if wanted is not None and username not in wanted:
+                        continue
+                    account = json.loads(data)
+                    account.pop("consecutive_failures", None)
+                    self._set_row(
+                        conn, pool_key, username, account, "available", _available_score(selection, account, now)
+                    )
+                    restored += 1
+            self.logger.info("账号池 '%s' 解除隔离 %d 个账号", pool_key, restored)
+            return restored
+        except Exception as exc:
+            self.logger.error(f"解除隔离失败: {exc}")
+            return 0
+
+    def renew_lease(
+        self,
+        account: Dict,
+        pool_key: str = "account_pool_v3",
+        lease_seconds: float = schema.DEFAULT_LEASE_SECONDS,
+    ) -> bool:
+        """为仍在使用中的账号续约，账号已被回收或释放、或租约令牌已失效时返回 False"""
+        username = (account or {}).get("username")
+        if not username:
+            self.logger.warning(f"renew_lease 缺少用户名: {account}")
+            return False
+
+        try:
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT data FROM accounts WHERE pool = ? AND username = ? AND status = 'in_use'",
+                    (pool_key, username),
+                ).fetchone()
+                stale = row is not None and (
+                    schema.lease_token_arg(json.loads(row[0]).get("lease_token"))
+                    != schema.lease_token_arg(account.get("lease_token"))
+                )
+                renewed = row is not None and not stale
+                if renewed:
+                    conn.execute(
+                        "UPDATE accounts SET score = ? WHERE pool = ? AND username = ?",
+                        (now + lease_seconds, pool_key, username),
+                    )
+            if stale:
+                self.logger.warning("账号 '%s' 的租约令牌已失效（租约过期后已重新分配），续约失败", username)
+                return False
+            if renewed:
+                account["lease_until"] = now + lease_seconds
+                return True
+            self.logger.warning("账号 '%s' 已不在使用中，续约失败", username)
+            return False
+        except Exception as exc:
+            self.logger.error(f"账号续约失败: {exc}")
+            return False
+
+    def get_account_status(self, pool_key: str = "account_pool_v3") -> Dict:
+        """返回账号池状态统计，冷却已到期的账号按可用计算，与 AccountManager 一致"""
+        try:
+            now = time.time()
+            with self._read() as conn:
+                counts = dict(conn.execute(
+                    "SELECT CASE WHEN status = 'cooldown' AND score <= ? THEN 'available' ELSE status END, COUNT(*) "
+                    "FROM accounts WHERE pool = ? GROUP BY 1",
+                    (now, pool_key),
+                ).fetchall())
+                next_cooldown_at = conn.execute(
+                    "SELECT MIN(score) FROM accounts WHERE pool = ? AND status = 'cooldown' AND score > ?",
+                    (pool_key, now),
+                ).fetchone()[0]
+
+            status = schema.empty_status()
+            for name in schema.ACCOUNT_STATUSES:
+                status[name] = counts.get(name, 0)
+            status["total"] = sum(counts.values())
+            if next_cooldown_at is not None:
+                status["next_cooldown_at"] = next_cooldown_at
+                status["next_cooldown_in"] = max(0.0, next_cooldown_at - now)
+            return status
+        except Exception as exc:
+            self.logger.error(f"获取账号状态失败: {exc}")
+            return schema.empty_status()
+
+    def cleanup_expired_accounts(self, pool_key: str = "account_pool_v3", timeout: int = 3600) -> int:
+        """回收租约已过期的账号；timeout 只用于 Redis 版的 v3 迁移，这里忽略"""
+        try:
+            cleaned_count = 0
+            while True:
+                with self._transaction() as conn:
+                    reclaimed = self._reclaim_expired(conn, pool_key, time.time(), self._selection(conn, pool_key))
+                cleaned_count += reclaimed
+                if reclaimed < schema.COOLDOWN_PROMOTE_BATCH:
+                    break
+            if cleaned_count:
+                self.logger.info(f"已回收 {cleaned_count} 个超时账号")
+            return cleaned_count
+        except Exception as exc:
+            self.logger.error(f"清理超时账号失败: {exc}")
+            return 0
+
+    def release_all_accounts(self, pool_key: str = "account_pool_v3") -> int:
+        """批量释放所有使用中的账号（无冷却）"""
+        try:
+            with self._read() as conn:
+                usernames = [
+                    username
+                    for (username,) in conn.execute(
+                        "SELECT username FROM accounts WHERE pool = ? AND status = 'in_use'", (pool_key,)
+                    )
+                ]
+            released = self._release_usernames(pool_key, usernames, 0)[0]
+            self.logger.info("已一键释放 %d 个账号", released)
+            return released
+        except Exception as exc:
+            self.logger.error(f"一键释放账号失败: {exc}")
+            return 0
+
+    def repair_pool(
+        self,
+        pool_key: str = "account_pool_v3",
+        batch_size: int = schema.REPAIR_BATCH_SIZE,
+        pause_seconds: float = 0.0,
+        stop_event: Optional[threading.Event] = None,
+    ) -> Dict[str, int]:
+        """每个账号只有一行且状态是一列，不会出现残留或重复，只返回检查的账号数"""
+        report = {"scanned": 0, "migrated": 0, "orphaned": 0, "duplicates": 0, "restored": 0}
+        try:
+            with self._read() as conn:
+                report["scanned"] = conn.execute(
+                    "SELECT COUNT(*) FROM accounts WHERE pool = ?", (pool_key,)
+                ).fetchone()[0]
+        except Exception as exc:
+            self.logger.error(f"修复账号池失败: {exc}")
+        return report
+
+    def start_background_repair(
+        self,
+        pool_key: str = "account_pool_v3",
+        interval: float = schema.DEFAULT_REPAIR_INTERVAL,
+        pause_seconds: float = schema.REPAIR_STEP_PAUSE,
+    ) -> threading.Event:
+        """本地账号池无需后台修复，返回的 Event 仅用于与 AccountManager 保持接口一致"""
+        return threading.Event()
+
+    def _reap_cooldown(self, pool_key: str, owner: str, lease_seconds: float) -> Tuple[int, Optional[float]]:
+        """冷却回收的一次调度，返回 (提升的账号数，未当选时为 -1, 最早冷却到期时间)"""
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                holder = self._reaper_holder(conn, pool_key, now)
+                if holder is not None and holder != owner:
+                    return -1, None
+                if lease_seconds <= 0:
+                    conn.execute("DELETE FROM pool_meta WHERE pool = ? AND name = 'reaper'", (pool_key,))
+                    return 0, None
+                conn.execute(
+                    "INSERT OR REPLACE INTO pool_meta (pool, name, value) VALUES (?, 'reaper', ?)",
+                    (pool_key, json.dumps({"owner": owner, "until": now + lease_seconds})),
+                )
+                promoted = self._promote_expired(
+                    conn, pool_key, now, self._selection(conn, pool_key), schema.COOLDOWN_PROMOTE_BATCH, owner
+                )
+                row = conn.execute(
+                    "SELECT MIN(score) FROM accounts WHERE pool = ? AND status = 'cooldown'", (pool_key,)
+                ).fetchone()
+            return promoted, row[0]
+        except Exception as exc:
+            self.logger.error(f"冷却回收失败: {exc}")
+            return -1, None
+
+    def start_cooldown_reaper(
+        self, pool_key: str = "account_pool_v3", interval: float = schema.DEFAULT_REAPER_INTERVAL
+    ) -> threading.Event:
+        """在后台守护线程中提升冷却到期的账号，选主与调度方式同 AccountManager，租约记在 pool_meta 中"""
+        stop_event = threading.Event()
+        owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        lease_seconds = max(schema.REAPER_LEASE_SECONDS, interval * 3)
+
+        def run():
+            leading = False
+            while not stop_event.is_set():
+                promoted, next_due = self._reap_cooldown(pool_key, owner, lease_seconds)
+                if (promoted >= 0) != leading:
+                    leading = promoted >= 0
+                    self.logger.info(
+                        "账号池 '%s' 的冷却回收%s", pool_key, "由本进程执行" if leading else "由其他进程执行，本进程待命"
+                    )
+                if promoted > 0:
+                    self.logger.info("从冷却池恢复 %d 个账号", promoted)
+                if promoted >= schema.COOLDOWN_PROMOTE_BATCH:
+                    continue
+                wait = interval
+                if leading and next_due is not None:
+                    wait = min(interval, max(next_due - time.time(), schema.MIN_BLOCKING_WAIT))
+                stop_event.wait(wait)
+            if leading:
+                self._reap_cooldown(pool_key, owner, 0)
+
+        threading.Thread(target=run, name=f"CooldownReaper-{pool_key}", daemon=True).start()
+        self.logger.info("已启动账号池 '%s' 冷却回收, 间隔 %s 秒", pool_key, interval)
+        return stop_event
+
+    def remove_duplicate_accounts(self, pool_key: str = "account_pool_v3") -> Dict[str, int]:
+        """返回与 AccountManager 相同结构的统计；本地账号池按主键去重，不会出现重复账号"""
+        status = self.get_account_status(pool_key)
+        return {
+            "removed": 0,
+            "available": status["available"],
+            "in_use": status["in_use"],
+            "cooldown": status["cooldown"],
+        }
+
+    def migrate_pool(self, pool_key: str = "account_pool_v3") -> int:
+        """本地账号池没有旧结构需要迁移"""
+        return 0
@@ -8,11 +8,24 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from window_controller import WindowController
 from click_sequence import ClickSequence
-from account_manager import AccountManager
+from account_manager import AccountManager, close_connection_pools, create_account_manager
+from local_account_manager import DEFAULT_DB_PATH, close_databases
+from account_pool_metrics import start_http_server
 from process_monitor import ProcessMonitor
 from coordinate_recorder import CoordinateRecorder
 from runtime_logger import RuntimeLogger
 
+# 账号池为空时阻塞等待账号的最长时间（秒）
+ACCOUNT_WAIT_SECONDS = 30
+# 持有账号期间续约租约的间隔（秒），需明显小于账号租约时长
+LEASE_RENEW_INTERVAL = 30
+# 账号管理页面每次从 Redis 读取的账号数
+ACCOUNT_PAGE_SIZE = 500
+# 账号管理页面的状态筛选项，None 表示全部
+ACCOUNT_STATUS_FILTERS = [
+    ("全部", None), ("空闲", "available"), ("占用", "in_use"), ("冷却", "cooldown"), ("隔离", "quarantined")
+]
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -33,6 +46,14 @@ class MainWindow(QMainWindow):
         
         # 任务线程
         self.task_thread = None
+        # 账号列表分页加载线程
+        self.account_loader = None
+        # 账号池后台修复线程的停止信号
+        self.pool_repair_stop = None
+        # 冷却回收线程的停止信号
+        self.cooldown_reaper_stop = None
+        # 账号池统计的本地 Prometheus 端点
+        self.metrics_server = None
         
         # 设置日志
         self.setup_logging()
@@ -167,6 +188,19 @@ class MainWindow(QMainWindow):
         widget = QWidget()
         layout = QVBoxLayout(widget)
         
+        # 状态筛选
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("状态筛选:"))
+        self.account_status_filter = QComboBox()
+        for label, status in ACCOUNT_STATUS_FILTERS:
+            self.account_status_filter.addItem(label, status)
+        self.account_status_filter.currentIndexChanged.connect(self.refresh_accounts)
+        filter_layout.addWidget(self.account_status_filter)
+        self.account_count_label = QLabel("")
+        filter_layout.addWidget(self.account_count_label)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+        
         # 账号列表
         self.account_table = QTableWidget()
         self.account_table.setColumnCount(3)
@@ -205,6 +239,10 @@ class MainWindow(QMainWindow):
         dedup_accounts_btn.clicked.connect(self.remove_duplicate_accounts)
         button_layout.addWidget(dedup_accounts_btn)
 
+        release_quarantined_btn = QPushButton("解除隔离")
+        release_quarantined_btn.clicked.connect(self.release_quarantined_accounts)
+        button_layout.addWidget(release_quarantined_btn)
+
         layout.addLayout(button_layout)
         return widget
     
@@ -298,6 +336,16 @@ class MainWindow(QMainWindow):
             "redis_password": "redis_AGZ8Gd",
             "redis_db": 0,
             "account_pool_key": "account_pool_v3",
+            "redis_max_connections": 20,
+            "redis_health_check_interval": 30,
+            "redis_cluster": False,
+            "account_backend": "redis",
+            "account_db_path": DEFAULT_DB_PATH,
+            "metrics_port": 0,
+            "pool_repair_interval": 600,
+            "cooldown_reaper_interval": 1.0,
+            # 账号池共用的选择策略，None 时不改动账号池现有的策略（默认 lru）
+            "account_selection_policy": None,
             "coordinates": [],
             "click_interval": 2.0,
             "monitor_interval": 30.0,
@@ -356,21 +404,36 @@ class MainWindow(QMainWindow):
     
     def update_components_config(self):
         """更新组件配置"""
-        # 更新账号管理器配置
-        redis_config = {
-            "host": self.config.get("redis_host", ""),
-            "port": self.config.get("redis_port", 6379),
-            "password": self.config.get("redis_password", ""),
-            "db": self.config.get("redis_db", 0)
-        }
-        self.logger.info(f"更新Redis配置: {redis_config['host']}:{redis_config['port']}, DB: {redis_config['db']}")
-        
-        self.account_manager.update_config(
-            host=redis_config["host"],
-            port=redis_config["port"],
-            password=redis_config["password"],
-            db=redis_config["db"]
-        )
+        # 按配置切换账号池后端，sqlite 为单机部署使用的本地数据库
+        backend = self.config.get("account_backend", "redis")
+        if self.account_manager.backend != backend:
+            self.account_manager.close()
+            self.account_manager = create_account_manager(backend)
+
+        if backend == "sqlite":
+            self.account_manager.update_config(path=self.config.get("account_db_path", DEFAULT_DB_PATH))
+        else:
+            # 更新账号管理器配置
+            redis_config = {
+                "host": self.config.get("redis_host", ""),
+                "port": self.config.get("redis_port", 6379),
+                "password": self.config.get("redis_password", ""),
+                "db": self.config.get("redis_db", 0)
+            }
+            self.logger.info(f"更新Redis配置: {redis_config['host']}:{redis_config['port']}, DB: {redis_config['db']}")
+
+            self.account_manager.update_config(
+                host=redis_config["host"],
+                port=redis_config["port"],
+                password=redis_config["password"],
+                db=redis_config["db"],
+                max_connections=self.config.get("redis_max_connections", 20),
+                health_check_interval=self.config.get("redis_health_check_interval", 30),
+                cluster=self.config.get("redis_cluster", False)
+            )
+
+        # metrics_port 大于 0 时在本机提供账号池操作统计，供 Prometheus 抓取
+        self.update_metrics_server(self.config.get("metrics_port", 0))
         
         # 更新进程监控器
         self.process_monitor.set_process_name(self.config["software_b_name"])
@@ -396,16 +459,15 @@ class MainWindow(QMainWindow):
     def test_redis_connection(self):
         """测试Redis连接"""
         try:
-            # 临时创建账号管理器测试连接
-            temp_manager = AccountManager()
-            temp_manager.update_config(
+            # 使用一次性连接测试输入框中的参数，不影响共享连接池
+            connected = AccountManager.check_connection(
                 host=self.redis_host_edit.text(),
                 port=int(self.redis_port_edit.text()),
                 password=self.redis_password_edit.text(),
                 db=int(self.redis_db_edit.text())
             )
             
-            if temp_manager.test_connection():
+            if connected:
                 QMessageBox.information(self, "连接成功", "Redis连接正常")
             else:
                 QMessageBox.warning(self, "连接失败", "无法连接到Redis服务器")
@@ -593,45 +655,77 @@ class MainWindow(QMainWindow):
             self.account_table.removeRow(current_row)
     
     def refresh_accounts(self):
-        """刷新账号状态"""
-        try:
-            pool_key = self.config.get("account_pool_key", "account_pool_v3")
-            accounts = self.account_manager.get_all_accounts(pool_key)
-            
-            self.account_table.setRowCount(len(accounts))
-            for i, account in enumerate(accounts):
-                self.account_table.setItem(i, 0, QTableWidgetItem(account["username"]))
-                self.account_table.setItem(i, 1, QTableWidgetItem(account["password"]))
-                if account.get("in_use", False):
-                    status = "占用"
-                elif account.get("status") == "cooldown" or account.get("cooldown_until") is not None:
-                    cooldown_until = account.get("cooldown_until")
-                    if isinstance(cooldown_until, (int, float)):
-                        remaining = int(max(0, cooldown_until - time.time()))
-                        status = f"冷却({remaining}s)"
-                    else:
-                        status = "冷却"
+        """刷新账号状态，后台线程按页读取，每到一页就追加到表格"""
+        if self.account_loader and self.account_loader.isRunning():
+            self.account_loader.stop()
+            self.account_loader.wait()
+
+        pool_key = self.config.get("account_pool_key", "account_pool_v3")
+        status = self.account_status_filter.currentData()
+        self.account_table.setRowCount(0)
+        self.account_count_label.setText("加载中...")
+
+        self.account_loader = AccountPageLoader(self, self.account_manager, pool_key, status)
+        self.account_loader.page_loaded.connect(self.append_account_page)
+        self.account_loader.load_finished.connect(self.account_page_load_finished)
+        self.account_loader.start()
+
+    def append_account_page(self, accounts):
+        """把一页账号追加到表格末尾"""
+        row = self.account_table.rowCount()
+        self.account_table.setRowCount(row + len(accounts))
+        for i, account in enumerate(accounts, start=row):
+            self.account_table.setItem(i, 0, QTableWidgetItem(account["username"]))
+            self.account_table.setItem(i, 1, QTableWidgetItem(account.get("password", "")))
+            if account.get("in_use", False):
+                status = "占用"
+            elif account.get("status") == "quarantined":
+                status = f"隔离(连续失败{account.get('consecutive_failures', 0)}次)"
+            elif account.get("status") == "cooldown" or account.get("cooldown_until") is not None:
+                cooldown_until = account.get("cooldown_until")
+                if isinstance(cooldown_until, (int, float)):
+                    remaining = int(max(0, cooldown_until - time.time()))
+                    status = f"冷却({remaining}s)"
                 else:
-                    status = "空闲"
-                self.account_table.setItem(i, 2, QTableWidgetItem(status))
-                
-        except Exception as e:
-            QMessageBox.warning(self, "刷新失败", f"刷新账号状态失败: {str(e)}")
+                    status = "冷却"
+            else:
+                status = "空闲"
+            self.account_table.setItem(i, 2, QTableWidgetItem(status))
+        self.account_count_label.setText(f"已加载 {self.account_table.rowCount()} 个")
+
+    def account_page_load_finished(self, error):
+        """分页加载结束"""
+        self.account_count_label.setText(f"共 {self.account_table.rowCount()} 个")
+        if error:
+            QMessageBox.warning(self, "刷新失败", f"刷新账号状态失败: {error}")
     
     def save_accounts_to_redis(self):
         """保存账号到Redis"""
+        if self.account_status_filter.currentData() is not None:
+            QMessageBox.warning(self, "无法保存", "当前只显示部分状态的账号，请将状态筛选切换为“全部”并刷新后再保存")
+            return
+        if self.account_loader and self.account_loader.isRunning():
+            QMessageBox.warning(self, "无法保存", "账号列表仍在加载中，请稍后再保存")
+            return
+
         accounts = []
         for row in range(self.account_table.rowCount()):
             username = self.account_table.item(row, 0).text()
             password = self.account_table.item(row, 1).text()
-            accounts.append({"username": username, "password": password, "in_use": False})
+            accounts.append({"username": username, "password": password})
         
         try:
             pool_key = self.config.get("account_pool_key", "account_pool_v3")
-            if self.account_manager.save_accounts(accounts, pool_key):
-                QMessageBox.information(self, "保存成功", f"已保存 {len(accounts)} 个账号到Redis")
-            else:
-                QMessageBox.warning(self, "保存失败", "保存账号到Redis失败")
+            # 按差异同步，使用中和冷却中的账号保持原状态
+            result = self.account_manager.sync_accounts(accounts, pool_key)
+            message = (
+                f"新增 {result['added']} 个，更新 {result['updated']} 个，"
+                f"删除 {result['removed']} 个，未变 {result['unchanged']} 个"
+            )
+            if result["invalid"]:
+                message += f"，忽略无效/重复 {result['invalid']} 个"
+            QMessageBox.information(self, "保存成功", message)
+            self.log(f"同步账号到Redis: {message}")
         except Exception as e:
             QMessageBox.critical(self, "保存错误", f"保存账号时出错: {str(e)}")
     
@@ -653,6 +747,22 @@ class MainWindow(QMainWindow):
             self.logger.error(f"释放账号失败: {str(e)}")
             self.log(f"释放账号失败: {str(e)}")
 
+    def release_quarantined_accounts(self):
+        """解除全部隔离账号，连续失败次数清零后放回账号池"""
+        try:
+            pool_key = self.config.get("account_pool_key", "account_pool_v3")
+            restored = self.account_manager.release_quarantined(pool_key=pool_key)
+            if restored > 0:
+                QMessageBox.information(self, "解除隔离", f"已解除 {restored} 个隔离账号")
+                self.log(f"已解除 {restored} 个隔离账号")
+            else:
+                QMessageBox.information(self, "解除隔离", "当前没有被隔离的账号")
+            self.refresh_accounts()
+        except Exception as e:
+            QMessageBox.critical(self, "解除隔离失败", f"解除隔离时发生错误: {str(e)}")
+            self.logger.error(f"解除隔离失败: {str(e)}")
+            self.log(f"解除隔离失败: {str(e)}")
+
     def remove_duplicate_accounts(self):
         """删除Redis账号池中的重复账号"""
         try:
@@ -689,7 +799,9 @@ class MainWindow(QMainWindow):
                                      self.process_monitor, self.runtime_logger)
         self.task_thread.log_signal.connect(self.log)
         self.task_thread.finished.connect(self.task_finished)
+        self.apply_selection_policy()
         self.task_thread.start()
+        self.start_pool_repair()
         
         # 更新按钮状态
         self.start_task_btn.setEnabled(False)
@@ -702,6 +814,7 @@ class MainWindow(QMainWindow):
         if self.task_thread:
             self.task_thread.stop()
             self.task_thread.wait()
+        self.stop_pool_repair()
         
         # 更新按钮状态
         self.start_task_btn.setEnabled(True)
@@ -709,8 +822,42 @@ class MainWindow(QMainWindow):
         
         self.log("任务已停止")
     
+    def apply_selection_policy(self):
+        """配置中明确指定了选择策略（如 success: 成功启动软件B的账号优先被取出）时写入账号池
+
+        策略由使用同一账号池的全部主机共用，未配置时不改动；与账号池现有策略相同时也不重写，
+        保留其他主机或管理员设置的权重与 top_k。
+        """
+        policy = self.config.get("account_selection_policy")
+        if not policy:
+            return
+        pool_key = self.config.get("account_pool_key", "account_pool_v3")
+        if self.account_manager.get_selection_policy(pool_key)["policy"] != policy:
+            self.account_manager.set_selection_policy(pool_key, policy)
+
+    def start_pool_repair(self):
+        """任务运行期间在后台定期增量修复账号池、提升冷却到期的账号，各自的间隔为 0 时不启动"""
+        pool_key = self.config.get("account_pool_key", "account_pool_v3")
+        interval = self.config.get("pool_repair_interval", 600)
+        if interval and self.pool_repair_stop is None:
+            self.pool_repair_stop = self.account_manager.start_background_repair(pool_key, interval=interval)
+        # 多台机器同时运行时只有一台执行冷却回收，其余待命
+        reaper_interval = self.config.get("cooldown_reaper_interval", 1.0)
+        if reaper_interval and self.cooldown_reaper_stop is None:
+            self.cooldown_reaper_stop = self.account_manager.start_cooldown_reaper(pool_key, interval=reaper_interval)
+
+    def stop_pool_repair(self):
+        """停止后台账号池修复与冷却回收"""
+        if self.pool_repair_stop is not None:
+            self.pool_repair_stop.set()
+            self.pool_repair_stop = None
+        if self.cooldown_reaper_stop is not None:
+            self.cooldown_reaper_stop.set()
+            self.cooldown_reaper_stop = None
+
     def task_finished(self):
         """任务完成"""
+        self.stop_pool_repair()
         self.start_task_btn.setEnabled(True)
         self.stop_task_btn.setEnabled(False)
         self.log("任务已结束")
@@ -729,9 +876,12 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "配置错误", "请记录5个坐标点")
             return False
         
-        # 测试Redis连接
+        # 测试账号池连接
         if not self.account_manager.test_connection():
-            QMessageBox.warning(self, "连接错误", "无法连接到Redis服务器")
+            if self.account_manager.backend == "sqlite":
+                QMessageBox.warning(self, "连接错误", "无法打开本地账号池数据库")
+            else:
+                QMessageBox.warning(self, "连接错误", "无法连接到Redis服务器")
             return False
         
         return True
@@ -743,18 +893,44 @@ class MainWindow(QMainWindow):
         self.log_text.ensureCursorVisible()
         self.logger.info(message)
     
+    def update_metrics_server(self, port):
+        """按端口启动、切换或关闭统计端点，端口为 0 时关闭"""
+        if self.metrics_server is not None:
+            if port and self.metrics_server.server_address[1] == port:
+                return
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+        if port:
+            try:
+                self.metrics_server = start_http_server(port)
+            except OSError as exc:
+                self.logger.error(f"统计端点启动失败: {exc}")
+
     def closeEvent(self, event):
         """关闭事件"""
+        if self.account_loader and self.account_loader.isRunning():
+            self.account_loader.stop()
+            self.account_loader.wait()
         if self.task_thread and self.task_thread.isRunning():
             reply = QMessageBox.question(self, "确认退出", "任务正在运行，确定要退出吗？",
                                        QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
                 self.task_thread.stop()
                 self.task_thread.wait()
+                self.stop_pool_repair()
+                self.account_manager.close()
+                close_connection_pools()
+                close_databases()
+                self.update_metrics_server(0)
                 event.accept()
             else:
                 event.ignore()
         else:
+            self.account_manager.close()
+            close_connection_pools()
+            close_databases()
+            self.update_metrics_server(0)
             event.accept()
 
     def restart_coordinate_recording(self):
@@ -794,6 +970,35 @@ class AccountDialog(QDialog):
         return (self.username_edit.text(), self.password_edit.text())
 
 
+class AccountPageLoader(QThread):
+    """后台分页读取账号列表，避免大账号池刷新时阻塞界面"""
+    page_loaded = pyqtSignal(list)
+    load_finished = pyqtSignal(str)
+
+    def __init__(self, parent, account_manager, pool_key, status=None):
+        super().__init__(parent)
+        self.account_manager = account_manager
+        self.pool_key = pool_key
+        self.status = status
+        self.running = True
+
+    def run(self):
+        error = ""
+        try:
+            pages = self.account_manager.iter_accounts(self.pool_key, status=self.status, page_size=ACCOUNT_PAGE_SIZE)
+            for page in pages:
+                if not self.running:
+                    pages.close()
+                    break
+                self.page_loaded.emit(page)
+        except Exception as e:
+            error = str(e)
+        self.load_finished.emit(error)
+
+    def stop(self):
+        self.running = False
+
+
 class TaskThread(QThread):
     """后台任务线程"""
     log_signal = pyqtSignal(str)
@@ -811,16 +1016,17 @@ class TaskThread(QThread):
     
     def run(self):
         """执行新的任务循环"""
+        # 事件日志中以任务线程区分账号的使用方
+        self.account_manager.set_lane("TaskThread")
         while self.running:
             try:
                 # 1. 获取账号
                 pool_key = self.config.get("account_pool_key", "account_pool_v3")
                 self.log_signal.emit(f"正在从Redis获取账号...")
-                account = self.account_manager.acquire_account(pool_key)
+                account = self.wait_for_account(pool_key)
                 
                 if not account:
-                    self.log_signal.emit("无可用账号，等待30秒后重试...")
-                    time.sleep(30)
+                    self.log_signal.emit(f"{ACCOUNT_WAIT_SECONDS}秒内无可用账号，继续等待...")
                     continue
                 
                 self.log_signal.emit(f"获取到第1个账号: {account['username']}")
@@ -831,7 +1037,7 @@ class TaskThread(QThread):
                 
                 # 【修改】等待窗口出现时间：3秒改为5秒
                 self.log_signal.emit("等待5秒让软件A窗口出现...")
-                time.sleep(5)
+                self.hold_account(account, pool_key, 5)
                 
                 if not self.window_controller.center_window(software_a_pid):
                     self.log_signal.emit("无法找到软件A窗口，释放账号并重试...")
@@ -864,7 +1070,7 @@ class TaskThread(QThread):
                         
                         # 等待20秒检查软件B状态
                         self.log_signal.emit("等待50秒检查软件B状态...")
-                        time.sleep(50)
+                        self.hold_account(account, pool_key, 50)
                         
                         b_started = self.process_monitor.is_process_running()
                         if b_started:
@@ -873,14 +1079,14 @@ class TaskThread(QThread):
                             # 🕐 记录软件B开始运行时间
                             self.runtime_logger.record_start()
                             self.log_signal.emit("等待40秒后释放账号...")
-                            time.sleep(40)
+                            self.hold_account(account, pool_key, 40)
                         else:
                             self.log_signal.emit("软件B未启动，准备切换账号...")
                             retry_count += 1
                     
                     # 如果1次尝试都失败，释放当前账号，重新开始流程
                     if not b_started and retry_count >= 1:
-                        self.account_manager.release_account(account, pool_key, cooldown_seconds=30)
+                        self.account_manager.release_account(account, pool_key, outcome="failure")
                         account_switch_count += 1
                         self.log_signal.emit(f"🔄 当前账号1次尝试失败，释放账号并切换到第{account_switch_count + 1}个账号...")
                         
@@ -893,10 +1099,9 @@ class TaskThread(QThread):
                         time.sleep(3)
                         
                         # 获取新账号
-                        account = self.account_manager.acquire_account(pool_key)
+                        account = self.wait_for_account(pool_key)
                         if not account:
-                            self.log_signal.emit("无可用账号，等待30秒后重试...")
-                            time.sleep(30)
+                            self.log_signal.emit(f"{ACCOUNT_WAIT_SECONDS}秒内无可用账号，继续等待...")
                             continue
                         
                         self.log_signal.emit(f"✅ 获取到第{account_switch_count + 1}个账号: {account['username']}")
@@ -907,7 +1112,7 @@ class TaskThread(QThread):
                         
                         # 等待窗口出现
                         self.log_signal.emit("⏳ 等待5秒让软件A窗口出现...")
-                        time.sleep(5)
+                        self.hold_account(account, pool_key, 5)
                         
                         # 窗口居中
                         if not self.window_controller.center_window(software_a_pid):
@@ -928,7 +1133,7 @@ class TaskThread(QThread):
                 if b_started:
                     # 释放当前账号
                     self.log_signal.emit("🔓 释放当前账号...")
-                    self.account_manager.release_account(account, pool_key, cooldown_seconds=5)
+                    self.account_manager.release_account(account, pool_key, cooldown_seconds=5, outcome="success")
                     
                     # 【修正】无论首次还是后续，软件B启动后都关闭重启软件A
                     self.log_signal.emit("🚪 软件B已启动，关闭当前软件A...")
@@ -965,7 +1170,7 @@ class TaskThread(QThread):
                 else:
                     # 首次启动失败，释放账号并重新开始
                     self.log_signal.emit("软件B首次启动失败，释放账号并重新开始...")
-                    self.account_manager.release_account(account, pool_key, cooldown_seconds=30)
+                    self.account_manager.release_account(account, pool_key, outcome="failure")
                     self.window_controller.terminate_process(software_a_pid)
                     
             except Exception as e:
@@ -1004,12 +1209,11 @@ class TaskThread(QThread):
                     # 🕐 记录软件B结束运行时间
                     self.runtime_logger.record_end()
                     
-                    # 软件B结束，尝试获取新账号
-                    account = self.account_manager.acquire_account(pool_key)
+                    # 软件B结束，尝试获取新账号（有账号释放或冷却到期时立即返回）
+                    account = self.wait_for_account(pool_key)
                     
                     if not account:
-                        self.log_signal.emit("无可用账号，等待5秒后重试...")
-                        time.sleep(5)
+                        self.log_signal.emit(f"{ACCOUNT_WAIT_SECONDS}秒内无可用账号，继续等待...")
                         continue
                     
                     self.log_signal.emit(f"✅ 获取到账号: {account['username']}")
@@ -1034,7 +1238,7 @@ class TaskThread(QThread):
                         
                         # 等待20秒检查软件B是否重新启动
                         self.log_signal.emit("⏱️ 等待50秒检查软件B是否重新启动...")
-                        time.sleep(50)
+                        self.hold_account(account, pool_key, 50)
                         
                         b_restarted = self.process_monitor.is_process_running()
                         
@@ -1044,10 +1248,10 @@ class TaskThread(QThread):
                             # 🕐 记录软件B重新开始运行时间
                             self.runtime_logger.record_start()
                             self.log_signal.emit("等待40秒后释放账号...")
-                            time.sleep(40)
+                            self.hold_account(account, pool_key, 40)
 
                             # 释放账号
-                            self.account_manager.release_account(account, pool_key, cooldown_seconds=5)
+                            self.account_manager.release_account(account, pool_key, cooldown_seconds=5, outcome="success")
                             
                             # 【修改】关闭当前软件A并重新启动
                             self.log_signal.emit("🚪 关闭当前软件A...")
@@ -1082,7 +1286,7 @@ class TaskThread(QThread):
                         else:
                             self.log_signal.emit("❌ 软件B未能重新启动，任务完成")
                             # 释放账号并关闭软件A
-                            self.account_manager.release_account(account, pool_key, cooldown_seconds=30)
+                            self.account_manager.release_account(account, pool_key, outcome="failure")
                             self.window_controller.terminate_process(software_a_pid)
                             return  # 退出待机循环，回到主循环
                             
@@ -1095,6 +1299,32 @@ class TaskThread(QThread):
                 self.log_signal.emit(f"待机监控出错: {str(e)}")
                 time.sleep(10)
     
+    def wait_for_account(self, pool_key):
+        """阻塞获取账号，最长 ACCOUNT_WAIT_SECONDS 秒
+
+        连接中断、脚本出错时 acquire_account 会立即返回 None，这里睡满剩余的等待时间再返回，
+        避免故障期间任务循环空转并刷屏日志。
+        """
+        deadline = time.time() + ACCOUNT_WAIT_SECONDS
+        account = self.account_manager.acquire_account(pool_key, timeout=ACCOUNT_WAIT_SECONDS)
+        while account is None and self.running:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(1.0, remaining))
+        return account
+
+    def hold_account(self, account, pool_key, seconds):
+        """持有账号期间等待指定秒数，并定期续约账号租约"""
+        deadline = time.time() + seconds
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(LEASE_RENEW_INTERVAL, remaining))
+            if not self.account_manager.renew_lease(account, pool_key):
+                self.log_signal.emit(f"⚠️ 账号 {account['username']} 租约续约失败，可能已被回收")
+    
     def stop(self):
         """停止任务线程"""
         # 如果软件B正在运行且正在记录时间，记录为中断退出
@@ -86,7 +86,7 @@ def test_concurrent_acquire():
     
     # 清理测试数据
     print("\n🧹 清理测试数据...")
-    am.get_redis_client().delete("test_pool", "test_pool:used")
+    am.delete_pool("test_pool")
     
     print("✅ 测试完成")
 